@@ -3,6 +3,8 @@ from scipy import linalg as la
 import sys
 import warnings
 from abc import ABCMeta, abstractmethod
+from collections import deque
+from functools import partial
 
 import numpy as np
 from scipy import sparse
@@ -24,36 +26,33 @@ from sklearn.utils import check_array, check_X_y, deprecated
 from sklearn.linear_model.base import LinearModel, _pre_fit
 from sklearn.linear_model.coordinate_descent import _alpha_grid
 
+from .budget import make_budget
 from .data import center
+from .fista import _gram
+from .operators import DataOperator, StandardizedMatrix
+from .trace import _entries, make_trace
 
 
 def shrinkage(x, kappa):
     return np.maximum(0, x - kappa) - np.maximum(0, -x - kappa)
 
 
-def enet_admm(X, y, z=None, rho=1.0, alpha=1.0, max_iter=1000, abs_tol=1e-6,
-              rel_tol=1e-4, tau=0.5, mu=0.5):
+def _admm(X, y, XTy, x_update, x, z, u, rho, alpha, tau, mu, max_iter,
+          abs_tol, rel_tol, budget=None, trace=None, adaptive_rho=False):
+    # ADMM iterations from (x, z, u), u is updated in place.
+    # With adaptive_rho, x_update must accept changes of its rho attribute
     n, d = X.shape
+    inexact = isinstance(x_update, CGUpdate)
+    if inexact:
+        x_update.tol = None  # relative to q until the first residuals
+    if trace is not None:
+        trace.start()
 
-    XTy = np.dot(X.T, y)
-
-    x = np.zeros(d)
-    z = np.zeros(d)
-    u = np.zeros(d)
-
-    L, U = factor(X, rho, mu)
-
+    k = 0
     for k in xrange(max_iter):
         # x-update
         q = 2. / n * XTy + rho * (z - u)    # temporary value
-
-        if n >= d:      # if skinny
-            x = la.solve_triangular(U, la.solve_triangular(L, q, lower=True),
-                                    lower=False)
-        else:            # if fat
-            tmp = la.solve_triangular(U, la.solve_triangular(L, np.dot(X, q),
-                                      lower=True), lower=False)
-            x = q / rho - np.dot(X.T, tmp) * (2. / (n * rho * rho))
+        x = x_update(q)
 
         # z-update with relaxation
         zold = z
@@ -63,6 +62,14 @@ def enet_admm(X, y, z=None, rho=1.0, alpha=1.0, max_iter=1000, abs_tol=1e-6,
         # u-update
         u += (x_hat - z)
 
+        if trace is not None:
+            residual = y - X.dot(z)
+            cost = x_update.cost  # it can change at each solve (CG)
+            trace.count(cost[0], cost[1], cost[2] + 8)  # x, z and u updates
+            trace.record(k + 1, (np.dot(residual, residual) / n +
+                                 mu * np.dot(z, z) + tau * np.abs(z).sum()),
+                         rho, np.count_nonzero(z))
+
         # Stopping
         r_norm = la.norm(x - z)
         s_norm = la.norm(-rho * (z - zold))
@@ -72,8 +79,274 @@ def enet_admm(X, y, z=None, rho=1.0, alpha=1.0, max_iter=1000, abs_tol=1e-6,
 
         if (r_norm < eps_pri) and (s_norm < eps_dual):
             break
+        if budget is not None and budget.expired(k + 1):
+            break
+
+        if inexact:
+            # the error on x is at most ||A x - q|| / (2 mu + rho): keep it
+            # below a tenth of the residuals
+            x_update.tol = 0.1 * (2. * mu + rho) * min(r_norm, s_norm / rho)
+
+        if adaptive_rho and (k + 1) % 10 == 0:
+            # residual balancing, u is the dual variable scaled by 1 / rho
+            if r_norm > 10. * s_norm:
+                scale = 2.
+            elif s_norm > 10. * r_norm:
+                scale = .5
+            else:
+                continue
+            rho *= scale
+            u /= scale
+            x_update.rho = rho
+
+    return x, z, u, s_norm, eps_dual, k + 1, rho
+
+
+def enet_admm(X, y, z=None, rho=1.0, alpha=1.0, max_iter=1000, abs_tol=1e-6,
+              rel_tol=1e-4, tau=0.5, mu=0.5, max_time=None,
+              cancel_token=None, trace=None, u=None, x_update=None,
+              adaptive_rho=False, linear_solver='auto'):
+    n, d = X.shape
+    budget = make_budget(max_time, cancel_token)
+
+    XTy = X.T.dot(y)
+
+    # warm start from (z, u), if given
+    z = np.zeros(d) if z is None else np.array(z, dtype=float).ravel()
+    u = np.zeros(d) if u is None else np.array(u, dtype=float).ravel()
+
+    if x_update is None:
+        x_update = make_x_update(X, rho, mu, linear_solver, adaptive_rho)
+        if trace is not None:
+            trace.count(*x_update.factor_cost)
+
+    _, z, u, s_norm, eps_dual, n_iter, _ = _admm(
+        X, y, XTy, x_update, z.copy(), z, u, rho, alpha, tau, mu, max_iter,
+        abs_tol, rel_tol, budget=budget, trace=trace,
+        adaptive_rho=adaptive_rho)
+    if budget is not None and budget.expired():
+        warnings.warn('ADMM stopped before convergence (%s).'
+                      % budget.status, ConvergenceWarning)
+
+    return z, s_norm, eps_dual, n_iter
+
+
+def enet_admm_multi(X, Y, Z=None, rho=1.0, alpha=1.0, max_iter=1000,
+                    abs_tol=1e-6, rel_tol=1e-4, tau=0.5, mu=0.5,
+                    max_time=None, cancel_token=None, trace=None,
+                    linear_solver='auto'):
+    """ADMM for several targets sharing the same data matrix.
+
+    The x-update is factorized once and at each iteration it is solved for
+    all the targets not yet converged with a single ``(P, M)`` right-hand
+    side. The convergence is checked for each target, and the converged
+    ones are removed from the following iterations.
+
+    It has the parameters of :func:`enet_admm`, but ``Y`` is ``(N, M)``
+    and ``Z`` ``(P, M)``, and ``linear_solver`` must be a factorization
+    (``'auto'``, ``'cholesky'`` or ``'eigh'``, see :func:`make_x_update`).
+    The outputs have one column (or one value) for each target.
+    """
+    n, d = X.shape
+    Y = np.asarray(Y, dtype=float).reshape(n, -1)
+    m = Y.shape[1]
+    budget = make_budget(max_time, cancel_token)
+
+    x_update = make_x_update(X, rho, mu, linear_solver)
+    if isinstance(x_update, CGUpdate):
+        raise ValueError("the targets can share only a factorization "
+                         "(linear_solver 'cholesky' or 'eigh')")
+    if trace is not None:
+        trace.count(*x_update.factor_cost)
+        trace.start()
+
+    XTY = X.T.dot(Y)
+    Z = np.zeros((d, m)) if Z is None else np.array(
+        Z, dtype=float).reshape(d, m)
+    U = np.zeros((d, m))
+    s_norm, eps_dual = np.full(m, np.inf), np.full(m, np.inf)
+    n_iter = np.zeros(m, dtype=int)
+
+    active = np.arange(m)
+    for k in xrange(max_iter):
+        z_old, u = Z[:, active], U[:, active]
+
+        x = x_update(2. / n * XTY[:, active] + rho * (z_old - u))
+        x_hat = alpha * x + (1 - alpha) * z_old
+        z = shrinkage(x_hat + u, tau / rho)
+        u += (x_hat - z)
+        Z[:, active], U[:, active] = z, u
+        n_iter[active] = k + 1
+
+        if trace is not None:
+            residual = Y[:, active] - X.dot(z)
+            cost = x_update.cost
+            trace.count(cost[0] * active.size, cost[1] * active.size,
+                        cost[2] + 8)
+            trace.record(k + 1, (np.sum(residual ** 2) / n +
+                                 mu * np.sum(z ** 2) + tau * np.abs(z).sum()),
+                         rho, np.count_nonzero(z))
+
+        # Stopping, for each target
+        r_norm = np.linalg.norm(x - z, axis=0)
+        s_norm[active] = rho * np.linalg.norm(z - z_old, axis=0)
+        eps_pri = np.sqrt(d) * abs_tol + rel_tol * np.maximum(
+            np.linalg.norm(x, axis=0), np.linalg.norm(z, axis=0))
+        eps_dual[active] = (np.sqrt(d) * abs_tol +
+                            rel_tol * rho * np.linalg.norm(u, axis=0))
+
+        active = active[(r_norm >= eps_pri) |
+                        (s_norm[active] >= eps_dual[active])]
+        if not active.size:
+            break
+        if budget is not None and budget.expired(k + 1):
+            warnings.warn('ADMM stopped before convergence (%s).'
+                          % budget.status, ConvergenceWarning)
+            break
+
+    return Z, s_norm, eps_dual, n_iter
+
+
+def l1l2_path(data, labels, mu, tau_range, beta=None, kmax=100000,
+              tolerance=1e-5, input_key=None, continuation=False, dfmax=None,
+              pmax=None, return_truncated=False, rho=1.0, alpha=1.0,
+              abs_tol=1e-6, max_time=None, cancel_token=None,
+              return_status=False, trace=None, adaptive_rho=False,
+              linear_solver='auto'):
+    r"""`l1l2` regularization path computed with ADMM.
+
+    Alternative to :func:`l1l2py.algorithms.l1l2_path`, with the same
+    output. The Cholesky factorization of the x-update depends only on
+    ``data``, ``rho`` and ``mu``: it is computed once for the whole path
+    (see :class:`CholeskyUpdate`). The values of ``tau`` are used from the
+    biggest to the smallest and the iterations of each value are warm
+    started from the variables ``x``, ``z`` and ``u`` of the previous one
+    (the scaled dual variable ``u`` is rescaled by the ratio of the two
+    values of ``tau``).
+
+    With ``adaptive_rho=True`` the x-update is computed in the eigenbasis of
+    the data (see :class:`EigenUpdate`), so that ``rho`` is adapted by
+    residual balancing without new factorizations. For scipy sparse data the
+    x-update is solved by conjugate gradient (see :class:`CGUpdate`).
+
+    Parameters
+    ----------
+    data : (N, P) ndarray, scipy.sparse matrix or DataOperator
+        Data matrix.
+    labels : (N,) or (N, 1) ndarray
+        Labels vector.
+    mu : float
+        `l2-norm` penalty.
+    tau_range : array_like of float
+        `l1-norm` penalties in increasing order.
+    beta : (P,) or (P, 1) ndarray, optional (default is `None`)
+        Starting value of the iterations.
+        If `None`, then iterations starts from the empty model.
+    kmax : int, optional (default is `1e5`)
+        Maximum number of iterations for each value of ``tau``.
+    tolerance : float, optional (default is `1e-5`)
+        Relative convergence tolerance on the primal and dual residuals.
+    input_key : str, optional (default is `None`)
+        Not used (same signature of :func:`l1l2py.algorithms.l1l2_path`).
+    continuation : bool, optional (default is `False`)
+        Not used, the warm starts of ADMM already exploit the path.
+    dfmax : int, optional (default is `None`)
+        Maximum number of selected variables in a solution.
+    pmax : int, optional (default is `None`)
+        Maximum number of variables ever selected along the path.
+    return_truncated : bool, optional (default is `False`)
+        If `True`, returns also the number of (smallest) values in
+        ``tau_range`` discarded because of ``dfmax``, ``pmax``,
+        ``max_time`` or ``cancel_token``.
+    rho : float, optional (default is `1.0`)
+        ADMM penalty parameter.
+    alpha : float, optional (default is `1.0`)
+        Over-relaxation parameter.
+    abs_tol : float, optional (default is `1e-6`)
+        Absolute convergence tolerance.
+    max_time : float, optional (default is `None`)
+        Maximum running time of the whole path, in seconds.
+    cancel_token : CancellationToken, optional (default is `None`)
+        Token used to stop the computation (see :mod:`l1l2py.budget`).
+    return_status : bool, optional (default is `False`)
+        If `True`, returns also the status of the path: ``'converged'``,
+        ``'max_iter'``, ``'timeout'`` or ``'cancelled'``.
+    trace : SolverTrace, optional (default is `None`)
+        Trace of the iterations (see :mod:`l1l2py.trace`).
+    adaptive_rho : bool, optional (default is `False`)
+        If `True`, ``rho`` is adapted every 10 iterations to balance the
+        primal and dual residuals, and it is carried along the path.
+    linear_solver : {'auto', 'cholesky', 'eigh', 'cg'}, optional
+        Solver of the x-update (see :func:`make_x_update`).
+
+    Returns
+    -------
+    beta_path : list of (P, 1) ndarrays
+        `l1l2` solutions with at least one non-zero element, ordered as
+        ``tau_range``.
+    truncated : int, optional
+        Number of discarded values in ``tau_range``.
+    status : str, optional
+        Status of the path.
+    """
+    if not (isinstance(data, DataOperator) or sparse.issparse(data)):
+        data = np.asarray(data)
+    labels = np.asarray(labels, dtype=float).ravel()
+    n, d = data.shape
+    budget = make_budget(max_time, cancel_token)
+
+    # Values shared by all the values of tau
+    XTy = data.T.dot(labels)
+    x_update = make_x_update(data, rho, mu, linear_solver, adaptive_rho)
+    if trace is not None:
+        trace.count(*x_update.factor_cost)
+
+    z = np.zeros(d) if beta is None else np.array(beta, dtype=float).ravel()
+    x, u = z.copy(), np.zeros(d)
+
+    out = deque()
+    ever_selected = np.zeros(d, dtype=bool)
+    truncated = 0
+    statuses = set()
+    previous_tau = None
+    for i, tau in enumerate(reversed(tau_range)):
+        if previous_tau:
+            u *= tau / previous_tau
+        x, z, u, _, _, n_iter, rho = _admm(
+            data, labels, XTy, x_update, x, z, u, rho, alpha, tau, mu, kmax,
+            abs_tol, tolerance, budget=budget, trace=trace,
+            adaptive_rho=adaptive_rho)
+        previous_tau = tau
+        if n_iter >= kmax:
+            statuses.add('max_iter')
+
+        if budget is not None and budget.expired():
+            # the solution is not converged, it is discarded with
+            # the remaining ones
+            truncated = len(tau_range) - i
+            break
+
+        nonzero = np.count_nonzero(z)
+        ever_selected |= (z != 0)
+        if ((dfmax is not None and nonzero > dfmax) or
+                (pmax is not None and ever_selected.sum() > pmax)):
+            truncated = len(tau_range) - i
+            break
+
+        if nonzero > 0:
+            out.appendleft(z.reshape(d, 1))
+
+    if budget is not None and budget.expired():
+        status = budget.status
+    else:
+        status = 'max_iter' if 'max_iter' in statuses else 'converged'
 
-    return z, s_norm, eps_dual, k + 1
+    out = (out,)
+    if return_truncated:
+        out += (truncated,)
+    if return_status:
+        out += (status,)
+    return out if len(out) > 1 else out[0]
 
 
 def enet_admm_path(X, y, fit_intercept=True, tau=0.5, mu=0.5,
@@ -84,7 +357,9 @@ def enet_admm_path(X, y, fit_intercept=True, tau=0.5, mu=0.5,
                    random_state=None, selection='cyclic',
                    alphas=None, precompute='auto', Xy=None, coef_init=None,
                    verbose=False, return_n_iter=False,
-                   check_input=True, **params):
+                   check_input=True, max_time=None, cancel_token=None,
+                   trace=None, adaptive_rho=False, split=None, n_workers=None,
+                   linear_solver='auto', **params):
     # We expect X and y to be already Fortran ordered when bypassing
     # checks
     if check_input:
@@ -130,8 +405,6 @@ def enet_admm_path(X, y, fit_intercept=True, tau=0.5, mu=0.5,
         alphas = np.sort(alphas)[::-1]  # make sure alphas are properly ordered
 
     n_alphas = len(alphas)
-    tol = params.get('tol', 1e-4)
-    max_iter = params.get('max_iter', 1000)
     dual_gaps = np.empty(n_alphas)
     n_iters = []
 
@@ -152,15 +425,34 @@ def enet_admm_path(X, y, fit_intercept=True, tau=0.5, mu=0.5,
     else:
         coef_ = np.asfortranarray(coef_init, dtype=X.dtype)
 
+    if split is not None and sparse.issparse(X):
+        raise ValueError("split is not supported for sparse data")
+    if split is None:
+        solver = partial(enet_admm, adaptive_rho=adaptive_rho,
+                         linear_solver=linear_solver)
+    elif split == 'rows':
+        from .splitting import consensus_admm
+        solver = partial(consensus_admm, n_workers=n_workers)
+    elif split == 'columns':
+        from .splitting import sharing_admm
+        solver = partial(sharing_admm, n_workers=n_workers)
+    else:
+        raise ValueError("split should be None, 'rows' or 'columns', "
+                         "got %r" % split)
+
     for i, mu in enumerate(alphas):
         l1_reg = tau
         l2_reg = mu
         if not multi_output and sparse.isspmatrix(X):
-            # model = cd_fast.sparse_enet_coordinate_descent(
-            #     coef_, l1_reg, l2_reg, X.data, X.indices,
-            #     X.indptr, y, X_sparse_scaling,
-            #     max_iter, tol, rng, random, positive)
-            raise NotImplementedError()
+            # As in sparse_enet_coordinate_descent, the columns are centered
+            # in the products (the x-update is solved by CG by default)
+            data = X
+            if np.any(X_sparse_scaling):
+                data = StandardizedMatrix(X, X_sparse_scaling)
+            model = solver(
+                data, y, coef_, rho=rho, alpha=alpha, max_iter=max_iter,
+                abs_tol=abs_tol, rel_tol=rel_tol, tau=tau, mu=mu,
+                max_time=max_time, cancel_token=cancel_token, trace=trace)
         elif multi_output:
             raise NotImplementedError()
             # model = cd_fast.enet_coordinate_descent_multi_task(
@@ -175,13 +467,15 @@ def enet_admm_path(X, y, fit_intercept=True, tau=0.5, mu=0.5,
             #     coef_, l1_reg, l2_reg, precompute, Xy, y, max_iter,
             #     tol, rng, random, positive)
             # raise NotImplementedError()
-            model = enet_admm(
+            model = solver(
                 X, y, coef_, rho=rho, alpha=alpha, max_iter=max_iter,
-                abs_tol=abs_tol, rel_tol=rel_tol, tau=tau, mu=mu)
+                abs_tol=abs_tol, rel_tol=rel_tol, tau=tau, mu=mu,
+                max_time=max_time, cancel_token=cancel_token, trace=trace)
         elif precompute is False:
-            model = enet_admm(
+            model = solver(
                 X, y, coef_, rho=rho, alpha=alpha, max_iter=max_iter,
-                abs_tol=abs_tol, rel_tol=rel_tol, tau=tau, mu=mu)
+                abs_tol=abs_tol, rel_tol=rel_tol, tau=tau, mu=mu,
+                max_time=max_time, cancel_token=cancel_token, trace=trace)
             # coef_, l1_reg, l2_reg, X, y, max_iter, tol, rng, random,
             # positive)
         else:
@@ -218,7 +512,9 @@ class ElasticNet(LinearModel):
                  max_iter=1000, abs_tol=1e-6, rel_tol=1e-4,
                  normalize=False, precompute=False,
                  copy_X=True, warm_start=False, positive=False,
-                 random_state=None, selection='cyclic'):
+                 random_state=None, selection='cyclic', max_time=None,
+                 cancel_token=None, trace=False, adaptive_rho=False,
+                 split=None, n_workers=None, linear_solver='auto'):
 
         self.tau = tau
         self.mu = mu
@@ -237,6 +533,13 @@ class ElasticNet(LinearModel):
         self.positive = positive
         self.random_state = random_state
         self.selection = selection
+        self.max_time = max_time  # seconds for the whole fit
+        self.cancel_token = cancel_token
+        self.trace = trace  # False, True, buffer length or SolverTrace
+        self.adaptive_rho = adaptive_rho  # residual balancing of rho
+        self.split = split  # None, 'rows' or 'columns' (sharing ADMM)
+        self.n_workers = n_workers
+        self.linear_solver = linear_solver  # 'cg' is the default if sparse
 
     def fit(self, X, y, check_input=True):
         if check_input:
@@ -274,28 +577,65 @@ class ElasticNet(LinearModel):
             if coef_.ndim == 1:
                 coef_ = coef_[np.newaxis, :]
 
+        params = {}
+        if sparse.isspmatrix(X):
+            # sparse data are not centered by _pre_fit
+            params.update(X_offset=X_offset, X_scale=X_scale)
+
         dual_gaps_ = np.zeros(n_targets, dtype=X.dtype)
         self.n_iter_ = []
-
-        for k in xrange(n_targets):
-            if Xy is not None:
-                this_Xy = Xy[:, k]
-            else:
-                this_Xy = None
-            _, this_coef, this_dual_gap, this_iter = enet_admm_path(
-                X, y[:, k], rho=self.rho, alpha=self.alpha,
-                max_iter=self.max_iter, return_n_iter=True,
-                abs_tol=self.abs_tol, rel_tol=self.rel_tol, tau=self.tau,
-                mu=self.mu, alphas=[self.mu])
-            coef_[k] = this_coef[:, 0]
-            dual_gaps_[k] = this_dual_gap[0]
-            self.n_iter_.append(this_iter[0])
+        budget = make_budget(self.max_time, self.cancel_token)
+        self.trace_ = make_trace(self.trace)
+
+        if (n_targets > 1 and self.split is None and
+                not sparse.isspmatrix(X) and not self.adaptive_rho and
+                self.linear_solver != 'cg'):
+            # a single factorization of the x-update for all the targets
+            coef_, dual_gaps_, eps_, n_iter_ = enet_admm_multi(
+                X, y, coef_.T, rho=self.rho, alpha=self.alpha,
+                max_iter=self.max_iter, abs_tol=self.abs_tol,
+                rel_tol=self.rel_tol, tau=self.tau, mu=self.mu,
+                max_time=None if budget is None else budget.remaining,
+                cancel_token=self.cancel_token, trace=self.trace_,
+                linear_solver=self.linear_solver)
+            coef_ = np.asfortranarray(coef_.T, dtype=X.dtype)
+            self.n_iter_ = list(n_iter_)
+            if np.any(dual_gaps_ > eps_):
+                warnings.warn('Objective did not converge for %d targets. '
+                              'You might want to increase the number of '
+                              'iterations.' % np.sum(dual_gaps_ > eps_),
+                              ConvergenceWarning)
+        else:
+            for k in xrange(n_targets):
+                if Xy is not None:
+                    this_Xy = Xy[:, k]
+                else:
+                    this_Xy = None
+                _, this_coef, this_dual_gap, this_iter = enet_admm_path(
+                    X, y[:, k], rho=self.rho, alpha=self.alpha,
+                    max_iter=self.max_iter, return_n_iter=True,
+                    abs_tol=self.abs_tol, rel_tol=self.rel_tol, tau=self.tau,
+                    mu=self.mu, alphas=[self.mu],
+                    max_time=None if budget is None else budget.remaining,
+                    cancel_token=self.cancel_token, trace=self.trace_,
+                    adaptive_rho=self.adaptive_rho, split=self.split,
+                    n_workers=self.n_workers, linear_solver=self.linear_solver,
+                    **params)
+                coef_[k] = this_coef[:, 0]
+                dual_gaps_[k] = this_dual_gap[0]
+                self.n_iter_.append(this_iter[0])
 
         # # Fitting the intercept if required
         # if self.fit_intercept:
         #     self._intercept = ymean - np.dot(Xmean, self.coef_)
         # else:
         #     self._intercept = 0.0
+        if budget is not None and budget.expired():
+            self.status_ = budget.status
+        elif max(self.n_iter_) >= self.max_iter:
+            self.status_ = 'max_iter'
+        else:
+            self.status_ = 'converged'
         if n_targets == 1:
             self.n_iter_ = self.n_iter_[0]
 
@@ -315,12 +655,284 @@ class Lasso(ElasticNet):
             max_iter=max_iter, abs_tol=abs_tol, rel_tol=rel_tol)
 
 
+class CholeskyUpdate(object):
+    r"""x-update of ADMM with a cached Cholesky factorization.
+
+    Solves the linear system
+
+    .. math::
+        (\frac{2}{n} \mathbf{X^T}\mathbf{X} + (2\mu + \rho) \mathbf{I})
+        \mathbf{x} = \mathbf{q}
+
+    with the factorization computed by :func:`factor`, that depends only on
+    ``X``, ``rho`` and ``mu`` (not on ``tau``). If `N` < `P` the smaller
+    matrix :math:`\mathbf{I} + \frac{2}{n(2\mu + \rho)}
+    \mathbf{X}\mathbf{X^T}` is factorized and the matrix inversion lemma is
+    used.
+
+    Parameters
+    ----------
+    X : (N, P) ndarray or DataOperator
+        Data matrix.
+    rho : float
+        ADMM penalty parameter.
+    mu : float, optional (default is `0.0`)
+        `l2-norm` penalty.
+
+    Attributes
+    ----------
+    factor_cost, cost : tuple of int
+        Estimated matrix-vector products, flops and allocated arrays of the
+        factorization and of each solve (see :mod:`l1l2py.trace`).
+    """
+
+    def __init__(self, X, rho, mu=0.0):
+        self.X = X
+        self.rho = rho
+        self.mu = mu
+        n, d = X.shape
+        self._factor = factor(X, rho, mu)
+
+        m = min(n, d)
+        self.factor_cost = 0, 2 * _entries(X) * m + m ** 3 // 3, 2
+        if n >= d:
+            self.cost = 0, 2 * d * d, 1
+        else:
+            self.cost = 2, 4 * _entries(X) + 2 * n * n, 4
+
+    def __call__(self, q):
+        n, d = self.X.shape
+        if n >= d:      # if skinny
+            return la.cho_solve(self._factor, q)
+
+        # if fat
+        r = 2. * self.mu + self.rho
+        tmp = la.cho_solve(self._factor, self.X.dot(q))
+        return q / r - self.X.T.dot(tmp) * (2. / (n * r * r))
+
+
+class EigenUpdate(object):
+    r"""x-update of ADMM in the eigenbasis of the data.
+
+    Solves the same linear system of :class:`CholeskyUpdate` with the
+    eigendecomposition of :math:`\mathbf{X^T}\mathbf{X}` (or of
+    :math:`\mathbf{X}\mathbf{X^T}`, if `N` < `P`), where it is a diagonal
+    scaling for every value of ``rho`` and ``mu``. Hence the attributes
+    ``rho`` and ``mu`` can be changed between two solves (e.g. to adapt
+    ``rho``), and the same decomposition can be shared by different
+    values of ``mu``.
+
+    Parameters
+    ----------
+    X : (N, P) ndarray or DataOperator
+        Data matrix.
+    rho : float
+        ADMM penalty parameter.
+    mu : float, optional (default is `0.0`)
+        `l2-norm` penalty.
+    decomposition : tuple of ndarrays, optional (default is `None`)
+        Output of :func:`eigen_decomposition` for ``X``. If `None`, it is
+        computed.
+
+    Attributes
+    ----------
+    factor_cost, cost : tuple of int
+        Estimated matrix-vector products, flops and allocated arrays of the
+        decomposition and of each solve (see :mod:`l1l2py.trace`).
+    """
+
+    def __init__(self, X, rho, mu=0.0, decomposition=None):
+        self.X = X
+        self.rho = rho
+        self.mu = mu
+        n, d = X.shape
+
+        m = min(n, d)
+        self.factor_cost = 0, 0, 0
+        if decomposition is None:
+            decomposition = eigen_decomposition(X)
+            self.factor_cost = 0, 2 * _entries(X) * m + 9 * m ** 3, 3
+        self.eigenvalues, self.eigenvectors = decomposition
+        if n >= d:
+            self.cost = 0, 4 * d * d, 3
+        else:
+            self.cost = 2, 4 * _entries(X) + 4 * n * n, 6
+
+    def __call__(self, q):
+        n, d = self.X.shape
+        r = 2. * self.mu + self.rho
+        V = self.eigenvectors
+        eigenvalues = self.eigenvalues
+        if q.ndim > 1:
+            eigenvalues = eigenvalues[:, np.newaxis]  # several targets
+        if n >= d:      # if skinny
+            return np.dot(V, np.dot(V.T, q) / ((2. / n) * eigenvalues + r))
+
+        # if fat, matrix inversion lemma
+        tmp = np.dot(V, np.dot(V.T, self.X.dot(q)) /
+                     (1. + (2. / (r * n)) * eigenvalues))
+        return q / r - self.X.T.dot(tmp) * (2. / (n * r * r))
+
+
+class CGUpdate(object):
+    r"""Matrix-free x-update of ADMM with conjugate gradient.
+
+    Solves inexactly the same linear system of :class:`CholeskyUpdate`,
+    using only products with ``X`` and its transpose, so that ``X`` can be
+    a large scipy sparse matrix or a DataOperator. The iterations are warm
+    started from the previous solution and preconditioned with the
+    diagonal of the system (if the norms of the columns of ``X`` are
+    available). As in :class:`EigenUpdate`, the attributes ``rho`` and
+    ``mu`` can be changed between two solves.
+
+    The iterations stop when the norm of the residual of the system is
+    below ``tol``. The ADMM iterations set it after each step to a tenth of
+    the primal and dual residuals (scaled by :math:`2\mu + \rho`, that
+    bounds the error on ``x``), so that the solves are cheap far from the
+    solution and accurate near it; if ``tol`` is `None`, the tolerance is
+    ``rtol`` times the norm of the right-hand side.
+
+    Parameters
+    ----------
+    X : (N, P) ndarray, scipy.sparse matrix or DataOperator
+        Data matrix.
+    rho : float
+        ADMM penalty parameter.
+    mu : float, optional (default is `0.0`)
+        `l2-norm` penalty.
+    rtol : float, optional (default is `1e-3`)
+        Relative tolerance used when ``tol`` is `None`.
+    max_iter : int, optional (default is `None`)
+        Maximum number of iterations of each solve. If `None`, it is `P`.
+    precondition : bool, optional (default is `True`)
+        If `True`, the diagonal (Jacobi) preconditioner is used.
+
+    Attributes
+    ----------
+    tol : float or None
+        Absolute tolerance on the residual of the next solve.
+    n_iter : int
+        Number of iterations of the last solve.
+    factor_cost, cost : tuple of int
+        Estimated matrix-vector products, flops and allocated arrays of the
+        preconditioner and of the last solve (see :mod:`l1l2py.trace`).
+    """
+
+    def __init__(self, X, rho, mu=0.0, rtol=1e-3, max_iter=None,
+                 precondition=True):
+        self.X = X
+        self.rho = rho
+        self.mu = mu
+        self.rtol = rtol
+        n, d = X.shape
+        self.max_iter = d if max_iter is None else max_iter
+        self.tol = None
+        self.n_iter = 0
+        self._x = np.zeros(d)
+
+        self._norms = _squared_norms(X) if precondition else None
+        self.factor_cost = 0, 0, 0
+        if self._norms is not None:
+            self.factor_cost = 0, 2 * _entries(X), 1
+        self.cost = 0, 0, 0
+
+    def _matvec(self, v):
+        n = self.X.shape[0]
+        return ((2. / n) * self.X.T.dot(self.X.dot(v)) +
+                (2. * self.mu + self.rho) * v)
+
+    def __call__(self, q):
+        n, d = self.X.shape
+        q_norm = la.norm(q)
+        tol = self.rtol * q_norm if self.tol is None else self.tol
+        tol = max(tol, np.finfo(float).eps * q_norm)
+        if self._norms is None:
+            inverse_diagonal = np.ones(d)
+        else:
+            inverse_diagonal = 1. / ((2. / n) * self._norms +
+                                     2. * self.mu + self.rho)
+
+        x = self._x.copy()
+        residual = q - self._matvec(x)
+        preconditioned = inverse_diagonal * residual
+        direction = preconditioned.copy()
+        rz = np.dot(residual, preconditioned)
+        k = 0
+        while k < self.max_iter and la.norm(residual) > tol:
+            product = self._matvec(direction)
+            step = rz / np.dot(direction, product)
+            x += step * direction
+            residual -= step * product
+            preconditioned = inverse_diagonal * residual
+            rz, rz_old = np.dot(residual, preconditioned), rz
+            direction = preconditioned + (rz / rz_old) * direction
+            k += 1
+
+        self._x = x
+        self.n_iter = k
+        self.cost = 2 * (k + 1), 4 * (k + 1) * (_entries(self.X) + d), 6
+        return x.copy()
+
+
+def _squared_norms(X):
+    # Squared norms of the columns of X (None if they are not available)
+    if isinstance(X, StandardizedMatrix):
+        squares = _squared_norms(X.data)
+        sums = np.asarray(X.data.sum(axis=0), dtype=float).ravel()
+        return ((squares - 2. * X.mean * sums +
+                 X.shape[0] * X.mean ** 2) / X.scale ** 2)
+    if sparse.issparse(X):
+        return np.asarray(X.multiply(X).sum(axis=0), dtype=float).ravel()
+    if isinstance(X, np.ndarray):
+        return np.einsum('ij,ij->j', X, X)
+    return None
+
+
+def make_x_update(X, rho, mu=0.0, linear_solver='auto', adaptive_rho=False):
+    """The x-update of ADMM requested by ``linear_solver``.
+
+    ``'cholesky'`` is :class:`CholeskyUpdate`, ``'eigh'`` is
+    :class:`EigenUpdate` and ``'cg'`` is :class:`CGUpdate`. With
+    ``'auto'``, conjugate gradient is used for scipy sparse data, otherwise
+    the eigendecomposition if ``adaptive_rho`` (``rho`` can change only in
+    the eigenbasis, without new factorizations) or the Cholesky
+    factorization.
+    """
+    if linear_solver == 'auto':
+        if sparse.issparse(X):
+            linear_solver = 'cg'
+        else:
+            linear_solver = 'eigh' if adaptive_rho else 'cholesky'
+    if linear_solver == 'cg':
+        return CGUpdate(X, rho, mu)
+    if linear_solver == 'eigh':
+        return EigenUpdate(X, rho, mu)
+    if linear_solver == 'cholesky':
+        if adaptive_rho:
+            raise ValueError("adaptive_rho requires linear_solver 'eigh' "
+                             "or 'cg'")
+        return CholeskyUpdate(X, rho, mu)
+    raise ValueError("linear_solver should be 'auto', 'cholesky', 'eigh' "
+                     "or 'cg', got %r" % (linear_solver,))
+
+
+def eigen_decomposition(X):
+    """Eigenvalues and eigenvectors of the smallest between
+    :math:`X^T X` and :math:`X X^T`, used by :class:`EigenUpdate`."""
+    eigenvalues, eigenvectors = la.eigh(_gram(X))
+    return np.maximum(eigenvalues, 0.), eigenvectors
+
+
 def factor(X, rho, mu=0.0):
+    """Cholesky factorization (as returned by ``cho_factor``) of the
+    ADMM x-update, see :class:`CholeskyUpdate`."""
     n, d = X.shape
 
+    # X^T X if n >= d, X X^T otherwise (X can be a DataOperator)
+    gram = _gram(X)
     if n >= d:
-        L = la.cholesky((2. / n) * np.dot(X.T, X) + (2. * mu + rho) * np.eye(d), lower=True)
+        A = (2. / n) * gram + (2. * mu + rho) * np.eye(d)
     else:
-        L = la.cholesky(np.eye(n) + (2. / (rho * n)) * np.dot(X, X.T), lower=True)
+        A = np.eye(n) + (2. / ((2. * mu + rho) * n)) * gram
 
-    return L, L.T  # L, U
+    return la.cho_factor(A, lower=True)
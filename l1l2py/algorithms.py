@@ -34,7 +34,15 @@ except ImportError:
 from collections import deque
 from six.moves import xrange
 
-__all__ = ('l1_bound', 'ridge_regression', 'l1l2_regularization', 'l1l2_path')
+from l1l2py.autotune import select_solver
+from l1l2py.budget import make_budget
+from l1l2py.fista import l1l2_fista, lipschitz, _gram
+from l1l2py.operators import DataOperator, ThreadedMatrix
+from l1l2py.shotgun import ShotgunMatrix, shotgun_l1l2
+
+__all__ = ('l1_bound', 'ridge_regression', 'ridge_path', 'ridge_criterion',
+           'RidgeCache', 'FoldGram', 'l1l2_regularization', 'l1l2_path',
+           'l1l2_path_append')
 
 
 def _emergency_log(message, file_path='/tmp/emergency_log.txt'):
@@ -60,7 +68,7 @@ def l1_bound(data, labels):
 
     Parameters
     ----------
-    data : (N, P) ndarray
+    data : (N, P) ndarray or DataOperator
         Data matrix.
     labels : (N,)  or (N, 1) ndarray
         Labels vector.
@@ -82,7 +90,7 @@ def l1_bound(data, labels):
     >>> len(numpy.flatnonzero(beta))
     1
     """
-    corr = np.abs(np.dot(data.T, labels))
+    corr = np.abs(data.T.dot(labels))
     tau_max = (corr.max() * (2. / data.shape[0]))
     return tau_max
 
@@ -95,7 +103,7 @@ def ridge_regression(data, labels, mu=0.0):
 
     Parameters
     ----------
-    data : (N, P) ndarray
+    data : (N, P) ndarray or DataOperator
         Data matrix.
     labels : (N,)  or (N, 1) ndarray
         Labels vector.
@@ -119,24 +127,473 @@ def ridge_regression(data, labels, mu=0.0):
     """
     n, p = data.shape
 
-    if n < p:
-        tmp = np.dot(data, data.T)
-        if mu:
-            tmp += mu * n * np.eye(n)
-        tmp = la.pinv(tmp)
+    tmp = _gram(data)
+    if mu:
+        tmp += mu * n * np.eye(min(n, p))
+    tmp = la.pinv(tmp)
 
-        return np.dot(np.dot(data.T, tmp), labels.reshape(-1, 1))
+    if n < p:
+        return data.T.dot(np.dot(tmp, labels.reshape(-1, 1)))
     else:
-        tmp = np.dot(data.T, data)
-        if mu:
-            tmp += mu * n * np.eye(p)
-        tmp = la.pinv(tmp)
+        return np.dot(tmp, data.T.dot(labels.reshape(-1, 1)))
+
+
+def ridge_path(data, labels, lambda_range, test_data=None,
+               return_predictions=False):
+    r"""Ridge regression solutions for several values of the `l2` penalty.
+
+    Same solutions of :func:`ridge_regression` for each value in
+    ``lambda_range``, computed from a single thin SVD
+    :math:`\mathbf{X} = \mathbf{U}\mathbf{S}\mathbf{V^T}` of the data:
+
+    .. math::
+        \boldsymbol{\beta}(\lambda) = \mathbf{V}
+        \frac{\mathbf{S}}{\mathbf{S}^2 + \lambda n \mathbf{I}}
+        \mathbf{U^T}\mathbf{Y}
+
+    so that each value of ``lambda`` costs :math:`O(P \min(N, P))`
+    operations instead of a new pseudo-inverse. As for
+    :func:`ridge_regression` (with ``pinv``), the singular values
+    negligible with respect to the biggest one are discarded.
+
+    Parameters
+    ----------
+    data : (N, P) ndarray
+        Data matrix.
+    labels : (N,)  or (N, 1) ndarray
+        Labels vector.
+    lambda_range : array_like of float
+        `l2-norm` penalties.
+    test_data : (M, P) ndarray, optional (default is `None`)
+        Data matrix of the test set, used for the predictions.
+    return_predictions : bool, optional (default is `False`)
+        If `True`, returns also the predictions on ``data`` (and on
+        ``test_data``, if given).
+
+    Returns
+    -------
+    beta : (P, L) ndarray
+        Ridge regression solutions, one column for each value in
+        ``lambda_range``.
+    predictions : (N, L) ndarray, optional
+        Predictions on ``data``.
+    test_predictions : (M, L) ndarray, optional
+        Predictions on ``test_data``.
+
+    Examples
+    --------
+    >>> X = numpy.array([[0.1, 1.1, 0.3], [0.2, 1.2, 1.6], [0.3, 1.3, -0.6]])
+    >>> Y = numpy.dot(X, numpy.array([0.1, 0.1, 0.0]))
+    >>> beta = l1l2py.algorithms.ridge_path(X, Y, [0.0, 1e-1, 1e3])
+    >>> beta.shape
+    (3, 3)
+    """
+    data = np.asarray(data)
+    n, p = data.shape
+    lambda_range = np.asarray(lambda_range, dtype=float).ravel()
+
+    U, s, Vt = _thin_svd(data)
+    denominator = s[:, np.newaxis] ** 2 + n * lambda_range
+    filters = s[:, np.newaxis] / np.where(denominator > 0, denominator, 1.)
+
+    # coefficients in the basis of the right singular vectors
+    weights = filters * U.T.dot(np.ravel(labels))[:, np.newaxis]
+    beta = Vt.T.dot(weights)
+    if not return_predictions:
+        return beta
+
+    out = (beta, U.dot(s[:, np.newaxis] * weights))
+    if test_data is not None:
+        out += (np.dot(np.asarray(test_data).dot(Vt.T), weights),)
+    return out
+
+
+def ridge_criterion(data, labels, lambda_range, criterion='loo',
+                    fit_intercept=False):
+    r"""Leave-one-out or generalized cross validation error of ridge
+    regression, for several values of the `l2` penalty.
+
+    Both are computed in closed form from a single thin SVD of the data
+    (see :func:`ridge_path`), through the residuals
+    :math:`\mathbf{e} = (\mathbf{I} - \mathbf{H})\mathbf{Y}` of the hat
+    matrix :math:`\mathbf{H} = \mathbf{U}\frac{\mathbf{S}^2}{\mathbf{S}^2 +
+    \lambda n \mathbf{I}}\mathbf{U^T}`:
+
+    .. math::
+        LOO(\lambda) = \frac{1}{n} \sum_i
+            \left(\frac{e_i}{1 - H_{ii}}\right)^2 \qquad
+        GCV(\lambda) = \frac{\frac{1}{n} \|\mathbf{e}\|_2^2}
+            {(1 - \mathrm{tr}(\mathbf{H}) / n)^2}
+
+    The values where the formulas are not defined (e.g. interpolating
+    solutions with ``lambda = 0``) are `inf`.
+
+    Parameters
+    ----------
+    data : (N, P) ndarray
+        Data matrix.
+    labels : (N,)  or (N, 1) ndarray
+        Labels vector.
+    lambda_range : array_like of float
+        `l2-norm` penalties.
+    criterion : {'loo', 'gcv'}, optional (default is `'loo'`)
+        Exact leave-one-out mean squared error or generalized cross
+        validation.
+    fit_intercept : bool, optional (default is `False`)
+        If `True`, data and labels are centered and the (not penalized)
+        intercept is included in the hat matrix.
+
+    Returns
+    -------
+    errors : (L,) ndarray
+        Value of the criterion for each value in ``lambda_range``.
+
+    Examples
+    --------
+    >>> X = numpy.array([[0.1, 1.1], [0.2, 1.2], [0.3, 1.3], [0.1, 0.9]])
+    >>> Y = numpy.array([0.1, 0.2, 0.2, 0.0])
+    >>> lambdas = [1e-3, 1e-1, 1e1]
+    >>> errors = l1l2py.algorithms.ridge_criterion(X, Y, lambdas, 'gcv')
+    >>> errors.shape
+    (3,)
+    """
+    if criterion not in ('loo', 'gcv'):
+        raise ValueError("criterion should be 'loo' or 'gcv', got %r"
+                         % (criterion,))
+    data = np.asarray(data, dtype=float)
+    labels = np.asarray(labels, dtype=float).ravel()
+    n = data.shape[0]
+    lambda_range = np.asarray(lambda_range, dtype=float).ravel()
+    offset = 0.
+    if fit_intercept:
+        data = data - data.mean(axis=0)
+        labels = labels - labels.mean()
+        offset = 1. / n  # the constant column is orthogonal to data
+
+    U, s, _ = _thin_svd(data)
+    squares = s[:, np.newaxis] ** 2
+    denominator = squares + n * lambda_range
+    shrinkage = squares / np.where(denominator > 0, denominator, 1.)
+    residuals = labels[:, np.newaxis] - U.dot(
+        shrinkage * U.T.dot(labels)[:, np.newaxis])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if criterion == 'loo':
+            leverage = (U ** 2).dot(shrinkage) + offset
+            errors = np.mean((residuals / (1. - leverage)) ** 2, axis=0)
+        else:
+            dof = shrinkage.sum(axis=0) + n * offset
+            errors = np.mean(residuals ** 2, axis=0) / (1. - dof / n) ** 2
+    return np.where(np.isnan(errors), np.inf, errors)
+
+
+def _thin_svd(data):
+    # Thin SVD, with the singular values under the cutoff of the default
+    # pinv set to zero
+    n, p = data.shape
+    U, s, Vt = la.svd(data, full_matrices=False)
+    if s.size:
+        s = np.where(s > s[0] * max(n, p) * np.finfo(float).eps, s, 0.)
+    return U, s, Vt
+
+
+class RidgeCache(object):
+    r"""Ridge regression solutions on (almost) nested supports.
+
+    For each value in ``lambda_range`` it keeps the Cholesky factor of
+    :math:`\mathbf{X_S^T}\mathbf{X_S} + \lambda n \mathbf{I}` on the
+    current support `S`. When variables enter the support the factors get
+    new rows, when they leave the trailing blocks get a rank-one update:
+    along a regularization path, whose supports are nested, the solutions
+    cost about one factorization of the biggest support.
+
+    If a factor is not (numerically) positive definite, as with
+    ``lambda = 0`` on collinear variables, the solutions are computed by
+    :func:`ridge_path`, with the same pseudo-inverse of
+    :func:`ridge_regression`, and the cache is emptied.
+
+    Parameters
+    ----------
+    data : (N, P) ndarray or DataOperator
+        Data matrix.
+    labels : (N,)  or (N, 1) ndarray
+        Labels vector.
+    lambda_range : array_like of `L` floats
+        `l2-norm` penalties.
+
+    Attributes
+    ----------
+    support : ndarray of int
+        Variables of the current factors, in the order they entered.
+    n_updates : int
+        Number of rows added to or removed from the factors.
+
+    Examples
+    --------
+    >>> cache = RidgeCache(X, Y, [0.1, 1.0])
+    >>> for beta in l1l2_path(X, Y, 0.1, tau_range):  # doctest: +SKIP
+    ...     ridge_beta = cache.solve(beta.ravel() != 0)
+    """
+
+    def __init__(self, data, labels, lambda_range):
+        self.data = data
+        self.labels = np.asarray(labels, dtype=float).ravel()
+        self.lambda_range = np.asarray(lambda_range, dtype=float).ravel()
+        self.n_updates = 0
+        self._reset()
+
+    def _reset(self):
+        n = self.data.shape[0]
+        self.support = np.zeros(0, dtype=int)
+        self._columns = np.zeros((n, 0))
+        self._xty = np.zeros(0)
+        self._factors = np.zeros((len(self.lambda_range), 0, 0))
+
+    def solve(self, selected):
+        """Ridge solutions on the ``selected`` variables.
+
+        Parameters
+        ----------
+        selected : (P,) ndarray of bool
+            Support of the solutions.
+
+        Returns
+        -------
+        beta : (S, L) ndarray
+            Solutions on the selected variables (in increasing order), one
+            column for each value in ``lambda_range``.
+        """
+        indices = np.flatnonzero(selected)
+        for position in np.flatnonzero(
+                ~np.isin(self.support, indices))[::-1]:
+            self._remove(position)
+        if not self._append(indices[~np.isin(indices, self.support)]):
+            self._reset()
+            return ridge_path(self.data[:, indices], self.labels,
+                              self.lambda_range)
+
+        beta = np.empty((len(indices), len(self.lambda_range)))
+        for j, factor in enumerate(self._factors):
+            beta[:, j] = la.cho_solve((factor, True), self._xty)
+        return beta[np.argsort(self.support)]
+
+    def _remove(self, position):
+        # The trailing block absorbs the column of the removed variable
+        factors = self._factors
+        _cholesky_update(factors[:, position + 1:, position + 1:],
+                         factors[:, position + 1:, position].copy())
+        keep = np.arange(len(self.support)) != position
+        self._factors = factors[:, keep][:, :, keep]
+        self.support = self.support[keep]
+        self._columns = self._columns[:, keep]
+        self._xty = self._xty[keep]
+        self.n_updates += 1
+
+    def _append(self, indices):
+        # New rows of the factors, False if one is not positive definite
+        if not indices.size:
+            return True
+        n = self.data.shape[0]
+        m, k = len(self.support), len(indices)
+        columns = np.asarray(self.data[:, indices], dtype=float)
+        cross = self._columns.T.dot(columns)
+        gram = columns.T.dot(columns)
+        threshold = np.finfo(float).eps * max(n, m + k)
+
+        factors = np.zeros((len(self.lambda_range), m + k, m + k))
+        factors[:, :m, :m] = self._factors
+        for j, lam in enumerate(self.lambda_range):
+            block = la.solve_triangular(self._factors[j], cross, lower=True)
+            schur = gram + n * lam * np.eye(k) - block.T.dot(block)
+            try:
+                corner = la.cholesky(schur, lower=True)
+            except la.LinAlgError:
+                return False
+            if (np.diag(corner) ** 2).min() <= threshold * (
+                    np.diag(gram).max() + n * lam):
+                return False
+            factors[j, m:, :m] = block.T
+            factors[j, m:, m:] = corner
+
+        self._factors = factors
+        self.support = np.r_[self.support, indices]
+        self._columns = np.c_[self._columns, columns]
+        self._xty = np.r_[self._xty, columns.T.dot(self.labels)]
+        self.n_updates += k
+        return True
+
+
+def _cholesky_update(factors, vectors):
+    # In place rank-one updates L L^T + x x^T of lower Cholesky factors,
+    # stacked on the first axis (vectors is overwritten)
+    for k in xrange(vectors.shape[1]):
+        diagonal = factors[:, k, k]
+        updated = np.hypot(diagonal, vectors[:, k])
+        cos = (updated / diagonal)[:, np.newaxis]
+        sin = (vectors[:, k] / diagonal)[:, np.newaxis]
+        factors[:, k, k] = updated
+        factors[:, k + 1:, k] = (factors[:, k + 1:, k] +
+                                 sin * vectors[:, k + 1:]) / cos
+        vectors[:, k + 1:] = (cos * vectors[:, k + 1:] -
+                              sin * factors[:, k + 1:, k])
+
+
+class FoldGram(object):
+    r"""Gram matrices of the training sets of cross validation splits.
+
+    The training set of a split is the whole data without its test block,
+    so that its statistics are downdates of the ones of the whole data
+
+    .. math::
+        \mathbf{X_{tr}^T}\mathbf{X_{tr}} = \mathbf{X^T}\mathbf{X}
+            - \mathbf{X_{ts}^T}\mathbf{X_{ts}}
+
+    and the same holds for :math:`\mathbf{X^T}\mathbf{Y}` and for the sums
+    of the columns, that give the statistics of the centered (and
+    standardized) training sets. The Gram matrix of the whole data is
+    computed once, then each split only costs the products of its test
+    block, and the `l1l2` path of the split is solved in Gram mode
+    (see :func:`l1l2_path`) without the data.
+
+    If `N < P` the kernel :math:`\mathbf{X}\mathbf{X^T}` is kept instead:
+    the one of a training set is a submatrix (centered on both sides), that
+    gives the maximum eigenvalue of the split without products with the
+    data. The kernel of standardized data cannot be derived in this way.
+
+    Parameters
+    ----------
+    data : (N, P) ndarray
+        Data matrix.
+    labels : (N,)  or (N, 1) ndarray
+        Labels vector.
+    center : bool, optional (default is `False`)
+        If `True`, the columns of each training set are centered (as by
+        :func:`l1l2py.tools.center`).
+    scale : bool, optional (default is `False`)
+        If `True`, the centered columns of each training set are also
+        scaled to unit standard deviation (as by
+        :func:`l1l2py.operators.lazy_standardize`).
+    center_labels : bool, optional (default is `False`)
+        If `True`, the labels of each training set are centered.
+
+    Attributes
+    ----------
+    kernel : bool
+        `True` if the kernel is kept instead of the Gram matrix.
+
+    Raises
+    ------
+    ValueError
+        If ``scale`` is `True` and `N < P`.
+
+    Examples
+    --------
+    >>> folds = FoldGram(X, Y, center=True)
+    >>> for split in cv_splits:  # doctest: +SKIP
+    ...     gram, xty, n, mean, scale = folds.split(X, Y, split)
+    ...     beta_path = l1l2_path(None, None, mu, tau_range, gram=gram,
+    ...                           xty=xty, n_samples=n)
+    """
 
-        return np.dot(tmp, np.dot(data.T, labels.reshape(-1, 1)))
+    def __init__(self, data, labels, center=False, scale=False,
+                 center_labels=False):
+        n, p = data.shape
+        self.center = center or scale
+        self.scale = scale
+        self.center_labels = center_labels
+        self.kernel = n < p
+        if self.kernel and scale:
+            raise ValueError("the kernel of standardized data cannot be "
+                             "downdated, with N < P")
+
+        # centering does not depend on a shift, that avoids cancellations
+        labels = np.asarray(labels, dtype=float).ravel()
+        self._shift = (data.mean(axis=0) if self.center
+                       else np.zeros(p))
+        self._label_shift = (labels.mean() if self.center or center_labels
+                             else 0.)
+        data = np.asarray(data, dtype=float) - self._shift
+        labels = labels - self._label_shift
+        self.n_samples = n
+        if self.kernel:
+            self.gram = data.dot(data.T)
+        else:
+            self.gram = data.T.dot(data)
+            self.xty = data.T.dot(labels)
+            self.sums = data.sum(axis=0)
+            self.label_sum = labels.sum()
+
+    def split(self, data, labels, split):
+        r"""Statistics of the training set of a split.
+
+        Parameters
+        ----------
+        data : (N, P) ndarray
+            Data matrix given to the constructor.
+        labels : (N,)  or (N, 1) ndarray
+            Labels vector given to the constructor.
+        split : tuple
+            Training set and test set indexes.
+
+        Returns
+        -------
+        gram : (P, P) or (N_tr, N_tr) ndarray
+            Gram matrix (or kernel) of the normalized training set.
+        xty : (P,) ndarray or None
+            :math:`\mathbf{X^T}\mathbf{Y}` of the normalized training set
+            (`None` with the kernel).
+        n_samples : int
+            Number of training samples.
+        mean : (P,) ndarray
+            Offsets subtracted from the columns.
+        scale : (P,) ndarray
+            Scale factors of the (centered) columns.
+        """
+        train_idxs, test_idxs = split
+        p = data.shape[1]
+        if self.kernel:
+            train_idxs = np.arange(self.n_samples)[train_idxs]
+            gram = self.gram[np.ix_(train_idxs, train_idxs)]
+            n = gram.shape[0]
+            mean = self._shift
+            if self.center:
+                rows = gram.mean(axis=1)
+                gram = (gram - rows - rows[:, np.newaxis] + rows.mean())
+                mean = mean + (np.asarray(data[train_idxs], dtype=float) -
+                               self._shift).mean(axis=0)
+            return gram, None, n, mean, np.ones(p)
+
+        test = np.asarray(data[test_idxs], dtype=float) - self._shift
+        test_labels = (np.asarray(labels, dtype=float).ravel()[test_idxs] -
+                       self._label_shift)
+        n = self.n_samples - test.shape[0]
+        gram = self.gram - test.T.dot(test)
+        xty = self.xty - test.T.dot(test_labels)
+        sums = self.sums - test.sum(axis=0)
+        mean = self._shift
+        if self.center:
+            offset = sums / n
+            gram -= n * np.outer(offset, offset)
+            mean = mean + offset
+        if self.center or self.center_labels:
+            xty -= sums * ((self.label_sum - test_labels.sum()) / n)
+
+        scale = np.ones(p)
+        if self.scale:
+            std = np.sqrt(np.maximum(np.diag(gram), 0.) / (n - 1))
+            scale = np.where(std > 0, std, 1.)
+            gram /= np.outer(scale, scale)
+            xty /= scale
+        return gram, xty, n, mean, scale
 
 
 def l1l2_path(data, labels, mu, tau_range, beta=None, kmax=100000,
-              tolerance=1e-5, adaptive=False, input_key=None):
+              tolerance=1e-5, adaptive=False, input_key=None,
+              continuation=False, loose_tolerance=1e-2, dfmax=None,
+              pmax=None, return_truncated=False, solver='fista',
+              n_threads=None, max_eigenvalue=None, max_time=None,
+              cancel_token=None, return_status=False, trace=None,
+              gram=None, xty=None, n_samples=None, calibrate=False):
     r"""Efficient solution of different `l1l2` regularization problems on
     increasing values of the `l1-norm` parameter.
 
@@ -153,6 +610,30 @@ def l1l2_path(data, labels, mu, tau_range, beta=None, kmax=100000,
         has reached the limit of allowed iterations), the following solutions
         (for smaller values of ``tau``) are simply the least squares solutions.
 
+    .. note ::
+
+        With ``continuation=True`` each value of ``tau`` is first solved with
+        the looser ``loose_tolerance``. The solution is refined up to
+        ``tolerance`` only if its support differs from the one of the
+        previous (bigger) ``tau`` or if some discarded variable violates the
+        optimality conditions. Since the path is mainly used to warm start
+        the next problem and to select variables, the supports are the same
+        of the ones obtained without continuation, at a fraction of the cost.
+
+    .. note ::
+
+        If ``dfmax`` or ``pmax`` are given, the path stops as soon as a
+        solution exceeds one of the caps: that solution and the ones for
+        smaller values of ``tau`` are not computed (they are the slowest ones)
+        and they are not returned.
+
+    .. note ::
+
+        In the same way, if ``max_time`` is exceeded or ``cancel_token`` is
+        cancelled, the path stops: the (not converged) solution of the
+        current value of ``tau`` and the following ones are not returned
+        and they are counted as truncated.
+
     .. warning ::
 
         The number of solutions can differ from ``len(tau_range)``.
@@ -162,7 +643,7 @@ def l1l2_path(data, labels, mu, tau_range, beta=None, kmax=100000,
 
     Parameters
     ----------
-    data : (N, P) ndarray
+    data : (N, P) ndarray or DataOperator
         Data matrix.
     labels : (N,) or (N, 1) ndarray
         Labels vector.
@@ -180,11 +661,72 @@ def l1l2_path(data, labels, mu, tau_range, beta=None, kmax=100000,
     adaptive : bool, optional (default is `False`)
         If `True`, minimization is performed calculating an adaptive step size
         for each iteration.
+    continuation : bool, optional (default is `False`)
+        If `True`, uses the tolerance continuation strategy described above.
+    loose_tolerance : float, optional (default is `1e-2`)
+        Convergence tolerance used for the intermediate solutions when
+        ``continuation`` is `True`.
+    dfmax : int, optional (default is `None`)
+        Maximum number of selected variables in a solution.
+    pmax : int, optional (default is `None`)
+        Maximum number of variables ever selected along the path.
+    return_truncated : bool, optional (default is `False`)
+        If `True`, returns also the number of (smallest) values in
+        ``tau_range`` discarded because of ``dfmax`` or ``pmax``.
+    solver : {'fista', 'gram', 'shotgun', 'admm', 'auto'}, optional
+        (default is `'fista'`)
+        Algorithm used for each value of ``tau``
+        (see :func:`l1l2_regularization`). With ``'auto'`` the same
+        solver, chosen for the median value of ``tau_range``, is used for
+        the whole path.
+    n_threads : int, optional (default is `None`)
+        Number of threads (see :func:`l1l2_regularization`). With the
+        ``'fista'`` and ``'shotgun'`` solvers the same pool of threads is
+        used for the whole path (with ``'shotgun'``, also the blocks and
+        their Lipschitz constants, see
+        :class:`l1l2py.shotgun.ShotgunMatrix`).
+    max_eigenvalue : float, optional (default is `None`)
+        Upper bound of the maximum eigenvalue of
+        :math:`\mathbf{X^T}\mathbf{X}`. If `None`, it is computed once for
+        the whole path (``'fista'`` and ``'gram'`` solvers only).
+    max_time : float, optional (default is `None`)
+        Maximum running time of the whole path, in seconds.
+    cancel_token : CancellationToken, optional (default is `None`)
+        Token used to stop the computation (see :mod:`l1l2py.budget`).
+    return_status : bool, optional (default is `False`)
+        If `True`, returns also the status of the path: ``'converged'``,
+        ``'max_iter'`` (if some value of ``tau`` reached ``kmax``
+        iterations), ``'timeout'`` or ``'cancelled'``.
+    trace : SolverTrace, optional (default is `None`)
+        Trace of the iterations of the whole path (see
+        :mod:`l1l2py.trace`), each value of ``tau`` is a run.
+    gram : (P, P) ndarray, optional (default is `None`)
+        Precomputed :math:`\mathbf{X^T}\mathbf{X}` of the ``'gram'``
+        solver (with ``'fista'`` it only gives ``max_eigenvalue``).
+        If ``data`` is `None`, the path is computed in Gram mode
+        from ``gram``, ``xty`` and ``n_samples`` only (see
+        :func:`l1l2_regularization`), e.g. on the training sets given by
+        :class:`FoldGram`.
+    xty : (P,) ndarray, optional (default is `None`)
+        Precomputed :math:`\mathbf{X^T}\mathbf{Y}` (Gram mode).
+    n_samples : int, optional (default is `None`)
+        Number of samples (Gram mode).
+    calibrate : bool, optional (default is `False`)
+        With ``solver='auto'``, the solvers are timed on the data if the
+        cache has no timings for a similar problem
+        (see :func:`l1l2py.autotune.select_solver`).
 
     Returns
     -------
     beta_path : list of (P,) or (P, 1) ndarrays
         `l1l2` solutions with at least one non-zero element.
+        If some values are truncated, the first solution corresponds to
+        ``tau_range[truncated]``.
+    truncated : int, optional
+        Number of values in ``tau_range`` discarded because of ``dfmax``,
+        ``pmax``, ``max_time`` or ``cancel_token``.
+    status : str, optional
+        Status of the path.
 
     """
     # if input_key is not None:
@@ -193,29 +735,109 @@ def l1l2_path(data, labels, mu, tau_range, beta=None, kmax=100000,
     #     emergency_log_file = None
 
     # emergency_log("l1l2_path [1]\n", emergency_log_file)
-    n, p = data.shape
-
-    if mu == 0.0:
+    if data is None:
+        # Gram mode
+        solver = 'gram'
+    if solver == 'auto':
+        solver = select_solver(data, labels, mu, np.median(tau_range),
+                               calibrate=calibrate)
+    if solver == 'fista' and n_threads is not None and not isinstance(
+            data, DataOperator):
+        # a single pool of threads for the whole path
+        with ThreadedMatrix(data, n_threads) as threaded_data:
+            return l1l2_path(
+                threaded_data, labels, mu, tau_range, beta=beta, kmax=kmax,
+                tolerance=tolerance, adaptive=adaptive, input_key=input_key,
+                continuation=continuation, loose_tolerance=loose_tolerance,
+                dfmax=dfmax, pmax=pmax, return_truncated=return_truncated,
+                solver=solver, n_threads=n_threads,
+                max_eigenvalue=max_eigenvalue, max_time=max_time,
+                cancel_token=cancel_token, return_status=return_status,
+                trace=trace, gram=gram, xty=xty, n_samples=n_samples,
+                calibrate=calibrate)
+    if solver == 'shotgun' and not isinstance(data, ShotgunMatrix):
+        # blocks, Lipschitz constants and threads shared by the path
+        with ShotgunMatrix(data, n_threads) as shotgun_data:
+            return l1l2_path(
+                shotgun_data, labels, mu, tau_range, beta=beta, kmax=kmax,
+                tolerance=tolerance, adaptive=adaptive, input_key=input_key,
+                continuation=continuation, loose_tolerance=loose_tolerance,
+                dfmax=dfmax, pmax=pmax, return_truncated=return_truncated,
+                solver=solver, n_threads=n_threads,
+                max_eigenvalue=max_eigenvalue, max_time=max_time,
+                cancel_token=cancel_token, return_status=return_status,
+                trace=trace, gram=gram, xty=xty, n_samples=n_samples,
+                calibrate=calibrate)
+    n, p = data.shape if data is not None else (n_samples, gram.shape[0])
+
+    if mu == 0.0 and data is None:
+        beta_ls = np.dot(la.pinv(gram), xty).reshape(p, 1)
+    elif mu == 0.0:
         beta_ls = ridge_regression(data, labels)
     if beta is None:
         beta = np.zeros((p, 1))
+    # Values shared by all the values of tau
+    use_gram = data is None or (solver == 'gram' and n >= p)
+    if use_gram and gram is None:
+        gram = _gram(data)
+    if solver in ('fista', 'gram') and max_eigenvalue is None:
+        # a given Gram matrix gives the step size also to 'fista'
+        max_eigenvalue = (lipschitz(data) if gram is None
+                          else la.norm(gram, 2))
+    if not use_gram:
+        gram = xty = None
+    budget = make_budget(max_time, cancel_token)
+
+    def solve(tau, beta, tolerance):
+        beta, k, status = l1l2_regularization(
+            data, labels, mu, tau, beta, kmax, tolerance,
+            return_iterations=True, adaptive=adaptive, solver=solver,
+            n_threads=n_threads, max_eigenvalue=max_eigenvalue, gram=gram,
+            max_time=None if budget is None else budget.remaining,
+            cancel_token=cancel_token, return_status=True, trace=trace,
+            xty=xty, n_samples=n)
+        statuses.add(status)
+        return beta
 
     # emergency_log("l1l2_path [2]\n", emergency_log_file)
 
     out = deque()
     nonzero = 0
+    support = (beta.flat != 0)
+    ever_selected = np.zeros(p, dtype=bool)
+    truncated = 0
+    statuses = set()
     # Taus are used from the biggest (sparser solutions)
     # to the smallest (less sparse solutions)
-    for tau in reversed(tau_range):
+    for i, tau in enumerate(reversed(tau_range)):
         if mu == 0.0 and nonzero >= n:  # lasso saturation
             beta_next = beta_ls
+        elif continuation:
+            beta_next = solve(tau, beta, max(tolerance, loose_tolerance))
+            if (budget is None or not budget.expired()) and \
+                    not _stable_support(data, labels, tau, beta_next, support,
+                                        gram, xty, n):
+                # the support is still changing: tighten the tolerance
+                beta_next = solve(tau, beta_next, tolerance)
         else:
-            beta_next = l1l2_regularization(data, labels, mu, tau, beta,
-                                            kmax, tolerance, adaptive=adaptive)
+            beta_next = solve(tau, beta, tolerance)
 
         # emergency_log("l1l2_path [3] [inside tau]\n", emergency_log_file)
 
+        if budget is not None and budget.expired():
+            # the solution is not converged, it is discarded with
+            # the remaining ones
+            truncated = len(tau_range) - i
+            break
+
         nonzero = len(beta_next.nonzero()[0])
+        ever_selected |= (beta_next.flat != 0)
+        if ((dfmax is not None and nonzero > dfmax) or
+                (pmax is not None and ever_selected.sum() > pmax)):
+            # the remaining (less sparse) solutions are discarded
+            truncated = len(tau_range) - i
+            break
+
         if nonzero > 0:
             # vectors are appended to the left of the queue,
             # so that the out list contains betas ordered from
@@ -223,15 +845,151 @@ def l1l2_path(data, labels, mu, tau_range, beta=None, kmax=100000,
             out.appendleft(beta_next)
 
         beta = beta_next
+        support = (beta.flat != 0)
 
     # emergency_log("l1l2_path [4]\n", emergency_log_file)
 
+    if budget is not None and budget.expired():
+        status = budget.status
+    else:
+        status = 'max_iter' if 'max_iter' in statuses else 'converged'
+
+    out = (out,)
+    if return_truncated:
+        out += (truncated,)
+    if return_status:
+        out += (status,)
+    return out if len(out) > 1 else out[0]
+
+
+def _stable_support(data, labels, tau, beta, support, gram=None, xty=None,
+                    n_samples=None):
+    r"""Check if a (loose) `l1l2` solution can be accepted along the path.
+
+    The solution is accepted if its support is the same of the previous
+    solution and the discarded variables satisfy the optimality conditions
+    of the `l1l2` functional.
+    """
+    selected = (beta.flat != 0)
+    if not np.array_equal(selected, support):
+        return False
+
+    if data is None:
+        n = n_samples
+        correlation = np.asarray(xty).reshape(-1, 1) - gram.dot(beta)
+    else:
+        n = data.shape[0]
+        residual = np.asarray(labels).reshape(-1, 1) - data.dot(beta)
+        correlation = data.T.dot(residual)
+    corr = np.abs(correlation[~selected]) * (2. / n)
+    return not np.any(corr > tau)
+
+
+def l1l2_path_append(data, new_data, labels, mu, tau_range, beta_path,
+                     max_eigenvalue=None, kmax=100000, tolerance=1e-5,
+                     adaptive=False, return_eigenvalue=False):
+    r"""Update a `l1l2` regularization path when new variables are appended.
+
+    Given the path ``beta_path`` computed by :func:`l1l2_path` on ``data``,
+    computes the path on the data matrix with the columns of ``new_data``
+    appended, each solution being extended with zero coefficients for the
+    new variables.
+
+    For each value of ``tau``, the new variables are first screened against
+    the residual of the old solution: if all of them satisfy the optimality
+    conditions of the `l1l2` functional, the extended solution is already
+    optimal and the problem is not solved again. Otherwise the extended
+    solution is used to warm start the iterations.
+
+    The maximum eigenvalue of :math:`\mathbf{X^T}\mathbf{X}` is not
+    recomputed: by Weyl's inequality the eigenvalues of
+    :math:`\mathbf{X}\mathbf{X^T} + \mathbf{Z}\mathbf{Z^T}`,
+    with :math:`\mathbf{Z}` the new block of `K` columns (a rank-`K`
+    update), are bounded by the old ones plus the maximum eigenvalue of
+    :math:`\mathbf{Z^T}\mathbf{Z}`, that only costs a `K` by `K` problem.
+
+    Parameters
+    ----------
+    data : (N, P) ndarray
+        Data matrix used to compute ``beta_path``.
+    new_data : (N, K) ndarray
+        Appended columns.
+    labels : (N,) or (N, 1) ndarray
+        Labels vector.
+    mu : float
+        `l2-norm` penalty.
+    tau_range : array_like of float
+        `l1-norm` penalties in increasing order.
+    beta_path : list of (P,) or (P, 1) ndarrays
+        Path on ``data`` as returned by :func:`l1l2_path` (without
+        truncation). Missing solutions for the biggest values of
+        ``tau_range`` are assumed to contain only zeros.
+    max_eigenvalue : float, optional (default is `None`)
+        Maximum eigenvalue (or upper bound) for ``data``, as returned by a
+        previous call with ``return_eigenvalue=True``.
+        If `None`, it is computed.
+    kmax : int, optional (default is `1e5`)
+        Maximum number of iterations.
+    tolerance : float, optional (default is `1e-5`)
+        Convergence tolerance.
+    adaptive : bool, optional (default is `False`)
+        If `True`, minimization is performed calculating an adaptive step size
+        for each iteration.
+    return_eigenvalue : bool, optional (default is `False`)
+        If `True`, returns also the upper bound of the maximum eigenvalue
+        for the extended data matrix, that can be used to append further
+        variables.
+
+    Returns
+    -------
+    beta_path : list of (P + K, 1) ndarrays
+        `l1l2` solutions with at least one non-zero element.
+    max_eigenvalue : float, optional
+        Upper bound of the maximum eigenvalue for the extended data matrix.
+
+    """
+    n, p = data.shape
+    k = new_data.shape[1]
+    labels = np.asarray(labels).reshape(-1, 1)
+
+    if max_eigenvalue is None:
+        max_eigenvalue = lipschitz(data)
+    max_eigenvalue += lipschitz(new_data)
+    extended_data = np.hstack((data, new_data))
+
+    out = deque()
+    for i in reversed(range(len(tau_range))):
+        tau = tau_range[i]
+        if i < len(beta_path):
+            beta = np.asarray(beta_path[i]).reshape(-1, 1)
+        else:
+            beta = np.zeros((p, 1))
+        beta_next = np.vstack((beta, np.zeros((k, 1))))
+
+        residual = labels - data.dot(beta)
+        corr = np.abs(new_data.T.dot(residual)) * (2. / n)
+        if np.any(corr > tau):
+            # some new variable enters the model
+            beta_next = l1l2_regularization(extended_data, labels, mu, tau,
+                                            beta_next, kmax, tolerance,
+                                            adaptive=adaptive,
+                                            max_eigenvalue=max_eigenvalue)
+
+        if np.any(beta_next):
+            out.appendleft(beta_next)
+
+    if return_eigenvalue:
+        return out, max_eigenvalue
     return out
 
 
 def l1l2_regularization(data, labels, mu, tau, beta=None, kmax=100000,
                         tolerance=1e-5, return_iterations=False,
-                        adaptive=False):
+                        adaptive=False, solver='fista', n_threads=None,
+                        max_eigenvalue=None, gram=None, max_time=None,
+                        cancel_token=None, return_status=False, trace=None,
+                        decomposition=None, xty=None, n_samples=None,
+                        calibrate=False):
     r"""Implementation of the Fast Iterative Shrinkage-Thresholding Algorithm
     to solve a least squares problem with `l1l2` penalty.
 
@@ -240,8 +998,9 @@ def l1l2_regularization(data, labels, mu, tau, beta=None, kmax=100000,
 
     Parameters
     ----------
-    data : (N, P) ndarray
-        Data matrix.
+    data : (N, P) ndarray or DataOperator or None
+        Data matrix. If `None`, the problem is given by ``gram``, ``xty``
+        and ``n_samples`` (Gram mode, only with the ``'gram'`` solver).
     labels : (N,) or (N, 1) ndarray
         Labels vector.
     mu : float
@@ -262,6 +1021,63 @@ def l1l2_regularization(data, labels, mu, tau, beta=None, kmax=100000,
     adaptive : bool, optional (default is `False`)
         If `True`, minimization is performed calculating an adaptive step size
         for each iteration.
+        With the ``'admm'`` solver, the penalty parameter ``rho`` is adapted
+        to balance the primal and dual residuals.
+    solver : {'fista', 'gram', 'shotgun', 'admm', 'auto'}, optional
+        (default is `'fista'`)
+        If ``'gram'``, FISTA works on the precomputed
+        :math:`\mathbf{X^T}\mathbf{X}` (only if `N` >= `P`, otherwise it is
+        the same of ``'fista'``).
+        If ``'shotgun'``, the problem is solved with the parallel coordinate
+        descent of :func:`l1l2py.shotgun.shotgun_l1l2` and ``kmax`` is the
+        maximum number of epochs. It is convenient when `P` is large and
+        the solution is sparse.
+        If ``'admm'``, the problem is solved with
+        :func:`l1l2py.admm.enet_admm` (a whole path is solved with a single
+        factorization by :func:`l1l2py.admm.l1l2_path`).
+        If ``'auto'``, the solver is chosen by
+        :func:`l1l2py.autotune.select_solver`.
+    n_threads : int, optional (default is `None`)
+        Number of threads used by the ``'shotgun'`` solver
+        (if `None`, the number of CPUs is used).
+        With the ``'fista'`` solver, if it is given, the products with the
+        data matrix and the updates of the solution are split in blocks
+        processed by ``n_threads`` threads (see
+        :class:`l1l2py.operators.ThreadedMatrix`).
+    max_eigenvalue : float, optional (default is `None`)
+        Upper bound of the maximum eigenvalue of
+        :math:`\mathbf{X^T}\mathbf{X}`, used by the ``'fista'`` solver in
+        place of the exact value.
+    gram : (P, P) ndarray, optional (default is `None`)
+        Precomputed :math:`\mathbf{X^T}\mathbf{X}` used by the ``'gram'``
+        solver. If `None`, it is computed.
+    max_time : float, optional (default is `None`)
+        Maximum running time in seconds.
+    cancel_token : CancellationToken, optional (default is `None`)
+        Token used to stop the computation (see :mod:`l1l2py.budget`).
+    return_status : bool, optional (default is `False`)
+        If `True`, returns also the status of the solution: ``'converged'``,
+        ``'max_iter'``, ``'timeout'`` or ``'cancelled'``. In the last two
+        cases an approximate solution is returned (the best iterate
+        found with FISTA, see :mod:`l1l2py.budget`).
+    trace : SolverTrace, optional (default is `None`)
+        If given, the objective value, the step size, the size of the
+        support and the elapsed time of each iteration are recorded, with
+        counters of the products with the data (see :mod:`l1l2py.trace`).
+    decomposition : tuple of ndarrays, optional (default is `None`)
+        Eigendecomposition of the data computed by
+        :func:`l1l2py.admm.eigen_decomposition`, used by the ``'admm'``
+        solver in place of a Cholesky factorization. It does not depend on
+        ``mu``, so it can be shared by different values of ``mu``.
+    xty : (P,) ndarray, optional (default is `None`)
+        Precomputed :math:`\mathbf{X^T}\mathbf{Y}` of the ``'gram'``
+        solver (needed if ``data`` is `None`).
+    n_samples : int, optional (default is `None`)
+        Number of samples, needed only if ``data`` is `None`.
+    calibrate : bool, optional (default is `False`)
+        With ``solver='auto'``, the solvers are timed on the data if the
+        cache has no timings for a similar problem
+        (see :func:`l1l2py.autotune.select_solver`).
 
     Returns
     -------
@@ -269,6 +1085,8 @@ def l1l2_regularization(data, labels, mu, tau, beta=None, kmax=100000,
         `l1l2` solution.
     k : int, optional
         Number of iterations performed.
+    status : str, optional
+        Status of the solution.
 
     Examples
     --------
@@ -280,94 +1098,81 @@ def l1l2_regularization(data, labels, mu, tau, beta=None, kmax=100000,
     1
 
     """
-    # Useful quantities
-    X = np.asarray(data)
-    Y = np.asarray(labels).reshape(-1, 1)
-    n, d = data.shape
+    if data is None:
+        # Gram mode: the data enter only through gram and xty
+        n, d = n_samples, gram.shape[0]
+        if solver not in ('gram', 'fista', 'auto'):
+            raise ValueError("without data the solver must be 'gram', "
+                             "got %r" % (solver,))
+        solver = 'gram'
+    else:
+        n, d = data.shape
 
     # beta starts from 0 and we assume also that the previous value is 0
     if beta is None:
-        beta = np.zeros((d, 1))
+        beta = np.zeros(d)
+
+    if data is not None and not isinstance(data, DataOperator):
+        data = np.asarray(data)
+
+    if solver == 'auto':
+        solver = select_solver(data, labels, mu, tau, calibrate=calibrate)
+    budget = make_budget(max_time, cancel_token)
+
+    if solver == 'fista' and n_threads is not None and not isinstance(
+            data, DataOperator):
+        with ThreadedMatrix(data, n_threads) as threaded_data:
+            beta, k = l1l2_fista(threaded_data, labels, mu, tau, beta.ravel(),
+                                 max_iter=kmax, tol=tolerance,
+                                 adaptive=adaptive,
+                                 max_eigenvalue=max_eigenvalue, budget=budget,
+                                 trace=trace)
+    elif solver in ('fista', 'gram'):
+        if data is None:
+            pass
+        elif solver == 'fista' or n < d:
+            gram = xty = None
+        elif gram is None:
+            gram = _gram(data)
+        beta, k = l1l2_fista(data, labels, mu, tau, beta.ravel(),
+                             max_iter=kmax, tol=tolerance, adaptive=adaptive,
+                             gram=gram, xty=xty, n_samples=n,
+                             max_eigenvalue=max_eigenvalue, budget=budget,
+                             trace=trace)
+    elif solver == 'shotgun':
+        beta, k = shotgun_l1l2(data, labels, mu, tau, beta.ravel(),
+                               max_iter=kmax, tol=tolerance,
+                               n_threads=n_threads, budget=budget,
+                               trace=trace)
+    elif solver == 'admm':
+        from l1l2py.admm import enet_admm, EigenUpdate
+        x_update = None
+        if decomposition is not None:
+            x_update = EigenUpdate(data, 1.0, mu, decomposition)
+        beta, _, _, k = enet_admm(data, np.asarray(labels).ravel(),
+                                  z=beta, max_iter=kmax, rel_tol=tolerance,
+                                  tau=tau, mu=mu, max_time=max_time,
+                                  cancel_token=cancel_token, trace=trace,
+                                  x_update=x_update, adaptive_rho=adaptive)
+        if budget is not None:
+            budget.expired()  # same limits of the ADMM iterations
     else:
-        beta = beta.reshape((d, 1))
-
-    if n > d:
-        XTY = np.dot(X.T, Y)
-
-    # First iteration with standard sigma
-    sigma = _sigma(data, mu)
-    if sigma < np.finfo(float).eps:  # is zero...
-        return beta, 0
-
-    mu_s = mu / sigma
-    tau_s = tau / (2.0 * sigma)
-    nsigma = n * sigma
+        raise ValueError("solver must be one of 'fista', 'gram', 'shotgun', "
+                         "'admm' or 'auto', got %r" % (solver,))
+    beta = beta.reshape((d, 1))
 
-    # Starting conditions
-    aux_beta = beta
-    t = 1.
-
-    for k in xrange(kmax):
-        # Pre-calculated "heavy" computation
-        if n > d:
-            precalc = XTY - np.dot(X.T, np.dot(X, aux_beta))
-        else:
-            precalc = np.dot(X.T, Y - np.dot(X, aux_beta))
-
-        # Soft-Thresholding
-        value = (precalc / nsigma) + ((1.0 - mu_s) * aux_beta)
-        beta_next = np.sign(value) * np.clip(np.abs(value) - tau_s, 0, np.inf)
-
-        # ## Adaptive step size #######################################
-        if adaptive:
-            beta_diff = (aux_beta - beta_next)
-
-            # Only if there is an increment of the solution
-            # we can calculate the adaptive step-size
-            if np.any(beta_diff):
-                # grad_diff = np.dot(XTn, np.dot(X, beta_diff))
-                # num = np.dot(beta_diff, grad_diff)
-                tmp = np.dot(X, beta_diff)  # <-- adaptive-step-size drawback
-                num = np.dot(tmp, tmp) / n
-
-                sigma = (num / np.dot(beta_diff, beta_diff))
-                mu_s = mu / sigma
-                tau_s = tau / (2.0*sigma)
-                nsigma = n * sigma
-
-                # Soft-Thresholding
-                value = (precalc / nsigma) + ((1.0 - mu_s) * aux_beta)
-                beta_next = np.sign(value) * np.clip(
-                    np.abs(value) - tau_s, 0, np.inf)
-
-        # FISTA ####################################################
-        beta_diff = (beta_next - beta)
-        t_next = 0.5 * (1.0 + np.sqrt(1.0 + 4.0 * t * t))
-        aux_beta = beta_next + ((t - 1.0) / t_next) * beta_diff
-
-        # Convergence values
-        max_diff = np.abs(beta_diff).max()
-        max_coef = np.abs(beta_next).max()
-
-        # Values update
-        t = t_next
-        beta = beta_next
-
-        # Stopping rule (exit even if beta_next contains only zeros)
-        if max_coef == 0.0 or (max_diff / max_coef) <= tolerance:
-            break
+    if budget is not None and budget.status is not None:
+        status = budget.status
+    else:
+        status = 'max_iter' if k >= kmax else 'converged'
 
+    out = (beta,)
     if return_iterations:
-        return beta, k + 1
-    return beta
+        out += (k,)
+    if return_status:
+        out += (status,)
+    return out if len(out) > 1 else out[0]
 
 
 def _sigma(matrix, mu):
-    n, p = matrix.shape
-
-    if p > n:
-        tmp = np.dot(matrix, matrix.T)
-    else:
-        tmp = np.dot(matrix.T, matrix)
-
-    return (la.norm(tmp, 2) / n) + mu
+    return (lipschitz(matrix) / matrix.shape[0]) + mu
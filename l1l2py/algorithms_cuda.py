@@ -47,7 +47,7 @@ LIB_ALG = ctypes.CDLL(os.path.join(os.path.dirname(
 
 
 def l1l2_path(data, labels, mu, tau_range, beta=None, kmax=100000,
-              tolerance=1e-5, adaptive=False, input_key=None):
+              tolerance=1e-5, adaptive=False, input_key=None, trace=None):
     r"""Efficient solution of different `l1l2` regularization problems on
     increasing values of the `l1-norm` parameter.
 
@@ -91,6 +91,11 @@ def l1l2_path(data, labels, mu, tau_range, beta=None, kmax=100000,
     adaptive : bool, optional (default is `False`)
         If `True`, minimization is performed calculating an adaptive step size
         for each iteration.
+    trace : SolverTrace, optional (default is `None`)
+        The device does not return its iterations: one record for each
+        returned solution is stored, with the objective evaluated on the
+        host, and the counters are estimated from the total number of
+        iterations (see :mod:`l1l2py.trace`).
 
     Returns
     -------
@@ -141,5 +146,17 @@ def l1l2_path(data, labels, mu, tau_range, beta=None, kmax=100000,
 
     # emergency_log("l1l2_path_cuda [3]\n", emergency_log_file)
     out_list = [out[i, :] for i in range(n_tau - n_betas_out.value, n_tau)]
+    if trace is not None:
+        trace.start()
+        trace.count(matvecs=2 * k_final.value,
+                    flops=4 * n * p * k_final.value, allocations=n_tau + 3)
+        for i in range(n_tau - n_betas_out.value, n_tau):
+            beta_i = out[i].astype(float)
+            residual = labels.ravel() - np.dot(data, beta_i)
+            trace.record(k_final.value,
+                         (np.dot(residual, residual) / n +
+                          mu * np.dot(beta_i, beta_i) +
+                          tau_range[i] * np.abs(beta_i).sum()),
+                         np.nan, np.count_nonzero(beta_i))
     # emergency_log("l1l2_path_cuda [4]\n", emergency_log_file)
     return out_list
@@ -0,0 +1,240 @@
+r"""Automatic selection of the `l1l2` solver.
+
+The solvers of :func:`l1l2py.algorithms.l1l2_regularization` have very
+different costs depending on the shape of the data, on its sparsity and on
+the sparsity of the solution (that is, on ``tau``):
+
+* ``'fista'`` works on every kind of data matrix and it is the default;
+* ``'gram'`` (FISTA on :math:`\mathbf{X^T}\mathbf{X}`) is convenient when
+  `N` is much bigger than `P`;
+* ``'shotgun'`` (parallel coordinate descent) is convenient when `P` is
+  much bigger than `N` and the solution is very sparse;
+* ``'admm'`` factorizes the data once and it is convenient when `P` is
+  small and many iterations are needed (small ``tau``).
+
+:func:`select_solver` chooses the solver with these heuristics or, if
+requested, with short calibration runs. The timings of the calibration
+runs are stored in a cache file, keyed by the machine and by a bucket of
+the problem size (powers of two of `N` and `P`, decades of the density of
+the data and of ``tau`` relative to its maximum value), so that similar
+problems are solved with the fastest solver found so far, whatever the
+set of candidate solvers (only the missing ones are timed).
+
+The calibration is requested with ``calibrate=True`` in
+:func:`l1l2py.algorithms.l1l2_regularization`,
+:func:`l1l2py.algorithms.l1l2_path`, :func:`l1l2py.core.model_selection`
+and :class:`l1l2py.regression.L1L2`, together with ``solver='auto'``.
+
+The cache file is ``~/.l1l2py/autotune.json``, unless the environment
+variable ``L1L2PY_AUTOTUNE_CACHE`` is set.
+"""
+
+# This code is written by
+#       Federico Tomasi <federico.tomasi@dibris.unige.it>
+# Copyright (C) 2017 SlipGURU -
+# Statistical Learning and Image Processing Genoa University Research Group
+# Via Dodecaneso, 35 - 16146 Genova, ITALY.
+#
+# This file is part of L1L2Py.
+#
+# L1L2Py is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# L1L2Py is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import multiprocessing
+import os
+import platform
+import tempfile
+import time
+
+import numpy as np
+from scipy import sparse
+
+__all__ = ('SOLVERS', 'select_solver', 'cache_path')
+
+SOLVERS = ('fista', 'gram', 'shotgun', 'admm')
+
+
+def cache_path():
+    """Path of the file storing the calibrated choices."""
+    path = os.environ.get('L1L2PY_AUTOTUNE_CACHE')
+    if path is None:
+        path = os.path.join(os.path.expanduser('~'), '.l1l2py',
+                            'autotune.json')
+    return path
+
+
+def _machine():
+    # The same cache file can be shared by different machines
+    return '%s/%s/%d' % (platform.node(), platform.machine(),
+                         multiprocessing.cpu_count())
+
+
+def _density(data):
+    n, p = data.shape
+    if sparse.issparse(data):
+        return data.nnz / float(n * p)
+    return 1.0
+
+
+def _decade(value):
+    return int(np.floor(np.log10(value))) if value > 0 else None
+
+
+def _bucket(data, tau_ratio):
+    n, p = data.shape
+    return 'n%d-p%d-d%s-t%s' % (int(np.log2(max(n, 1))),
+                                int(np.log2(max(p, 1))),
+                                _decade(_density(data)), _decade(tau_ratio))
+
+
+def _heuristic(data, tau_ratio, candidates):
+    # The first preferred solver among the candidates
+    n, p = data.shape
+    preferences = []
+    if not sparse.issparse(data) and data.ndim == 2:
+        if isinstance(data, np.ndarray) and p <= 1024 and tau_ratio < 1e-2:
+            # many iterations, a single small factorization
+            preferences.append('admm')
+        if n >= 2 * p and p <= 4096:
+            preferences.append('gram')
+        if p >= 10 * n and tau_ratio >= 0.1:
+            preferences.append('shotgun')
+    preferences.append('fista')
+    for choice in preferences:
+        if choice in candidates:
+            return choice
+    return candidates[0]
+
+
+def _load(path):
+    try:
+        with open(path) as cache_file:
+            return json.load(cache_file)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def _store(path, cache):
+    # Atomic replacement of the cache file
+    directory = os.path.dirname(path) or '.'
+    tmp_path = None
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as cache_file:
+            json.dump(cache, cache_file, indent=1, sort_keys=True)
+        os.rename(tmp_path, path)
+        tmp_path = None
+    except (IOError, OSError, TypeError, ValueError):
+        pass  # the cache is only an optimization
+    finally:
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def _calibrate(data, labels, mu, tau, candidates, tolerance, kmax):
+    # Time to reach a loose tolerance, the fastest solver is returned
+    from l1l2py.algorithms import l1l2_regularization
+
+    timings = {}
+    for solver in candidates:
+        start = time.time()
+        try:
+            l1l2_regularization(data, labels, mu, tau, kmax=kmax,
+                                tolerance=tolerance, solver=solver)
+        except Exception:  # the solver does not support the data
+            timings[solver] = None
+            continue
+        timings[solver] = time.time() - start
+    return timings
+
+
+def _fastest(timings, candidates):
+    # Fastest candidate with a timing (None if there is none)
+    timed = [s for s in candidates if timings.get(s) is not None]
+    if not timed:
+        return None
+    return min(timed, key=timings.get)
+
+
+def select_solver(data, labels, mu, tau, candidates=SOLVERS,
+                  calibrate=False, tolerance=1e-2, kmax=1000, path=None):
+    r"""Choose the fastest solver of the `l1l2` problem.
+
+    If the timings of all the candidates on the same machine and on a
+    similar problem are stored in the cache, the fastest one is returned.
+    Otherwise, the solver is chosen with heuristics on the shape and on the
+    sparsity of the data or, if ``calibrate`` is `True`, solving the
+    problem with each candidate not timed yet with a loose tolerance. The
+    timings of the calibration runs are stored in the cache (the solvers
+    which fail are stored too, and never chosen).
+
+    Parameters
+    ----------
+    data : (N, P) ndarray, scipy.sparse matrix or DataOperator
+        Data matrix.
+    labels : (N,) or (N, 1) ndarray
+        Labels vector.
+    mu : float
+        `l2-norm` penalty.
+    tau : float
+        `l1-norm` penalty.
+    candidates : sequence of str, optional (default is :data:`SOLVERS`)
+        Solvers among which the choice is made.
+    calibrate : bool, optional (default is `False`)
+        If `True`, the candidates without a timing in the cache are timed
+        on the problem.
+    tolerance : float, optional (default is `1e-2`)
+        Convergence tolerance of the calibration runs.
+    kmax : int, optional (default is `1000`)
+        Maximum number of iterations of the calibration runs.
+    path : str, optional (default is `None`)
+        Cache file. If `None`, :func:`cache_path` is used.
+
+    Returns
+    -------
+    solver : str
+        Name of the chosen solver.
+    """
+    from l1l2py.algorithms import l1_bound
+
+    candidates = [s for s in candidates if s in SOLVERS]
+    if not candidates:
+        raise ValueError("candidates must be a subset of %s" % (SOLVERS,))
+
+    tau_max = l1_bound(data, labels)
+    tau_ratio = tau / tau_max if tau_max > 0 else 1.0
+    path = cache_path() if path is None else path
+    key = '%s|%s' % (_machine(), _bucket(data, tau_ratio))
+
+    cache = _load(path)
+    timings = cache.get(key, {}).get('timings', {})
+    missing = [s for s in candidates if s not in timings]
+    if calibrate and missing:
+        timings.update(_calibrate(data, labels, mu, tau, missing,
+                                  tolerance, kmax))
+        cache[key] = {'solver': _fastest(timings, SOLVERS),
+                      'timings': timings}
+        _store(path, cache)
+
+    solver = None
+    if all(s in timings for s in candidates):
+        solver = _fastest(timings, candidates)
+    if solver is None:
+        return _heuristic(data, tau_ratio, candidates)
+    return solver
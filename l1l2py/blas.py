@@ -0,0 +1,116 @@
+"""Budget of cores shared by parallel workers and the BLAS library.
+
+When the cross validation splits (or the points of a grid search) run in
+parallel, each worker calls a multithreaded BLAS (OpenBLAS, MKL), that by
+default starts one thread for each core: with `W` workers the machine runs
+`W` times more threads than cores, and the throughput can drop below the
+serial one.
+
+:func:`thread_budget` splits a budget of `C` cores (all the cores of the
+machine, by default) with the following heuristic:
+
+* the workers are `W = min(n_jobs, n_tasks, C)`: the splits are
+  independent and their parallel speedup is almost linear, while the BLAS
+  calls of the solvers are mostly matrix-vector products, that are memory
+  bound and scale poorly with the number of threads;
+* each worker gets `T = max(1, C // W)` BLAS threads, so that the cores left
+  by the workers (e.g. with 5 splits on 16 cores) are used by the BLAS.
+
+:func:`blas_threads` applies the limit with `threadpoolctl`, if it is
+installed (it is an optional dependency, since it does not support
+Python 2). Otherwise the BLAS is not limited, and :func:`thread_budget`
+warns when the work is split among several workers. The limit is set for the
+whole process, because OpenBLAS and MKL keep a single pool of threads:
+with a backend of threads it is set around the parallel section, with a
+backend of processes by each worker when it starts.
+"""
+
+# This code is written by
+#       Federico Tomasi <federico.tomasi@dibris.unige.it>
+# Copyright (C) 2017 SlipGURU -
+# Statistical Learning and Image Processing Genoa University Research Group
+# Via Dodecaneso, 35 - 16146 Genova, ITALY.
+#
+# This file is part of L1L2Py.
+#
+# L1L2Py is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# L1L2Py is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
+
+import multiprocessing
+import warnings
+from contextlib import contextmanager
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+__all__ = ('thread_budget', 'blas_threads')
+
+# limits of the worker processes, kept alive for their whole life
+_worker_limits = None
+
+
+def thread_budget(n_jobs, n_tasks, n_cores=None):
+    """Number of workers and of BLAS threads for each worker.
+
+    Parameters
+    ----------
+    n_jobs : int
+        Requested number of workers. Negative values count from the
+        number of cores, as in `joblib`: `-1` means one for each core,
+        `-2` all the cores but one, and so on.
+    n_tasks : int
+        Number of independent tasks (e.g. cross validation splits).
+    n_cores : int, optional (default is `None`)
+        Budget of cores. If `None`, all the cores of the machine.
+
+    Returns
+    -------
+    n_workers : int
+        Number of parallel workers.
+    n_threads : int
+        Number of BLAS threads of each worker.
+    """
+    if n_cores is None:
+        n_cores = multiprocessing.cpu_count()
+    if n_jobs < 0:
+        n_jobs = n_cores + 1 + n_jobs
+    n_workers = max(1, min(n_jobs, n_tasks, n_cores))
+    if n_workers > 1 and threadpool_limits is None:
+        warnings.warn("threadpoolctl is not installed: the BLAS threads of "
+                      "the %d parallel workers are not limited, and the "
+                      "cores may be oversubscribed." % n_workers,
+                      RuntimeWarning)
+    return n_workers, max(1, n_cores // n_workers)
+
+
+@contextmanager
+def blas_threads(n_threads):
+    """Limit the BLAS threads of the process inside the context.
+
+    Nothing is limited if ``n_threads`` is `None` or if `threadpoolctl` is
+    not installed.
+    """
+    if n_threads is None or threadpool_limits is None:
+        yield
+        return
+    with threadpool_limits(limits=n_threads, user_api='blas'):
+        yield
+
+
+def _limit_worker(n_threads):
+    # Initializer of the worker processes
+    global _worker_limits
+    if threadpool_limits is not None:
+        _worker_limits = threadpool_limits(limits=n_threads, user_api='blas')
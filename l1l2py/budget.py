@@ -0,0 +1,123 @@
+"""Wall-clock budgets and cooperative cancellation of the solvers.
+
+The iterative solvers accept a maximum running time (``max_time``, in
+seconds) and a :class:`CancellationToken`, that can be cancelled from
+another thread. Both are checked every few iterations: when the time is
+over or the token is cancelled, the solver stops and returns an
+approximate solution, with status ``'timeout'`` or ``'cancelled'`` instead of
+``'converged'`` (or ``'max_iter'``, if the maximum number of iterations
+is reached).
+
+FISTA does not decrease the objective at each iteration, so it returns the
+iterate with the lowest objective (evaluated at each iteration when a
+budget is given). The coordinate descent of the shotgun solver is
+monotone and returns the last iterate, as ADMM does.
+"""
+
+# This code is written by
+#       Federico Tomasi <federico.tomasi@dibris.unige.it>
+# Copyright (C) 2017 SlipGURU -
+# Statistical Learning and Image Processing Genoa University Research Group
+# Via Dodecaneso, 35 - 16146 Genova, ITALY.
+#
+# This file is part of L1L2Py.
+#
+# L1L2Py is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# L1L2Py is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+
+__all__ = ('CancellationToken', 'Budget')
+
+
+class CancellationToken(object):
+    """Flag used to stop running solvers (it is thread-safe).
+
+    Examples
+    --------
+    >>> token = CancellationToken()
+    >>> # ... pass token to a solver running in another thread, then
+    >>> token.cancel()
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        """Ask the solvers using the token to stop."""
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        """`True` if :meth:`cancel` has been called."""
+        return self._event.is_set()
+
+
+class Budget(object):
+    """Running time and cancellation state of a solver.
+
+    The deadline is fixed when the object is created, so the same budget
+    can be shared by a sequence of problems (e.g. a regularization path).
+
+    Parameters
+    ----------
+    max_time : float, optional (default is `None`)
+        Maximum running time in seconds. If `None`, the time is unlimited.
+    cancel_token : CancellationToken, optional (default is `None`)
+        Token checked together with the time.
+    check_every : int, optional (default is `10`)
+        Number of iterations between two checks.
+
+    Attributes
+    ----------
+    status : str or None
+        `None` while the budget is available, then ``'timeout'`` or
+        ``'cancelled'``.
+    """
+
+    def __init__(self, max_time=None, cancel_token=None, check_every=10):
+        self.deadline = None if max_time is None else time.time() + max_time
+        self.cancel_token = cancel_token
+        self.check_every = check_every
+        self.status = None
+
+    @property
+    def remaining(self):
+        """Remaining time in seconds (`None` if unlimited)."""
+        if self.deadline is None:
+            return None
+        return max(0., self.deadline - time.time())
+
+    def expired(self, n_iter=None):
+        """`True` if the solver must stop.
+
+        If ``n_iter`` is given, the check is actually performed only every
+        ``check_every`` iterations.
+        """
+        if self.status is not None:
+            return True
+        if n_iter is not None and n_iter % self.check_every:
+            return False
+        if self.cancel_token is not None and self.cancel_token.cancelled:
+            self.status = 'cancelled'
+        elif self.deadline is not None and time.time() >= self.deadline:
+            self.status = 'timeout'
+        return self.status is not None
+
+
+def make_budget(max_time=None, cancel_token=None):
+    """A :class:`Budget`, or `None` if there are no limits."""
+    if max_time is None and cancel_token is None:
+        return None
+    return Budget(max_time, cancel_token)
@@ -124,6 +124,42 @@ class L1L2Classifier(LinearClassifierMixin, L1L2):
         a random feature to update. Useful only when selection is set to
         'random'.
 
+    solver : 'fista' | 'shotgun' | 'auto', default 'fista'
+        Algorithm used to minimize the objective function. 'shotgun' is a
+        parallel block coordinate descent (see
+        :func:`l1l2py.shotgun.shotgun_l1l2`), convenient with many features
+        and sparse solutions. It is used only if ``precompute`` is False.
+        'auto' chooses among 'fista', 'shotgun' and 'fista' with
+        ``precompute=True`` at each call of fit (see
+        :func:`l1l2py.autotune.select_solver`); the choice is stored in
+        ``solver_``.
+
+    calibrate : bool, optional, default False
+        With 'auto', time the candidate solvers on the data the first time
+        a problem of this size is seen, and store the fastest one in the
+        cache of :mod:`l1l2py.autotune` for the following fits.
+
+    max_time : float, optional, default None
+        Maximum running time of fit, in seconds. If it is exceeded, the
+        best iterate found is kept and ``status_`` is 'timeout'.
+
+    cancel_token : CancellationToken, optional, default None
+        Token used to stop fit from another thread (see
+        :mod:`l1l2py.budget`). If it is cancelled, the best iterate found is
+        kept and ``status_`` is 'cancelled'.
+
+    n_threads : int, optional, default None
+        Number of threads used by the 'shotgun' solver. If None, the number
+        of CPUs is used. If given with the 'fista' solver, the products
+        with the data and the updates of the solution are split among
+        ``n_threads`` threads.
+
+    trace : bool | int | SolverTrace, optional, default False
+        If True (or the length of the buffer, or a SolverTrace), the
+        iterations of the solver are recorded in ``trace_`` (see
+        :mod:`l1l2py.trace`). Disabled by default, since the objective is
+        evaluated at each iteration.
+
     Attributes
     ----------
     coef_ : array, shape (n_features,) | (n_targets, n_features)
@@ -139,13 +175,27 @@ class L1L2Classifier(LinearClassifierMixin, L1L2):
     n_iter_ : array-like, shape (n_targets,)
         number of iterations run by the coordinate descent solver to reach
         the specified tolerance.
+
+    solver_ : str
+        Solver used by the last call of fit ('gram' is FISTA with
+        ``precompute=True``).
+
+    status_ : str
+        'converged', 'max_iter', 'timeout' or 'cancelled' (see
+        ``max_time`` and ``cancel_token``).
+
+    trace_ : SolverTrace | None
+        Iterations and counters of the last call of fit or partial_fit
+        (None if ``trace`` is False).
     """
 
     def __init__(self, mu=.5, tau=1.0, use_gpu=False, threshold=1e-16,
                  alpha=None, l1_ratio=None, fit_intercept=True,
                  normalize=False, precompute=False, max_iter=10000,
                  copy_X=True, tol=1e-4, warm_start=False, positive=False,
-                 random_state=None, selection='cyclic'):
+                 random_state=None, selection='cyclic', solver='fista',
+                 n_threads=None, max_time=None, cancel_token=None,
+                 trace=False, calibrate=False):
         self.mu = mu
         self.tau = tau
         self.use_gpu = use_gpu
@@ -165,6 +215,12 @@ class L1L2Classifier(LinearClassifierMixin, L1L2):
         self.intercept_ = 0.0
         self.random_state = random_state
         self.selection = selection
+        self.solver = solver
+        self.n_threads = n_threads
+        self.max_time = max_time
+        self.cancel_token = cancel_token
+        self.trace = trace
+        self.calibrate = calibrate
 
     def fit(self, X, y, check_input=True):
         """Fit model with fista.
@@ -201,6 +257,50 @@ class L1L2Classifier(LinearClassifierMixin, L1L2):
 
         return self
 
+    def partial_fit(self, X, y, classes=None, check_input=True):
+        """Update the model with a new batch of samples.
+
+        See :meth:`l1l2py.regression.L1L2.partial_fit`.
+
+        Parameters
+        -----------
+        X : ndarray, (n_samples, n_features)
+            Batch of data
+
+        y : ndarray, shape (n_samples,)
+            Target
+
+        classes : array, shape (n_classes,), optional
+            All the classes that can appear in the batches. It is used only
+            in the first call; if not given, the classes of the first batch
+            are used.
+
+        check_input : boolean, (default=True)
+            Allow to bypass several input checking.
+            Don't use this parameter unless you know what you do.
+        """
+        if getattr(self, '_partial_stats', None) is None:
+            self._label_binarizer = LabelBinarizer(pos_label=1, neg_label=-1)
+            self._label_binarizer.fit(y if classes is None else classes)
+            if self._label_binarizer.y_type_.startswith('multilabel'):
+                raise ValueError(
+                    "%s doesn't support multi-label classification" % (
+                        self.__class__.__name__))
+        elif np.setdiff1d(y, self.classes_).size > 0:
+            raise ValueError("y contains classes not seen in the first "
+                             "call to partial_fit")
+        y = self._label_binarizer.transform(y)
+
+        super(L1L2Classifier, self).partial_fit(X, y, check_input)
+
+        if self.classes_.shape[0] > 2:
+            ndim = self.classes_.shape[0]
+        else:
+            ndim = 1
+        self.coef_ = self.coef_.reshape(ndim, -1)
+
+        return self
+
     @property
     def classes_(self):
         return self._label_binarizer.classes_
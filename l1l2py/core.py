@@ -28,10 +28,20 @@ double optimization variable selection.
 # along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
 
 from __future__ import print_function
+import multiprocessing
+import shutil
+import warnings
+from multiprocessing.pool import ThreadPool
+
 import numpy as np
 
 from six.moves import xrange, zip as izip
-from l1l2py.algorithms import ridge_regression, l1l2_regularization
+from l1l2py.algorithms import (ridge_regression, ridge_path, ridge_criterion,
+                               RidgeCache, FoldGram, l1l2_regularization)
+from l1l2py.autotune import select_solver
+from l1l2py.blas import blas_threads, thread_budget, _limit_worker
+from l1l2py.operators import lazy_center, lazy_standardize
+from l1l2py.tools import center, standardize
 
 
 __all__ = ('model_selection', 'minimal_model', 'nested_models')
@@ -43,7 +53,10 @@ def model_selection(
     cv_splits, cv_error_function, error_function,
     data_normalizer=None, labels_normalizer=None,
     sparse=False, regularized=True, return_predictions=False,
-        algorithm_version='CPU', shuffle_labels=False, random_seed=None):
+        algorithm_version='CPU', shuffle_labels=False, random_seed=None,
+        continuation=False, dfmax=None, pmax=None, solver='fista',
+        max_time=None, cancel_token=None, lambda_selection=None, n_jobs=1,
+        backend='processes', calibrate=False, return_duplicates=False):
     r"""Complete model selection procedure.
 
     It executes the two stages implemented in ``minimal_model`` and
@@ -73,6 +86,44 @@ def model_selection(
     regularized : bool, optional (default is `True`)
         If `True`, the function selects at STAGE I the most regularized solution
         with minimum cross validation error.
+    continuation : bool, optional (default is `False`)
+        If `True`, the STAGE I regularization paths are computed with the
+        tolerance continuation strategy (see ``l1l2py.algorithms.l1l2_path``).
+        The selected value of ``tau`` is always solved again with the full
+        tolerance at STAGE II.
+    dfmax : int, optional (default is `None`)
+        Maximum number of selected variables of the STAGE I models
+        (see ``minimal_model``).
+    pmax : int, optional (default is `None`)
+        Maximum number of variables ever selected along the STAGE I
+        regularization paths (see ``minimal_model``).
+    solver : str, optional (default is `'fista'`)
+        `l1l2` solver used in both stages
+        (see ``l1l2py.algorithms.l1l2_regularization``). With ``'auto'``
+        the fastest solver is chosen for the data
+        (see ``l1l2py.autotune.select_solver``).
+    max_time : float, optional (default is `None`)
+        Maximum running time of each STAGE I regularization path
+        (see ``minimal_model``).
+    cancel_token : CancellationToken, optional (default is `None`)
+        Token used to stop the STAGE I computation (see ``minimal_model``).
+    lambda_selection : {None, 'loo', 'gcv'}, optional (default is `None`)
+        If given, at STAGE I ``lambda`` is selected in closed form on each
+        split instead of being a dimension of the cross validation grid
+        (see ``minimal_model``). The optimal value is the median of the
+        values selected on the splits for the optimal ``tau``.
+    n_jobs : int, optional (default is `1`)
+        Number of workers computing the STAGE I cross validation splits
+        (see ``minimal_model``).
+    backend : {'processes', 'threads'}, optional (default is `'processes'`)
+        Workers used with ``n_jobs`` (see ``minimal_model``).
+    calibrate : bool, optional (default is `False`)
+        With ``solver='auto'``, the solvers are timed on the data (in both
+        stages) if no timings of a similar problem are stored in the cache
+        (see ``l1l2py.autotune.select_solver``).
+    return_duplicates : bool, optional (default is `False`)
+        If `True`, the output contains also the number of duplicate
+        supports of both stages.
 
     Returns
     -------
@@ -81,9 +132,17 @@ def model_selection(
         the following keys:
 
         **kcv_err_ts** : (T, L) ndarray
-            [STAGE I] Mean cross validation errors on the training set.
+            [STAGE I] Mean cross validation errors on the training set
+            ((T, 1) with ``lambda_selection``).
         **kcv_err_tr** : (T, L) ndarray
-            [STAGE I] Mean cross validation errors on the training set.
+            [STAGE I] Mean cross validation errors on the training set
+            ((T, 1) with ``lambda_selection``).
+        **kcv_lambdas** : (T,) ndarray, optional
+            [STAGE I] Values of lambda selected for each value of tau
+            (only with ``lambda_selection``).
+        **kcv_duplicates** : int, optional
+            [STAGE I] Number of duplicate supports whose ridge solutions and
+            errors are reused (see ``minimal_model``).
         **tau_opt** : float
             Optimal value of tau selected in ``tau_range``.
         **lambda_opt** : float
@@ -102,6 +161,9 @@ def model_selection(
         **prediction_tr_list** : list of M two-dimensional ndarray, optional
             [STAGE II] Prediction vectors for the models evaluated on the
             training set.
+        **nested_duplicates** : int, optional
+            [STAGE II] Number of duplicate supports whose ridge solution is
+            reused (see ``nested_models``).
 
     """
     if shuffle_labels:
@@ -116,8 +178,17 @@ def model_selection(
                                tau_range, lambda_range,
                                cv_splits, cv_error_function,
                                data_normalizer, labels_normalizer,
-                               algorithm_version=algorithm_version)
-    out = dict(izip(('kcv_err_ts', 'kcv_err_tr'), stage1_out))
+                               algorithm_version=algorithm_version,
+                               continuation=continuation,
+                               dfmax=dfmax, pmax=pmax, solver=solver,
+                               max_time=max_time, cancel_token=cancel_token,
+                               lambda_selection=lambda_selection,
+                               return_duplicates=True, n_jobs=n_jobs,
+                               backend=backend, calibrate=calibrate)
+    out = dict(izip(('kcv_err_ts', 'kcv_err_tr', 'kcv_lambdas'),
+                    stage1_out[:-1]))
+    if return_duplicates:
+        out['kcv_duplicates'] = stage1_out[-1]
 
     # KCV MINIMUM SELECTION
     err_ts = out['kcv_err_ts']
@@ -125,7 +196,10 @@ def model_selection(
     tau_opt, lambda_opt = _minimum_selection(tau_opt_idxs, lambda_opt_idxs,
                                              sparse, regularized)
     out['tau_opt'] = tau_range[tau_opt]
-    out['lambda_opt'] = lambda_range[lambda_opt]
+    if lambda_selection is None:
+        out['lambda_opt'] = lambda_range[lambda_opt]
+    else:
+        out['lambda_opt'] = out['kcv_lambdas'][tau_opt]
 
     # STAGE II
     stage2_out = nested_models(data, labels,
@@ -133,7 +207,8 @@ def model_selection(
                                mu_range, out['tau_opt'], out['lambda_opt'],
                                error_function,
                                data_normalizer, labels_normalizer,
-                               return_predictions)
+                               return_predictions, solver=solver,
+                               return_duplicates=True, calibrate=calibrate)
 
     keys = ['beta_list', 'selected_list', 'err_ts_list', 'err_tr_list']
     if return_predictions:
@@ -141,6 +216,8 @@ def model_selection(
         keys.append('prediction_tr_list')
 
     out.update(izip(keys, stage2_out))
+    if return_duplicates:
+        out['nested_duplicates'] = stage2_out[-1]
 
     return out
 
@@ -163,10 +240,203 @@ def _minimum_selection(tau_idxs, lambda_idxs, sparse=False, regularized=False):
     return tau_idx, lam_idx
 
 
+def _split(data, labels, split, data_normalizer=None,
+           labels_normalizer=None):
+    # Training and test sets of a cross validation split
+    train_idxs, test_idxs = split
+
+    # First create a view and then normalize (eventually)
+    data_tr, data_ts = data[train_idxs, :], data[test_idxs, :]
+    if data_normalizer is not None:
+        data_tr, data_ts = data_normalizer(data_tr, data_ts)
+
+    # labels_tr, labels_ts = labels[train_idxs, :], labels[test_idxs, :]
+    labels_tr, labels_ts = labels[train_idxs], labels[test_idxs]
+    if labels_normalizer is not None:
+        labels_tr, labels_ts = labels_normalizer(labels_tr, labels_ts)
+    return data_tr, data_ts, labels_tr, labels_ts
+
+
+def _split_errors(data, labels, split, tau_range, mu, lambda_range,
+                  error_function, data_normalizer, labels_normalizer,
+                  input_key, algorithm_version, path_params,
+                  lambda_selection, folds=None):
+    # Errors of a cross validation split for the values in tau_range.
+    # Returns (truncated, n_valid, status, err_ts, err_tr, selections,
+    # n_duplicates): the rows of the errors are the n_valid values of tau
+    # following the first truncated ones. With a FoldGram the path is
+    # solved in Gram mode (or with the maximum eigenvalue of the kernel).
+    if isinstance(data, tuple):
+        # memory maps published by the main process
+        from l1l2py.splitting import _open
+        data, labels = _open(data), _open(labels)
+
+    # Load the correct version of the algorithm
+    if algorithm_version == 'CPU':
+        from l1l2py.algorithms import l1l2_path
+    elif algorithm_version == 'GPU':
+        from l1l2py.algorithms_cuda import l1l2_path
+    else:
+        from l1l2py.admm import l1l2_path
+
+    if folds is None or folds.kernel:
+        data_tr, data_ts, labels_tr, labels_ts = _split(
+            data, labels, split, data_normalizer, labels_normalizer)
+        if folds is not None:
+            kernel = folds.split(data, labels, split)[0]
+            path_params = dict(path_params,
+                               max_eigenvalue=np.linalg.eigvalsh(kernel)[-1])
+        path_data = data_tr
+    else:
+        gram, xty, n_samples, mean, scale = folds.split(data, labels, split)
+        train_idxs, test_idxs = split
+        labels_tr, labels_ts = labels[train_idxs], labels[test_idxs]
+        if labels_normalizer is not None:
+            labels_tr, labels_ts = labels_normalizer(labels_tr, labels_ts)
+        path_data, path_params = None, dict(path_params, gram=gram, xty=xty,
+                                            n_samples=n_samples)
+
+    # Builds a classifier for each value of tau
+    beta_casc = l1l2_path(path_data, labels_tr, mu, tau_range,
+                          input_key=input_key, **path_params)
+    truncated, status = 0, None
+    if path_params.get('return_status'):
+        beta_casc, truncated, status = beta_casc
+    elif path_params.get('return_truncated'):
+        beta_casc, truncated = beta_casc
+
+    if path_data is None:
+        # the refits only need the columns selected along the path
+        union = np.zeros(len(scale), dtype=bool)
+        for beta in beta_casc:
+            union |= (beta.flat != 0)
+        data_tr = ((data[np.ix_(train_idxs, union)] - mean[union]) /
+                   scale[union])
+        data_ts = ((data[np.ix_(test_idxs, union)] - mean[union]) /
+                   scale[union])
+        beta_casc = [beta[union] for beta in beta_casc]
+
+    n_valid = len(beta_casc)
+    n_columns = len(lambda_range) if lambda_selection is None else 1
+    err_ts = np.empty((n_valid, n_columns))
+    err_tr = np.empty((n_valid, n_columns))
+    selections = np.zeros(n_valid, dtype=int)
+    # the Cholesky factors follow the (nested) supports of the path
+    cache = RidgeCache(data_tr, labels_tr, lambda_range)
+    # rows of the errors already computed, keyed by the packed support
+    memo = dict()
+    n_duplicates = 0
+
+    # For each sparse model builds a
+    # rls classifier for each value of lambda
+    for j, beta in enumerate(beta_casc):
+        selected = (beta.flat != 0)
+        key = np.packbits(selected).tobytes()
+        if key in memo:
+            err_ts[j], err_tr[j], selections[j] = memo[key]
+            n_duplicates += 1
+            continue
+
+        if lambda_selection is None:
+            beta = cache.solve(selected)
+            prediction_tr = np.dot(data_tr[:, selected], beta)
+            prediction_ts = np.dot(data_ts[:, selected], beta)
+        else:
+            errors = ridge_criterion(data_tr[:, selected], labels_tr,
+                                     lambda_range, lambda_selection)
+            # the biggest lambda among the minima
+            minima = np.flatnonzero(errors == errors.min())
+            selections[j] = minima[np.argmax(lambda_range[minima])]
+            _, prediction_tr, prediction_ts = ridge_path(
+                data_tr[:, selected], labels_tr,
+                lambda_range[selections[j:j + 1]],
+                test_data=data_ts[:, selected], return_predictions=True)
+        for k in xrange(n_columns):
+            err_ts[j, k] = error_function(labels_ts,
+                                          prediction_ts[:, k:k + 1])
+            err_tr[j, k] = error_function(labels_tr,
+                                          prediction_tr[:, k:k + 1])
+        memo[key] = err_ts[j], err_tr[j], selections[j]
+
+    return (truncated, n_valid, status, err_ts, err_tr, selections,
+            n_duplicates)
+
+
+def _parallel_split_errors(data, labels, cv_splits, tau_range, arguments,
+                           n_jobs, n_threads, backend):
+    # _split_errors of each split in a pool of workers with n_threads BLAS
+    # threads each. The processes attach to the memory maps of data and
+    # labels instead of receiving copies.
+    if backend == 'threads':
+        pool = ThreadPool(n_jobs)
+        try:
+            with blas_threads(n_threads):
+                return pool.map(lambda split: _split_errors(
+                    data, labels, split, tau_range, *arguments), cv_splits)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    from l1l2py.splitting import _share
+    data_spec, data_directory = _share(data)
+    labels_spec, labels_directory = _share(labels)
+    pool = multiprocessing.Pool(n_jobs, initializer=_limit_worker,
+                                initargs=(n_threads,))
+    try:
+        results = [pool.apply_async(_split_errors,
+                                    (data_spec, labels_spec, split,
+                                     tau_range) + arguments)
+                   for split in cv_splits]
+        return [result.get() for result in results]
+    finally:
+        pool.terminate()
+        pool.join()
+        for directory in (data_directory, labels_directory):
+            if directory is not None:
+                shutil.rmtree(directory, ignore_errors=True)
+
+
+def _align(values, first, stop, fill):
+    # Rows of the values of tau in [0, stop), values start at first
+    out = np.empty((stop,) + values.shape[1:], dtype=values.dtype)
+    out[:first] = fill
+    out[first:] = values[:stop - first]
+    return out
+
+
+def _fold_gram(data, labels, data_normalizer, labels_normalizer,
+               algorithm_version, solver, precompute):
+    # FoldGram of the splits, None if it is not supported and precompute
+    # is 'auto'
+    scale = data_normalizer in (standardize, lazy_standardize)
+    normalizers = (None, center, lazy_center)
+    if data.shape[0] >= data.shape[1]:
+        # the kernel cannot be standardized
+        normalizers += (standardize, lazy_standardize)
+    supported = (algorithm_version == 'CPU' and
+                 solver in ('fista', 'gram') and
+                 isinstance(data, np.ndarray) and
+                 data_normalizer in normalizers and
+                 labels_normalizer in (None, center))
+    if not supported:
+        if precompute == 'auto':
+            return None
+        raise ValueError("precompute is supported by the 'CPU' algorithm "
+                         "version with the 'fista' or 'gram' solver, on "
+                         "dense data normalized by centering (or "
+                         "standardization, if N >= P)")
+    return FoldGram(data, labels, center=data_normalizer is not None,
+                    scale=scale, center_labels=labels_normalizer is not None)
+
+
 def minimal_model(data, labels, mu, tau_range, lambda_range,
                   cv_splits, error_function,
                   data_normalizer=None, labels_normalizer=None, input_key=None,
-                  algorithm_version='CPU'):
+                  algorithm_version='CPU', continuation=False, dfmax=None,
+                  pmax=None, solver='fista', max_time=None,
+                  cancel_token=None, lambda_selection=None,
+                  return_duplicates=False, n_jobs=1, backend='processes',
+                  precompute='auto', calibrate=False):
     r"""Minimal model selection.
 
     Given a supervised training set (``data`` and ``labels``), for a fixed
@@ -191,6 +461,18 @@ def minimal_model(data, labels, mu, tau_range, lambda_range,
 
         **This means than in extreme cases the output could be void.**
 
+        In the same way, if ``dfmax`` or ``pmax`` are given, each
+        regularization path stops at the first (small) value of ``tau`` whose
+        solution exceeds the caps. The values of ``tau`` truncated on at least
+        one cross validation split are excluded for all the splits, and the
+        corresponding rows of the output matrices are set to ``inf``.
+
+        The same happens to the values of ``tau`` not reached by a
+        regularization path within ``max_time`` seconds (or before
+        ``cancel_token`` is cancelled): the grid cells are flagged with
+        ``inf`` errors, and a ``RuntimeWarning`` is issued, instead of
+        blocking the whole model selection.
+
     Parameters
     ----------
     data : (N, P) ndarray
@@ -210,8 +492,76 @@ def minimal_model(data, labels, mu, tau_range, lambda_range,
         Cross validation error function.
     data_normalizer : function object, optional (default is `None`)
         Data normalization function.
+        :func:`l1l2py.operators.lazy_center` and
+        :func:`l1l2py.operators.lazy_standardize` normalize the data
+        without copying it.
     labels_normalizer : function object, optional (default is `None`)
         Labels normalization function.
+    algorithm_version : {'CPU', 'GPU', 'ADMM'}, optional (default is `'CPU'`)
+        Regularization path used: ``l1l2py.algorithms.l1l2_path``,
+        ``l1l2py.algorithms_cuda.l1l2_path`` or ``l1l2py.admm.l1l2_path``
+        (ADMM with a single factorization for the whole path).
+    continuation : bool, optional (default is `False`)
+        If `True`, intermediate values of ``tau`` are solved with a loose
+        tolerance, tightened only where the support is still changing
+        (see ``l1l2py.algorithms.l1l2_path``).
+        Only supported by the 'CPU' algorithm version.
+    dfmax : int, optional (default is `None`)
+        Maximum number of selected variables of a model.
+        Only supported by the 'CPU' and 'ADMM' algorithm versions.
+    pmax : int, optional (default is `None`)
+        Maximum number of variables ever selected along a regularization path.
+        Only supported by the 'CPU' and 'ADMM' algorithm versions.
+    solver : str, optional (default is `'fista'`)
+        `l1l2` solver (see ``l1l2py.algorithms.l1l2_path``).
+        With ``'auto'`` the solver is chosen once, on the first split, and
+        used for all the splits.
+        Only supported by the 'CPU' algorithm version.
+    max_time : float, optional (default is `None`)
+        Maximum running time, in seconds, of the regularization path of
+        each cross validation split.
+        Only supported by the 'CPU' and 'ADMM' algorithm versions.
+    cancel_token : CancellationToken, optional (default is `None`)
+        Token used to stop the computation (see ``l1l2py.budget``).
+        Only supported by the 'CPU' and 'ADMM' algorithm versions.
+    lambda_selection : {None, 'loo', 'gcv'}, optional (default is `None`)
+        If `None`, the errors are computed for each value in
+        ``lambda_range``. Otherwise, on each split and for each value of
+        ``tau``, the value of ``lambda`` is selected by the closed form
+        leave-one-out or generalized cross validation error on the training
+        set (see ``l1l2py.algorithms.ridge_criterion``), and the errors are
+        computed only for it: the output matrices have a single column.
+    return_duplicates : bool, optional (default is `False`)
+        If `True`, also return the number of duplicate supports skipped.
+        On each split, the values of ``tau`` selecting the same variables
+        as a previous one share its ridge solutions and errors.
+    n_jobs : int, optional (default is `1`)
+        Number of workers computing the cross validation splits in
+        parallel (`-1` means one for each CPU). Each split starts from the
+        whole ``tau_range``, and the truncated values of ``tau`` are merged
+        as in the serial computation. The cores left by the workers are
+        given to their BLAS threads (see ``l1l2py.blas.thread_budget``).
+    backend : {'processes', 'threads'}, optional (default is `'processes'`)
+        Workers used with ``n_jobs``. The data and the labels are written
+        once in a memory map (if ``data`` is not a memory map already), that
+        the processes open without copying it; the functions must be
+        picklable, and ``cancel_token`` is not supported. The threads share
+        the data, but they run in parallel only in the numerical code that
+        releases the GIL (e.g. the BLAS).
+    precompute : bool or 'auto', optional (default is `'auto'`)
+        If `True`, the Gram matrix of the whole data is computed once and
+        the one of each training set is derived by a downdate (see
+        ``l1l2py.algorithms.FoldGram``): the regularization paths are
+        solved in Gram mode, without products with the data. If `N < P`,
+        the kernel of the data gives only the maximum eigenvalue of each
+        training set. It needs the 'CPU' algorithm version, the 'fista' or
+        'gram' solver, dense data and the ``l1l2py.tools`` (or lazy)
+        centering and standardization as normalizers. With ``'auto'`` it
+        is used when these conditions hold.
+    calibrate : bool, optional (default is `False`)
+        With ``solver='auto'``, the solvers are timed on the first split if
+        no timings of a similar problem are stored in the cache
+        (see ``l1l2py.autotune.select_solver``).
 
     Returns
     -------
@@ -223,76 +573,138 @@ def minimal_model(data, labels, mu, tau_range, lambda_range,
         Matrix of average cross validation error on the training set.
         The first dimension depends on the number of valid ``tau`` values,
         **even zero**.
+    lambdas : (< T,) ndarray, optional
+        Median of the values of ``lambda`` selected on the splits, for each
+        value of ``tau`` (only with ``lambda_selection``).
+    n_duplicates : int, optional
+        Number of solutions whose support was already evaluated on the same
+        split (only if ``return_duplicates`` is `True`).
 
     Raises
     ------
     ValueError
         If the given range of ``tau`` values produces all void solutions with
         the given data splits.
+    ValueError
+        If all the given values of ``tau`` produce solutions exceeding
+        ``dfmax`` or ``pmax``.
 
     """
-    # Load the correct version of the algorithm
-    if algorithm_version == 'CPU':
-        from l1l2py.algorithms import l1l2_path
-    elif algorithm_version == 'GPU':
-        from l1l2py.algorithms_cuda import l1l2_path
-    else:
+    if algorithm_version not in ('CPU', 'GPU', 'ADMM'):
         raise ValueError('Unknown algorithm version')
+    if lambda_selection not in (None, 'loo', 'gcv'):
+        raise ValueError("lambda_selection should be None, 'loo' or 'gcv', "
+                         "got %r" % (lambda_selection,))
+    if backend not in ('processes', 'threads'):
+        raise ValueError("backend should be 'processes' or 'threads', "
+                         "got %r" % (backend,))
+    if n_jobs != 1 and backend == 'processes' and cancel_token is not None:
+        raise ValueError("cancel_token is not supported by the processes "
+                         "backend with n_jobs != 1")
+    n_jobs, n_threads = thread_budget(n_jobs, len(cv_splits))
+    lambda_range = np.asarray(lambda_range, dtype=float)
+
+    path_params = dict()
+    if continuation:
+        path_params['continuation'] = True
+    truncation = dfmax is not None or pmax is not None
+    if truncation:
+        path_params.update(dfmax=dfmax, pmax=pmax, return_truncated=True)
+    if max_time is not None or cancel_token is not None:
+        truncation = True
+        path_params.update(max_time=max_time, cancel_token=cancel_token,
+                           return_truncated=True, return_status=True)
+    if solver == 'auto':
+        # splits of the same data share the same solver
+        data_tr, _, labels_tr, _ = _split(
+            data, labels, cv_splits[0], data_normalizer, labels_normalizer)
+        solver = select_solver(data_tr, labels_tr, mu, np.median(tau_range),
+                               calibrate=calibrate)
+    if solver != 'fista':
+        path_params['solver'] = solver
+    folds = None
+    if precompute:
+        folds = _fold_gram(data, labels, data_normalizer,
+                           labels_normalizer, algorithm_version, solver,
+                           precompute)
+    arguments = (mu, lambda_range, error_function, data_normalizer,
+                 labels_normalizer, input_key, algorithm_version, path_params,
+                 lambda_selection, folds)
 
     err_ts = list()
     err_tr = list()
+    selections = list()
+    n_duplicates = 0
     max_tau_num = len(tau_range)
-
-    for train_idxs, test_idxs in cv_splits:
-        # First create a view and then normalize (eventually)
-        data_tr, data_ts = data[train_idxs, :], data[test_idxs, :]
-        if data_normalizer is not None:
-            data_tr, data_ts = data_normalizer(data_tr, data_ts)
-
-        # labels_tr, labels_ts = labels[train_idxs, :], labels[test_idxs, :]
-        labels_tr, labels_ts = labels[train_idxs], labels[test_idxs]
-        if labels_normalizer is not None:
-            labels_tr, labels_ts = labels_normalizer(labels_tr, labels_ts)
-
-        # Builds a classifier for each value of tau
-        beta_casc = l1l2_path(
-            data_tr, labels_tr, mu, tau_range[:max_tau_num],
-            input_key=input_key)
-
-        if len(beta_casc) == 0:
+    min_tau_num = 0
+
+    if n_jobs > 1:
+        # the splits start from the whole range of tau, the results are
+        # merged as if the range had been restricted split by split
+        results = _parallel_split_errors(data, labels, cv_splits, tau_range,
+                                         arguments, n_jobs, n_threads,
+                                         backend)
+    else:
+        results = None
+
+    for i, split in enumerate(cv_splits):
+        offset = 0
+        if results is None:
+            offset = min_tau_num
+            result = _split_errors(data, labels, split,
+                                   tau_range[min_tau_num:max_tau_num],
+                                   *arguments)
+        else:
+            result = results[i]
+        truncated, n_valid, status, _err_ts, _err_tr, _selections = result[:6]
+        n_duplicates += result[6]
+
+        if status in ('timeout', 'cancelled'):
+            warnings.warn("regularization path stopped (%s): %d values "
+                          "of 'tau' are skipped" % (status, truncated),
+                          RuntimeWarning)
+        if truncation and truncated == (max_tau_num - min_tau_num
+                                        if results is None
+                                        else len(tau_range)):
+            raise ValueError("the given range of 'tau' values produces "
+                             "all solutions exceeding 'dfmax' or 'pmax' "
+                             "(or 'max_time') with the given data splits")
+
+        # solutions of truncated taus are skipped by the following splits
+        first = offset + truncated
+        min_tau_num = max(min_tau_num, first)
+        max_tau_num = min(max_tau_num, first + n_valid)
+        if n_valid == 0 or max_tau_num <= min_tau_num:
             raise ValueError("the given range of 'tau' values produces all "
                              "void solutions with the given data splits")
 
-        max_tau_num = min(max_tau_num, len(beta_casc))
-        _err_ts = np.empty((max_tau_num, len(lambda_range)))
-        _err_tr = np.empty_like(_err_ts)
-
-        # For each sparse model builds a
-        # rls classifier for each value of lambda
-        for j, beta in izip(xrange(max_tau_num), beta_casc):
-            selected = (beta.flat != 0)
-            for k, lam in enumerate(lambda_range):
-                beta = ridge_regression(data_tr[:, selected], labels_tr, lam)
-
-                prediction = np.dot(data_ts[:, selected], beta)
-                _err_ts[j, k] = error_function(labels_ts, prediction)
-
-                prediction = np.dot(data_tr[:, selected], beta)
-                _err_tr[j, k] = error_function(labels_tr, prediction)
-
-        err_ts.append(_err_ts)
-        err_tr.append(_err_tr)
+        err_ts.append(_align(_err_ts, first, max_tau_num, np.inf))
+        err_tr.append(_align(_err_tr, first, max_tau_num, np.inf))
+        selections.append(_align(_selections, first, max_tau_num, 0))
 
     # cut columns and computes the mean
     err_ts = np.asarray([a[:max_tau_num] for a in err_ts]).mean(axis=0)
     err_tr = np.asarray([a[:max_tau_num] for a in err_tr]).mean(axis=0)
-    return err_ts, err_tr
+
+    # taus truncated on at least one split are never selected
+    err_ts[:min_tau_num] = np.inf
+    err_tr[:min_tau_num] = np.inf
+    out = [err_ts, err_tr]
+    if lambda_selection is not None:
+        # upper median of the values selected on the splits
+        lambdas = np.sort([lambda_range[a[:max_tau_num]]
+                           for a in selections], axis=0)
+        out.append(lambdas[len(lambdas) // 2])
+    if return_duplicates:
+        out.append(n_duplicates)
+    return tuple(out)
 
 
 def nested_models(data, labels, test_data, test_labels,
                   mu_range, tau, lambda_, error_function,
                   data_normalizer=None, labels_normalizer=None,
-                  return_predictions=False):
+                  return_predictions=False, solver='fista',
+                  return_duplicates=False, calibrate=False):
     r"""The function generates the models with the (almost) nested lists of
     selected variables.
 
@@ -329,8 +741,24 @@ def nested_models(data, labels, test_data, test_labels,
         Error function.
     data_normalizer : function object, optional (default is `None`)
         Data normalization function.
+        :func:`l1l2py.operators.lazy_center` and
+        :func:`l1l2py.operators.lazy_standardize` normalize the data
+        without copying it.
     labels_normalizer : function object, optional (default is `None`)
         Labels normalization function.
+    solver : str, optional (default is `'fista'`)
+        `l1l2` solver (see ``l1l2py.algorithms.l1l2_regularization``).
+        With ``'admm'`` the data are decomposed once
+        (see ``l1l2py.admm.eigen_decomposition``) for all the values in
+        ``mu_range``.
+    return_duplicates : bool, optional (default is `False`)
+        If `True`, also return the number of duplicate supports skipped:
+        the values of ``mu`` selecting the same variables as a previous one
+        share its ridge solution, predictions and errors.
+    calibrate : bool, optional (default is `False`)
+        With ``solver='auto'``, the solvers are timed on the data if no
+        timings of a similar problem are stored in the cache
+        (see ``l1l2py.autotune.select_solver``).
 
     Returns
     -------
@@ -348,6 +776,9 @@ def nested_models(data, labels, test_data, test_labels,
     prediction_tr_list : list of M (N, 1) ndarray
         Prediction vector calculated for each value in ``mu_range`` on the
         training set.
+    n_duplicates : int, optional
+        Number of models whose support was already evaluated (only if
+        ``return_duplicates`` is `True`).
 
     Raises
     ------
@@ -371,31 +802,49 @@ def nested_models(data, labels, test_data, test_labels,
         prediction_ts_list = list()
         prediction_tr_list = list()
 
+    # ridge solutions, errors and predictions, keyed by the packed support
+    memo = dict()
+    n_duplicates = 0
+
+    decomposition = None
+    if solver == 'admm':
+        from l1l2py.admm import eigen_decomposition
+        decomposition = eigen_decomposition(data)
+
     for mu in mu_range:
-        beta = l1l2_regularization(data, labels, mu, tau)
+        beta = l1l2_regularization(data, labels, mu, tau, solver=solver,
+                                   decomposition=decomposition,
+                                   calibrate=calibrate)
         selected = (beta.flat != 0)
 
         if not selected.any():
             raise ValueError("the given value of 'tau' produces a void "
                              "solution with the given data")
 
-        beta = ridge_regression(data[:, selected], labels, lambda_)
+        key = np.packbits(selected).tobytes()
+        if key in memo:
+            beta, err_ts, err_tr, prediction_ts, prediction_tr = memo[key]
+            n_duplicates += 1
+        else:
+            beta = ridge_regression(data[:, selected], labels, lambda_)
+            prediction_ts = np.dot(test_data[:, selected], beta)
+            err_ts = error_function(test_labels, prediction_ts)
+            prediction_tr = np.dot(data[:, selected], beta)
+            err_tr = error_function(labels, prediction_tr)
+            memo[key] = beta, err_ts, err_tr, prediction_ts, prediction_tr
 
         beta_list.append(beta)
         selected_list.append(selected)
-
-        prediction_ts = np.dot(test_data[:, selected], beta)
-        err_ts_list.append(error_function(test_labels, prediction_ts))
-
-        prediction_tr = np.dot(data[:, selected], beta)
-        err_tr_list.append(error_function(labels, prediction_tr))
+        err_ts_list.append(err_ts)
+        err_tr_list.append(err_tr)
 
         if return_predictions:
             prediction_ts_list.append(prediction_ts)
             prediction_tr_list.append(prediction_tr)
 
+    out = [beta_list, selected_list, err_ts_list, err_tr_list]
     if return_predictions:
-        return (beta_list, selected_list, err_ts_list, err_tr_list,
-                prediction_ts_list, prediction_tr_list)
-    else:
-        return beta_list, selected_list, err_ts_list, err_tr_list
+        out.extend((prediction_ts_list, prediction_tr_list))
+    if return_duplicates:
+        out.append(n_duplicates)
+    return tuple(out)
@@ -0,0 +1,469 @@
+"""FISTA engine shared by the l1l2 solvers.
+
+This module contains the single implementation of the Fast Iterative
+Shrinkage-Thresholding Algorithm used by ``l1l2py.algorithms``,
+``l1l2py.proximal`` and ``l1l2py.regression``.
+
+The functional is split in a smooth part, which exposes its gradient and
+Lipschitz constant, and a non-smooth part, which exposes its proximity
+operator, so that the same iterations (buffers, step size and convergence
+logic) are used by every public entry point.
+"""
+
+# This code is written by
+#       Salvatore Masecchia <salvatore.masecchia@unige.it>
+#       Federico Tomasi <federico.tomasi@dibris.unige.it>
+# Copyright (C) 2017 SlipGURU -
+# Statistical Learning and Image Processing Genoa University Research Group
+# Via Dodecaneso, 35 - 16146 Genova, ITALY.
+#
+# This file is part of L1L2Py.
+#
+# L1L2Py is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# L1L2Py is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
+
+from functools import partial
+
+import numpy as np
+try:
+    from scipy import linalg as la
+except ImportError:
+    from numpy import linalg as la
+
+from six.moves import xrange
+
+from l1l2py.operators import DataOperator, ThreadedMatrix
+from l1l2py.trace import _entries
+
+__all__ = ('lipschitz', 'SquareLoss', 'L1Prox', 'fista', 'l1l2_fista')
+
+
+def _gram(data):
+    # Smallest between X^T X and X X^T
+    if isinstance(data, DataOperator):
+        return data.gram()
+
+    n, p = data.shape
+    if p > n:
+        return np.dot(data, data.T)
+    return np.dot(data.T, data)
+
+
+def lipschitz(data):
+    r"""Maximum eigenvalue of :math:`\mathbf{X^T}\mathbf{X}`.
+
+    The smallest between :math:`\mathbf{X^T}\mathbf{X}` and
+    :math:`\mathbf{X}\mathbf{X^T}` is used.
+
+    Parameters
+    ----------
+    data : (N, P) ndarray or DataOperator
+        Data matrix.
+
+    Returns
+    -------
+    e : float
+        Maximum eigenvalue.
+    """
+    return la.norm(_gram(data), 2)
+
+
+class SquareLoss(object):
+    r"""Smooth part of the `l1l2` functional.
+
+    .. math::
+        \frac{1}{n} \| \mathbf{Y} - \mathbf{X}\boldsymbol{\beta} \|_2^2
+        + \mu \|\boldsymbol{\beta}\|_2^2
+
+    If ``gram`` is given (or ``N > P``) the products with the data matrix
+    are computed through :math:`\mathbf{X^T}\mathbf{Y}`.
+
+    In Gram mode ``data`` and ``labels`` can be `None`, if both ``xty`` and
+    ``n_samples`` are given.
+
+    Parameters
+    ----------
+    data : (N, P) ndarray or DataOperator
+        Data matrix (see :mod:`l1l2py.operators`).
+    labels : (N,) or (N, 1) ndarray
+        Labels vector.
+    mu : float
+        `l2-norm` penalty.
+    gram : (P, P) ndarray, optional (default is `None`)
+        Precomputed :math:`\mathbf{X^T}\mathbf{X}` (Gram mode).
+    xty : (P,) ndarray, optional (default is `None`)
+        Precomputed :math:`\mathbf{X^T}\mathbf{Y}`.
+    n_samples : int, optional (default is `None`)
+        Number of samples `N`, needed only if ``data`` is `None`.
+    max_eigenvalue : float, optional (default is `None`)
+        Upper bound of the maximum eigenvalue of
+        :math:`\mathbf{X^T}\mathbf{X}`, used in place of the (more
+        expensive) exact value.
+    """
+
+    def __init__(self, data, labels, mu, gram=None, xty=None, n_samples=None,
+                 max_eigenvalue=None):
+        self.data = data
+        self.labels = None if labels is None else np.asarray(labels).ravel()
+        self.mu = mu
+        self.gram = gram
+        if data is None:
+            self.n, self.d = n_samples, gram.shape[0]
+        else:
+            self.n, self.d = data.shape
+
+        if xty is None and (gram is not None or self.n > self.d):
+            xty = data.T.dot(self.labels)
+        self.xty = None if xty is None else np.asarray(xty).ravel()
+
+        self._max_eigenvalue = max_eigenvalue
+        self._lipschitz = None
+        self._yty = (None if self.labels is None
+                     else np.dot(self.labels, self.labels))
+
+    @property
+    def lipschitz_constant(self):
+        """Lipschitz constant of the gradient."""
+        if self._lipschitz is None:
+            if self._max_eigenvalue is not None:
+                e = self._max_eigenvalue
+            elif self.gram is not None:
+                e = la.norm(self.gram, 2)
+            else:
+                e = lipschitz(self.data)
+            self._lipschitz = 2. * (e / self.n + self.mu)
+        return self._lipschitz
+
+    def correlation(self, beta):
+        r""":math:`\mathbf{X^T}(\mathbf{Y} - \mathbf{X}\boldsymbol{\beta})`."""
+        if self.gram is not None:
+            return self.xty - np.dot(self.gram, beta)
+        if isinstance(self.data, DataOperator):
+            return self.data.correlation(self.labels, beta)
+        if self.xty is not None:
+            return self.xty - self.data.T.dot(self.data.dot(beta))
+        return self.data.T.dot(self.labels - self.data.dot(beta))
+
+    def gradient(self, beta, out):
+        """Gradient evaluated in ``beta``, stored in ``out``."""
+        np.multiply(self.correlation(beta), -2. / self.n, out=out)
+        if self.mu:
+            out += (2. * self.mu) * beta
+        return out
+
+    def local_lipschitz(self, direction):
+        """Curvature of the least squares term along ``direction``.
+
+        Used for the adaptive step size. As in the original l1l2py
+        implementation, the `l2-norm` term is not included.
+        """
+        if self.gram is not None:
+            num = np.dot(direction, np.dot(self.gram, direction))
+        else:
+            tmp = self.data.dot(direction)
+            num = np.dot(tmp, tmp)
+        return 2. * num / (self.n * np.dot(direction, direction))
+
+    def value(self, beta):
+        r"""Value of the functional in ``beta``.
+
+        In Gram mode without ``labels`` the constant term
+        :math:`\|\mathbf{Y}\|_2^2 / n` is not included.
+        """
+        if self.gram is not None:
+            value = (np.dot(beta, np.dot(self.gram, beta)) -
+                     2. * np.dot(self.xty, beta) + (self._yty or 0.)) / self.n
+        else:
+            residual = self.labels - self.data.dot(beta)
+            value = np.dot(residual, residual) / self.n
+        return value + self.mu * np.dot(beta, beta)
+
+    def cost(self, curvature=False):
+        """Estimated cost of :meth:`gradient` (or of
+        :meth:`local_lipschitz`, if ``curvature`` is `True`).
+
+        Returns the number of matrix-vector products, of floating point
+        operations and of allocated arrays (see :mod:`l1l2py.trace`).
+        """
+        if self.gram is not None:
+            matvecs, flops = 1, 2 * self.d * self.d
+        else:
+            matvecs, flops = 2, 4 * _entries(self.data)
+        if curvature:
+            return 1, flops // matvecs, 1
+        return matvecs, flops, matvecs + 1 + (1 if self.mu else 0)
+
+
+class L1Prox(object):
+    """Proximity operator of ``tau`` times the `l1-norm` (soft-thresholding).
+
+    Parameters
+    ----------
+    tau : float
+        `l1-norm` penalty.
+    positive : bool, optional (default is `False`)
+        If `True`, the solution is projected on the positive orthant.
+    """
+
+    def __init__(self, tau, positive=False):
+        self.tau = tau
+        self.positive = positive
+
+    def __call__(self, value, step, out):
+        """Apply the operator with step size ``step``, storing in ``out``."""
+        np.abs(value, out=out)
+        out -= self.tau * step
+        np.maximum(out, 0., out=out)
+        np.copysign(out, value, out=out)
+        if self.positive:
+            np.maximum(out, 0., out=out)
+        return out
+
+    def penalty(self, beta):
+        """Value of the penalty in ``beta``."""
+        return self.tau * np.abs(beta).sum()
+
+
+def _fista_block(step, momentum, prox, grad, aux_beta, beta, beta_next,
+                 beta_diff, value, block):
+    # Proximal and extrapolation steps on a block of coefficients,
+    # returns the block maxima used by the stopping rule
+    np.multiply(grad[block], -step, out=value[block])
+    value[block] += aux_beta[block]
+    prox(value[block], step, out=beta_next[block])
+
+    np.subtract(beta_next[block], beta[block], out=beta_diff[block])
+    np.multiply(beta_diff[block], momentum, out=aux_beta[block])
+    aux_beta[block] += beta_next[block]
+    return np.abs(beta_diff[block]).max(), np.abs(beta_next[block]).max()
+
+
+def _objective(loss, prox, beta):
+    return loss.value(beta) + prox.penalty(beta)
+
+
+def _record(trace, objective, beta, n_iter, lipschitz_constant):
+    trace.record(n_iter, objective, 1. / lipschitz_constant,
+                 np.count_nonzero(beta))
+
+
+def fista(loss, prox, beta, max_iter, tol, adaptive=False, executor=None,
+          budget=None, trace=None):
+    r"""Fast Iterative Shrinkage-Thresholding Algorithm.
+
+    Minimizes the sum of a smooth ``loss`` and of a function with proximity
+    operator ``prox``.
+
+    Parameters
+    ----------
+    loss : object
+        Smooth part, it must expose ``lipschitz_constant``,
+        ``gradient(beta, out)`` and, only if ``adaptive`` is `True`,
+        ``local_lipschitz(direction)`` (see :class:`SquareLoss`).
+    prox : callable
+        Proximity operator called as ``prox(value, step, out)``
+        (see :class:`L1Prox`).
+    beta : (P,) ndarray
+        Starting value for the iterations (it is not modified).
+    max_iter : int
+        Maximum number of iterations.
+    tol : float
+        Convergence tolerance on the relative maximum variation.
+    adaptive : bool, optional (default is `False`)
+        If `True`, the step size is adapted at each iteration.
+    executor : ThreadedMatrix, optional (default is `None`)
+        If given (and ``adaptive`` is `False`), the element-wise updates
+        of each iteration are split in blocks of coefficients processed
+        by its pool of threads (see
+        :class:`l1l2py.operators.ThreadedMatrix`). The iterates are the
+        same of the sequential algorithm.
+    budget : Budget, optional (default is `None`)
+        Running time and cancellation state (see :mod:`l1l2py.budget`),
+        checked every ``budget.check_every`` iterations. If it expires, the
+        iterate with the lowest objective is returned and ``budget.status``
+        is set. The objective is then evaluated at each iteration.
+    trace : SolverTrace, optional (default is `None`)
+        If given, the iterations are recorded (see :mod:`l1l2py.trace`).
+        The loss must expose ``value(beta)`` and ``cost(curvature)`` and
+        the proximity operator ``penalty(beta)``.
+
+    Returns
+    -------
+    beta : (P,) ndarray
+        Solution.
+    n_iter : int
+        Number of iterations performed.
+    """
+    beta = np.array(beta, dtype=np.result_type(beta, float)).ravel()
+
+    blocks = None
+    if executor is not None and not adaptive:
+        blocks = executor.blocks(beta.size)
+
+    # First iteration with standard step size
+    lipschitz_constant = loss.lipschitz_constant
+    if lipschitz_constant < np.finfo(float).eps:  # is zero...
+        return beta, 0
+
+    if trace is not None:
+        trace.start()
+        trace.count(allocations=5)  # buffers
+        cost = loss.cost()
+        curvature_cost = loss.cost(curvature=True)
+
+    # Buffers shared by all the iterations
+    aux_beta = beta.copy()
+    beta_next = np.empty_like(beta)
+    beta_diff = np.empty_like(beta)
+    grad = np.empty_like(beta)
+    value = np.empty_like(beta)
+    t = 1.
+
+    # With a budget the iterations can stop at any time: FISTA does not
+    # decrease the objective at each step, so the best iterate is kept
+    best_beta = best_objective = None
+    if budget is not None:
+        best_beta, best_objective = beta.copy(), _objective(loss, prox, beta)
+        if trace is not None:
+            trace.count(allocations=1)
+
+    n_iter = 0
+    for n_iter in xrange(1, max_iter + 1):
+        # Gradient step followed by the proximity operator
+        loss.gradient(aux_beta, out=grad)
+        t_next = 0.5 * (1. + np.sqrt(1. + 4. * t * t))
+        if blocks is not None and len(blocks) > 1:
+            maxima = executor.map(
+                partial(_fista_block, 1. / lipschitz_constant,
+                        (t - 1.) / t_next, prox, grad, aux_beta, beta,
+                        beta_next, beta_diff, value), blocks)
+            max_diff = max(m[0] for m in maxima)
+            max_coef = max(m[1] for m in maxima)
+        else:
+            np.multiply(grad, -1. / lipschitz_constant, out=value)
+            value += aux_beta
+            prox(value, 1. / lipschitz_constant, out=beta_next)
+
+            # ## Adaptive step size ###################################
+            if adaptive:
+                np.subtract(aux_beta, beta_next, out=beta_diff)
+
+                # Only if there is an increment of the solution
+                # we can calculate the adaptive step-size
+                if np.any(beta_diff):
+                    lipschitz_constant = loss.local_lipschitz(beta_diff)
+                    if trace is not None:
+                        trace.count(*curvature_cost)
+                    np.multiply(grad, -1. / lipschitz_constant, out=value)
+                    value += aux_beta
+                    prox(value, 1. / lipschitz_constant, out=beta_next)
+
+            # FISTA ################################################
+            np.subtract(beta_next, beta, out=beta_diff)
+            np.multiply(beta_diff, (t - 1.) / t_next, out=aux_beta)
+            aux_beta += beta_next
+
+            # Convergence values
+            max_diff = np.abs(beta_diff).max()
+            max_coef = np.abs(beta_next).max()
+
+        # Values update (buffers are swapped, not copied)
+        t = t_next
+        beta, beta_next = beta_next, beta
+        objective = None
+        if trace is not None:
+            trace.count(*cost)
+            objective = _objective(loss, prox, beta)
+            _record(trace, objective, beta, n_iter, lipschitz_constant)
+        if best_beta is not None:
+            if objective is None:
+                objective = _objective(loss, prox, beta)
+            if objective < best_objective:
+                best_objective = objective
+                best_beta[:] = beta
+
+        # Stopping rule (exit even if beta_next contains only zeros)
+        if max_coef == 0.0 or (max_diff / max_coef) <= tol:
+            break
+        if budget is not None and budget.expired(n_iter):
+            beta = best_beta
+            break
+
+    return beta, n_iter
+
+
+def l1l2_fista(data, labels, mu, tau, beta=None, max_iter=100000, tol=1e-5,
+               adaptive=False, positive=False, gram=None, xty=None,
+               max_eigenvalue=None, budget=None, trace=None, n_samples=None):
+    r"""Solve the `l1l2` regularization problem with FISTA.
+
+    .. math::
+        \frac{1}{n} \| \mathbf{Y} - \mathbf{X}\boldsymbol{\beta} \|_2^2
+        + \mu \|\boldsymbol{\beta}\|_2^2
+        + \tau \|\boldsymbol{\beta}\|_1
+
+    This is the common back-end of all the public `l1l2` solvers.
+
+    Parameters
+    ----------
+    data : (N, P) ndarray or DataOperator
+        Data matrix (see :mod:`l1l2py.operators`).
+    labels : (N,) or (N, 1) ndarray
+        Labels vector.
+    mu : float
+        `l2-norm` penalty.
+    tau : float
+        `l1-norm` penalty.
+    beta : (P,) or (P, 1) ndarray, optional (default is `None`)
+        Starting value for the iterations.
+        If `None`, then iterations starts from the empty model.
+    max_iter : int, optional (default is `1e5`)
+        Maximum number of iterations.
+    tol : float, optional (default is `1e-5`)
+        Convergence tolerance.
+    adaptive : bool, optional (default is `False`)
+        If `True`, minimization is performed calculating an adaptive step size
+        for each iteration.
+    positive : bool, optional (default is `False`)
+        If `True`, forces the coefficients to be positive.
+    gram : (P, P) ndarray, optional (default is `None`)
+        Precomputed Gram matrix (see :class:`SquareLoss`).
+    xty : (P,) ndarray, optional (default is `None`)
+        Precomputed :math:`\mathbf{X^T}\mathbf{Y}`.
+    max_eigenvalue : float, optional (default is `None`)
+        Upper bound of the maximum eigenvalue of
+        :math:`\mathbf{X^T}\mathbf{X}` (see :class:`SquareLoss`).
+    budget : Budget, optional (default is `None`)
+        Running time and cancellation state (see :func:`fista`).
+    trace : SolverTrace, optional (default is `None`)
+        Trace of the iterations (see :mod:`l1l2py.trace`).
+    n_samples : int, optional (default is `None`)
+        Number of samples, needed only if ``data`` is `None` (Gram mode,
+        see :class:`SquareLoss`).
+
+    Returns
+    -------
+    beta : (P,) ndarray
+        `l1l2` solution.
+    n_iter : int
+        Number of iterations performed.
+    """
+    if beta is None:
+        beta = np.zeros(gram.shape[0] if data is None else data.shape[1])
+
+    loss = SquareLoss(data, labels, mu, gram=gram, xty=xty,
+                      n_samples=n_samples, max_eigenvalue=max_eigenvalue)
+    prox = L1Prox(tau, positive=positive)
+    executor = data if isinstance(data, ThreadedMatrix) else None
+    return fista(loss, prox, beta, max_iter, tol, adaptive=adaptive,
+                 executor=executor, budget=budget, trace=trace)
@@ -0,0 +1,627 @@
+r"""Data matrices which are not stored as plain ndarrays.
+
+:class:`QuantizedMatrix` stores the data with reduced precision,
+:class:`StandardizedMatrix` normalizes the data on the fly and
+:class:`ThreadedMatrix` splits the products among a pool of threads.
+
+The objects defined in this module can be used in place of the ``(N, P)``
+data matrix by the solvers (:mod:`l1l2py.fista`, :mod:`l1l2py.shotgun` and
+the functions of :mod:`l1l2py.algorithms` built on them). They expose the
+interface used by the solvers on ndarrays, that is ``shape``,
+``dot(beta)``, ``T.dot(residual)`` and indexing (``X[:, selected]``
+returns a dense ndarray), plus ``gram()`` which returns the smallest
+between :math:`\mathbf{X^T}\mathbf{X}` and
+:math:`\mathbf{X}\mathbf{X^T}`.
+
+The solution and the convergence checks of the solvers are always in
+double precision.
+"""
+
+# This code is written by
+#       Federico Tomasi <federico.tomasi@dibris.unige.it>
+# Copyright (C) 2017 SlipGURU -
+# Statistical Learning and Image Processing Genoa University Research Group
+# Via Dodecaneso, 35 - 16146 Genova, ITALY.
+#
+# This file is part of L1L2Py.
+#
+# L1L2Py is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# L1L2Py is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
+
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+from scipy import sparse
+from six.moves import xrange
+
+__all__ = ('DataOperator', 'QuantizedMatrix', 'quantize',
+           'StandardizedMatrix', 'lazy_center', 'lazy_standardize',
+           'ThreadedMatrix')
+
+
+class DataOperator(object):
+    """Base class of the data matrices which are not ndarrays.
+
+    Subclasses must define ``shape``, ``dot``, ``rdot`` (product with the
+    transpose), ``gram`` and ``_submatrix``, used to index the operator
+    (``X[:, selected]`` returns a dense ndarray).
+    """
+
+    ndim = 2
+
+    @property
+    def T(self):
+        """Transposed operator (only ``dot`` is supported)."""
+        return _Transposed(self)
+
+    def dot(self, beta):
+        raise NotImplementedError
+
+    def rdot(self, residual):
+        raise NotImplementedError
+
+    def gram(self):
+        raise NotImplementedError
+
+    def correlation(self, labels, beta):
+        r""":math:`\mathbf{X^T}(\mathbf{Y} - \mathbf{X}\boldsymbol{\beta})`."""
+        return self.rdot(labels - self.dot(beta))
+
+    def _submatrix(self, rows, columns):
+        raise NotImplementedError
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        rows, columns = key
+        return self._submatrix(rows, columns)
+
+    def toarray(self):
+        """Dense (N, P) ndarray."""
+        return self._submatrix(slice(None), slice(None))
+
+
+class _Transposed(object):
+    # Lightweight transposed view of a DataOperator
+
+    ndim = 2
+
+    def __init__(self, operator):
+        self.operator = operator
+        self.shape = operator.shape[::-1]
+
+    @property
+    def T(self):
+        return self.operator
+
+    def dot(self, residual):
+        return self.operator.rdot(residual)
+
+
+class QuantizedMatrix(DataOperator):
+    r"""Data matrix stored with reduced precision.
+
+    Each column :math:`j` is stored as ``codes[:, j]`` and recovered as
+    ``codes[:, j] * scale[j] + offset[j]``. The codes are decoded one block
+    of rows (or columns) at a time, so that only ``buffer_size`` decoded
+    values are in memory at once.
+
+    Scale and offset are applied to the (small) vectors instead of the
+    decoded blocks, and the products with the decoded blocks are computed
+    in ``compute_dtype``; the results are returned in double precision.
+    Note that `int8` codes are represented exactly in single precision.
+
+    Use :func:`quantize` to build it from a data matrix.
+
+    Parameters
+    ----------
+    codes : (N, P) ndarray of int8 or float16
+        Stored values.
+    scale : (P,) ndarray
+        Scale of each column.
+    offset : (P,) ndarray
+        Offset of each column.
+    buffer_size : int, optional (default is `2**20`)
+        Maximum number of values decoded at the same time.
+    compute_dtype : numpy dtype, optional (default is `numpy.float32`)
+        Precision of the products with the decoded blocks.
+    """
+
+    def __init__(self, codes, scale, offset, buffer_size=2 ** 20,
+                 compute_dtype=np.float32):
+        self.codes = np.ascontiguousarray(codes)
+        self.scale = np.asarray(scale, dtype=float).ravel()
+        self.offset = np.asarray(offset, dtype=float).ravel()
+        self.buffer_size = buffer_size
+        self.compute_dtype = compute_dtype
+        self.shape = self.codes.shape
+
+    @property
+    def nbytes(self):
+        """Memory used by the stored values."""
+        return self.codes.nbytes + self.scale.nbytes + self.offset.nbytes
+
+    def _row_blocks(self):
+        n, p = self.shape
+        step = max(1, self.buffer_size // p)
+        for start in xrange(0, n, step):
+            yield slice(start, min(start + step, n))
+
+    def _column_blocks(self):
+        n, p = self.shape
+        step = max(1, self.buffer_size // n)
+        for start in xrange(0, p, step):
+            yield slice(start, min(start + step, p))
+
+    def _decode(self, rows=slice(None), columns=slice(None)):
+        block = self.codes[rows][:, columns].astype(float)
+        block *= self.scale[columns]
+        block += self.offset[columns]
+        return block
+
+    def _scaled(self, beta):
+        # Coefficients acting on the codes
+        if beta.ndim == 1:
+            return (beta * self.scale).astype(self.compute_dtype)
+        return (beta * self.scale[:, np.newaxis]).astype(self.compute_dtype)
+
+    def dot(self, beta):
+        r""":math:`\mathbf{X}\boldsymbol{\beta}` (``beta`` can be 2D)."""
+        beta = np.asarray(beta, dtype=float)
+        out = np.empty((self.shape[0],) + beta.shape[1:])
+        out[...] = np.dot(self.offset, beta)
+
+        if beta.ndim == 1:
+            # only the columns in the support are decoded
+            support = np.flatnonzero(beta)
+            if support.size == 0:
+                return out
+            if 4 * support.size < self.shape[1]:
+                scaled = (beta[support] *
+                          self.scale[support]).astype(self.compute_dtype)
+                for rows in self._row_blocks():
+                    block = self.codes[rows][:, support]
+                    out[rows] += np.dot(block.astype(self.compute_dtype),
+                                        scaled)
+                return out
+
+        scaled = self._scaled(beta)
+        for rows in self._row_blocks():
+            out[rows] += np.dot(self.codes[rows].astype(self.compute_dtype),
+                                scaled)
+        return out
+
+    def rdot(self, residual):
+        r""":math:`\mathbf{X^T}\mathbf{r}` (``residual`` can be 2D)."""
+        residual = np.asarray(residual, dtype=float)
+        out = np.zeros((self.shape[1],) + residual.shape[1:])
+        cast = residual.astype(self.compute_dtype)
+        for rows in self._row_blocks():
+            out += np.dot(self.codes[rows].astype(self.compute_dtype).T,
+                          cast[rows])
+        return self._rescale(out, residual)
+
+    def correlation(self, labels, beta):
+        r""":math:`\mathbf{X^T}(\mathbf{Y} - \mathbf{X}\boldsymbol{\beta})`.
+
+        Each block of codes is decoded only once for both products.
+        """
+        labels = np.asarray(labels, dtype=float)
+        beta = np.asarray(beta, dtype=float)
+        scaled = self._scaled(beta)
+        shift = np.dot(self.offset, beta)
+
+        residual = np.empty_like(labels)
+        out = np.zeros(self.shape[1:] + beta.shape[1:])
+        for rows in self._row_blocks():
+            block = self.codes[rows].astype(self.compute_dtype)
+            residual[rows] = labels[rows] - shift - np.dot(block, scaled)
+            out += np.dot(block.T, residual[rows].astype(self.compute_dtype))
+        return self._rescale(out, residual)
+
+    def _rescale(self, out, residual):
+        # From the products with the codes to the products with the data
+        if residual.ndim == 1:
+            out *= self.scale
+        else:
+            out *= self.scale[:, np.newaxis]
+        out += np.multiply.outer(self.offset, residual.sum(axis=0))
+        return out
+
+    def gram(self):
+        r"""Smallest between :math:`\mathbf{X^T}\mathbf{X}` and
+        :math:`\mathbf{X}\mathbf{X^T}` (in double precision)."""
+        n, p = self.shape
+        if p > n:
+            out = np.zeros((n, n))
+            for columns in self._column_blocks():
+                block = self._decode(columns=columns)
+                out += np.dot(block, block.T)
+        else:
+            out = np.zeros((p, p))
+            for rows in self._row_blocks():
+                block = self._decode(rows=rows)
+                out += np.dot(block.T, block)
+        return out
+
+    def _submatrix(self, rows, columns):
+        return self._decode(rows, columns)
+
+
+def quantize(data, dtype=np.int8, buffer_size=2 ** 20,
+             compute_dtype=np.float32):
+    r"""Compress a data matrix in a :class:`QuantizedMatrix`.
+
+    With ``int8`` storage each column is linearly mapped on the integers
+    in :math:`[-127, 127]`. Columns containing at most 255 consecutive
+    integer values (e.g. genotype codes `0/1/2`) are stored exactly.
+    With ``float16`` storage each column is mapped on :math:`[-1, 1]`,
+    which preserves about three significant digits; note that decoding
+    ``float16`` values is slower than decoding ``int8`` ones.
+
+    Parameters
+    ----------
+    data : (N, P) ndarray
+        Data matrix.
+    dtype : {numpy.int8, numpy.float16}, optional (default is `numpy.int8`)
+        Storage type.
+    buffer_size : int, optional (default is `2**20`)
+        Maximum number of values decoded at the same time.
+    compute_dtype : numpy dtype, optional (default is `numpy.float32`)
+        Precision of the products with the decoded blocks.
+
+    Returns
+    -------
+    matrix : QuantizedMatrix
+        Compressed data matrix.
+    """
+    data = np.asarray(data)
+    dtype = np.dtype(dtype)
+    if dtype == np.int8:
+        levels = 127.
+    elif dtype == np.float16:
+        levels = 1.
+    else:
+        raise ValueError('dtype should be either int8 or float16.')
+
+    low, high = data.min(axis=0), data.max(axis=0)
+    offset = (high + low) / 2.
+    scale = (high - low) / (2. * levels)
+    if dtype == np.int8:
+        exact = (np.all(data == np.round(data), axis=0) &
+                 (high - low <= 2 * levels))
+        offset[exact] = np.floor(offset[exact])
+        scale[exact] = 1.
+    scale[scale == 0] = 1.  # constant columns
+
+    matrix = QuantizedMatrix(np.empty(data.shape, dtype=dtype), scale, offset,
+                             buffer_size=buffer_size,
+                             compute_dtype=compute_dtype)
+    for rows in matrix._row_blocks():
+        codes = (data[rows] - offset) / scale
+        if dtype == np.int8:
+            codes = np.clip(np.round(codes), -128, 127)
+        matrix.codes[rows] = codes
+    return matrix
+
+
+class StandardizedMatrix(DataOperator):
+    r"""Normalized data matrix which is never materialized.
+
+    It represents :math:`(\mathbf{X} - \mathbf{1}\mathbf{m}^T)
+    \mathbf{D}^{-1}`, where :math:`\mathbf{m}` is ``mean`` and
+    :math:`\mathbf{D}` the diagonal matrix of ``scale``. The corrections
+    are applied to the vectors in the products, so that the (possibly
+    sparse) data matrix is neither copied nor densified.
+
+    Use :func:`lazy_center` or :func:`lazy_standardize` to build it
+    (they can be used as ``data_normalizer`` in :mod:`l1l2py.core`).
+
+    Parameters
+    ----------
+    data : (N, P) ndarray or scipy.sparse matrix
+        Original data matrix.
+    mean : (P,) ndarray, optional (default is `None`)
+        Value subtracted to each column. If `None`, columns are not
+        centered.
+    scale : (P,) ndarray, optional (default is `None`)
+        Value dividing each (centered) column. If `None`, columns are
+        not scaled.
+    """
+
+    def __init__(self, data, mean=None, scale=None):
+        self.data = data
+        self.shape = data.shape
+        p = data.shape[1]
+        self.mean = (np.zeros(p) if mean is None else
+                     np.asarray(mean, dtype=float).ravel())
+        self.scale = (np.ones(p) if scale is None else
+                      np.asarray(scale, dtype=float).ravel())
+
+    def _columns(self, vector, values):
+        # Broadcast per-column values on 1D or 2D vectors
+        return values if vector.ndim == 1 else values[:, np.newaxis]
+
+    def dot(self, beta):
+        r""":math:`\mathbf{X}\boldsymbol{\beta}` (``beta`` can be 2D)."""
+        beta = np.asarray(beta, dtype=float)
+        beta = beta / self._columns(beta, self.scale)
+        return np.asarray(self.data.dot(beta)) - np.dot(self.mean, beta)
+
+    def rdot(self, residual):
+        r""":math:`\mathbf{X^T}\mathbf{r}` (``residual`` can be 2D)."""
+        residual = np.asarray(residual, dtype=float)
+        out = np.asarray(self.data.T.dot(residual), dtype=float)
+        out -= np.multiply.outer(self.mean, residual.sum(axis=0))
+        out /= self._columns(residual, self.scale)
+        return out
+
+    def gram(self):
+        r"""Smallest between :math:`\mathbf{X^T}\mathbf{X}` and
+        :math:`\mathbf{X}\mathbf{X^T}`."""
+        n, p = self.shape
+        if p > n:
+            # X D^-2 X^T, corrected for the centering
+            weights = self.scale ** -2
+            if sparse.issparse(self.data):
+                out = self.data.dot(sparse.diags(weights)).dot(self.data.T)
+                out = out.toarray()
+            else:
+                out = np.zeros((n, n))
+                step = max(1, 2 ** 20 // n)
+                for start in xrange(0, p, step):
+                    block = self.data[:, start:start + step]
+                    out += np.dot(block * weights[start:start + step],
+                                  block.T)
+            shift = np.asarray(self.data.dot(self.mean * weights)).ravel()
+            out -= shift[:, np.newaxis]
+            out -= shift[np.newaxis, :]
+            out += np.dot(self.mean, self.mean * weights)
+        else:
+            out = self.data.T.dot(self.data)
+            if sparse.issparse(out):
+                out = out.toarray()
+            # the mean is not the one of these columns in general (e.g.
+            # a test set centered with the mean of the training set)
+            sums = np.asarray(self.data.sum(axis=0), dtype=float).ravel()
+            correction = np.outer(self.mean, sums)
+            out = out - correction - correction.T
+            out += n * np.outer(self.mean, self.mean)
+            out /= np.outer(self.scale, self.scale)
+        return out
+
+    def _submatrix(self, rows, columns):
+        block = self.data[rows][:, columns]
+        if sparse.issparse(block):
+            block = block.toarray()
+        return (block - self.mean[columns]) / self.scale[columns]
+
+
+def _column_moments(matrix):
+    # Mean and standard deviation (ddof=1) of the columns of a dense or
+    # sparse matrix, without copying it
+    n = matrix.shape[0]
+    mean = np.asarray(matrix.mean(axis=0), dtype=float).ravel()
+    if sparse.issparse(matrix):
+        squares = np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel()
+        var = (squares - n * mean ** 2) / (n - 1)
+    else:
+        var = np.zeros_like(mean)
+        step = max(1, 2 ** 20 // matrix.shape[1])
+        for start in xrange(0, n, step):
+            var += ((matrix[start:start + step] - mean) ** 2).sum(axis=0)
+        var /= (n - 1)
+    return mean, np.sqrt(np.maximum(var, 0.))
+
+
+def lazy_center(matrix, optional_matrix=None, return_mean=False):
+    r"""Center columns of a matrix, without copying it.
+
+    Same as :func:`l1l2py.tools.center`, but the returned matrices are
+    :class:`StandardizedMatrix` operators.
+
+    Parameters
+    ----------
+    matrix : (N, P) ndarray or scipy.sparse matrix
+        Input matrix whose columns are to be centered.
+    optional_matrix : (M, P) ndarray or scipy.sparse matrix, optional
+        Optional matrix whose columns are to be centered
+        using mean of ``matrix``.
+    return_mean : bool, optional (default is `False`)
+        If `True` returns mean of ``matrix``.
+
+    Returns
+    -------
+    matrix_centered : StandardizedMatrix
+        Centered ``matrix``.
+    optional_matrix_centered : StandardizedMatrix, optional
+        Centered ``optional_matrix`` with respect to ``matrix``
+    mean : (P,) ndarray, optional
+        Mean of ``matrix`` columns.
+    """
+    mean = np.asarray(matrix.mean(axis=0), dtype=float).ravel()
+
+    out = [StandardizedMatrix(matrix, mean)]
+    if optional_matrix is not None:
+        out.append(StandardizedMatrix(optional_matrix, mean))
+    if return_mean:
+        out.append(mean)
+    return out[0] if len(out) == 1 else tuple(out)
+
+
+def lazy_standardize(matrix, optional_matrix=None, return_factors=False):
+    r"""Standardize columns of a matrix, without copying it.
+
+    Same as :func:`l1l2py.tools.standardize`, but the returned matrices are
+    :class:`StandardizedMatrix` operators. Constant columns are only
+    centered.
+
+    Parameters
+    ----------
+    matrix : (N, P) ndarray or scipy.sparse matrix
+        Input matrix whose columns are to be standardized
+        to mean `0` and standard deviation `1`.
+    optional_matrix : (M, P) ndarray or scipy.sparse matrix, optional
+        Optional matrix whose columns are to be standardized
+        using mean and standard deviation of ``matrix``.
+    return_factors : bool, optional (default is `False`)
+        If `True`, returns mean and standard deviation of ``matrix``.
+
+    Returns
+    -------
+    matrix_standardized : StandardizedMatrix
+        Standardized ``matrix``.
+    optional_matrix_standardized : StandardizedMatrix, optional
+        Standardized ``optional_matrix`` with respect to ``matrix``
+    mean : (P,) ndarray, optional
+        Mean of ``matrix`` columns.
+    std : (P,) ndarray, optional
+        Standard deviation of ``matrix`` columns.
+
+    Raises
+    ------
+    ValueError
+        If ``matrix`` has only one row.
+    """
+    if matrix.shape[0] == 1:
+        raise ValueError("'matrix' must have more than one row")
+
+    mean, std = _column_moments(matrix)
+    scale = np.where(std > 0, std, 1.)
+
+    out = [StandardizedMatrix(matrix, mean, scale)]
+    if optional_matrix is not None:
+        out.append(StandardizedMatrix(optional_matrix, mean, scale))
+    if return_factors:
+        out.extend((mean, std))
+    return out[0] if len(out) == 1 else tuple(out)
+
+
+class ThreadedMatrix(DataOperator):
+    r"""Dense data matrix whose products are split among threads.
+
+    The rows are split in blocks of ``block_size`` rows: the products
+    :math:`\mathbf{X}\boldsymbol{\beta}` are computed block by block and
+    the products :math:`\mathbf{X^T}\mathbf{r}` (and the gradient of the
+    least squares term, in a single pass over the data) are the sums of
+    the contributions of the blocks.
+
+    The blocks are processed by a persistent pool of ``n_threads``
+    threads (the BLAS calls release the GIL). The partial sums are always
+    accumulated in the order of the blocks, so the results depend on
+    ``block_size`` but not on the number of threads or on the scheduling.
+
+    The same pool is used by :func:`l1l2py.fista.fista` to split the
+    element-wise updates of the solution (proximal step and convergence
+    checks) in blocks of ``block_size`` coefficients.
+
+    The pool is created when first needed; use :meth:`close` (or a
+    ``with`` statement) to release the threads.
+
+    Parameters
+    ----------
+    data : (N, P) ndarray
+        Data matrix.
+    n_threads : int, optional (default is `None`)
+        Number of threads. If `None`, the number of CPUs is used.
+    block_size : int, optional (default is `2**14`)
+        Number of rows (or coefficients) in each block.
+    """
+
+    def __init__(self, data, n_threads=None, block_size=2 ** 14):
+        self.data = np.asarray(data, dtype=float)
+        self.shape = self.data.shape
+        self.n_threads = (multiprocessing.cpu_count() if n_threads is None
+                          else n_threads)
+        self.block_size = block_size
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Terminate the threads of the pool."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def blocks(self, size):
+        """Consecutive slices of ``block_size`` elements of ``range(size)``."""
+        return [slice(start, min(start + self.block_size, size))
+                for start in xrange(0, size, self.block_size)]
+
+    def map(self, function, blocks):
+        """Apply ``function`` to each block, returning results in order."""
+        if len(blocks) == 1 or self.n_threads == 1:
+            return [function(block) for block in blocks]
+        if self._pool is None:
+            self._pool = ThreadPool(self.n_threads)
+        return self._pool.map(function, blocks)
+
+    def _reduce(self, function):
+        # Sum in the order of the row blocks (deterministic)
+        partial_sums = self.map(function, self.blocks(self.shape[0]))
+        out = partial_sums[0]
+        for value in partial_sums[1:]:
+            out += value
+        return out
+
+    def dot(self, beta):
+        r""":math:`\mathbf{X}\boldsymbol{\beta}` (``beta`` can be 2D)."""
+        beta = np.asarray(beta, dtype=float)
+        out = np.empty((self.shape[0],) + beta.shape[1:])
+
+        def block_dot(rows):
+            out[rows] = np.dot(self.data[rows], beta)
+        self.map(block_dot, self.blocks(self.shape[0]))
+        return out
+
+    def rdot(self, residual):
+        r""":math:`\mathbf{X^T}\mathbf{r}` (``residual`` can be 2D)."""
+        residual = np.asarray(residual, dtype=float)
+        return self._reduce(
+            lambda rows: np.dot(self.data[rows].T, residual[rows]))
+
+    def correlation(self, labels, beta):
+        r""":math:`\mathbf{X^T}(\mathbf{Y} - \mathbf{X}\boldsymbol{\beta})`.
+
+        Each block of rows is read once.
+        """
+        labels = np.asarray(labels, dtype=float)
+        beta = np.asarray(beta, dtype=float)
+
+        def block_correlation(rows):
+            block = self.data[rows]
+            return np.dot(block.T, labels[rows] - np.dot(block, beta))
+        return self._reduce(block_correlation)
+
+    def gram(self):
+        """Smallest between X^T X and X X^T."""
+        n, p = self.shape
+        if p > n:
+            out = np.empty((n, n))
+
+            def block_gram(rows):
+                out[rows] = np.dot(self.data[rows], self.data.T)
+            self.map(block_gram, self.blocks(n))
+            return out
+        return self._reduce(
+            lambda rows: np.dot(self.data[rows].T, self.data[rows]))
+
+    def _submatrix(self, rows, columns):
+        return self.data[rows][:, columns]
@@ -3,16 +3,11 @@
 # License: BSD Style.
 
 import warnings
-from math import sqrt
 
 import numpy as np
 
-try:
-    from scipy import linalg as la
-except ImportError:
-    from numpy import linalg as la
-
 from .base import AbstractLinearModel
+from .fista import SquareLoss, L1Prox, fista
 from .metrics import regression_error
 from .cross_val import KFold
 
@@ -78,92 +73,18 @@ def l1l2_regularization(data, labels, mu, tau, beta=None, kmax=100000,
     else:
         beta = beta.ravel()
 
-    # Useful quantities
-    X = data
-    Y = labels.ravel()
-
-    if n > d:
-        XTY = np.dot(X.T, Y)
-
-    # First iteration with standard sigma
-    sigma = _sigma(data, mu)
-    if sigma < np.finfo(float).eps: # is zero...
+    loss = SquareLoss(data, labels, mu)
+    if loss.lipschitz_constant < np.finfo(float).eps: # is zero...
         return np.zeros(d), 0
 
-    mu_s = mu / sigma
-    tau_s = tau / (2.0 * sigma)
-    nsigma = n * sigma
-
-    # Starting conditions
-    auxcoef_ = beta
-    t = 1.
-
-    for k in xrange(kmax):
-        # Pre-calculated "heavy" computation
-        if n > d:
-            precalc = XTY - np.dot(X.T, np.dot(X, auxcoef_))
-        else:
-            precalc = np.dot(X.T, Y - np.dot(X, auxcoef_))
-
-        # TODO: stopping rule based on r = Y - Xbeta ??
-
-        # Soft-Thresholding
-        value = (precalc / nsigma) + ((1.0 - mu_s) * auxcoef_)
-        beta_next = np.sign(value) * np.clip(np.abs(value) - tau_s, 0, np.inf)
-
-        ######## Adaptive step size #######################################
-        if adaptive:
-            beta_diff = (auxcoef_ - beta_next)
-
-            # Only if there is an increment of the solution
-            # we can calculate the adaptive step-size
-            if np.any(beta_diff):
-                # grad_diff = np.dot(XTn, np.dot(X, beta_diff))
-                # num = np.dot(beta_diff, grad_diff)
-                tmp = np.dot(X, beta_diff) # <-- adaptive-step-size drawback
-                num = np.dot(tmp, tmp) / n
-
-                sigma = (num / np.dot(beta_diff, beta_diff))
-                mu_s = mu / sigma
-                tau_s = tau / (2.0*sigma)
-                nsigma = n * sigma
-
-                # Soft-Thresholding
-                value = (precalc / nsigma) + ((1.0 - mu_s) * auxcoef_)
-                beta_next = value * np.maximum(0, 1 - tau_s/np.abs(value))
-
-        ######## FISTA ####################################################
-        beta_diff = (beta_next - beta)
-        t_next = 0.5 * (1.0 + sqrt(1.0 + 4.0 * t*t))
-        auxcoef_ = beta_next + ((t - 1.0)/t_next)*beta_diff
-
-        # Convergence values
-        max_diff = np.abs(beta_diff).max()
-        max_coef = np.abs(beta_next).max()
-
-        # Values update
-        t = t_next
-        beta = beta_next
-
-        # Stopping rule (exit even if beta_next contains only zeros)
-        if max_coef == 0.0 or (max_diff / max_coef) <= tolerance: break
+    beta, k = fista(loss, L1Prox(tau), beta, kmax, tolerance,
+                    adaptive=adaptive)
 
     if return_iterations:
-        return beta, k+1
+        return beta, k
     return beta
 
 
-def _sigma(matrix, mu):
-    n, p = matrix.shape
-
-    if p > n:
-        tmp = np.dot(matrix, matrix.T)
-    else:
-        tmp = np.dot(matrix.T, matrix)
-
-    return (la.norm(tmp, 2)/n) + mu
-
-
 ##############################################################################
 # Models
 
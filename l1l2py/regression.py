@@ -27,7 +27,9 @@
 import numpy as np
 import six
 
-from six.moves import xrange
+from functools import partial
+from scipy import sparse
+
 from sklearn.exceptions import ConvergenceWarning
 from sklearn.feature_selection.base import SelectorMixin
 from sklearn.feature_selection.from_model import _get_feature_importances
@@ -38,18 +40,28 @@ from sklearn.linear_model.base import _pre_fit
 from sklearn.linear_model.base import RegressorMixin
 from sklearn.linear_model.coordinate_descent import _alpha_grid
 from sklearn.model_selection import GridSearchCV
+from sklearn.model_selection import ParameterGrid
+from sklearn.model_selection import check_cv
 from sklearn.base import BaseEstimator
 from sklearn.pipeline import Pipeline
 from sklearn.utils import check_array
+from sklearn.utils import check_X_y
 from sklearn.utils import check_random_state
 from sklearn.utils.validation import check_is_fitted
-
-# from l1l2py.algorithms import l1l2_regularization
 try:
-    from scipy import linalg as la
+    from sklearn.externals.joblib import Parallel, delayed, parallel_backend
 except ImportError:
-    from numpy import linalg as la
-# from l1l2py.algorithms import ridge_regression
+    from joblib import Parallel, delayed, parallel_backend
+
+from l1l2py.algorithms import l1l2_path, ridge_criterion
+from l1l2py.autotune import select_solver
+from l1l2py.blas import blas_threads, thread_budget
+from l1l2py.budget import make_budget
+from l1l2py.fista import l1l2_fista, lipschitz
+from l1l2py.fista import SquareLoss, L1Prox, fista
+from l1l2py.operators import ThreadedMatrix
+from l1l2py.shotgun import ShotgunMatrix, shotgun_l1l2
+from l1l2py.trace import make_trace
 
 # from .fista_fast import fista_fast
 
@@ -70,13 +82,7 @@ def get_lipschitz(data):
     L : float
         the Lipschitz constant
     """
-    n, p = data.shape
-
-    if p > n:
-        tmp = np.dot(data, data.T)
-    else:
-        tmp = np.dot(data.T, data)
-    return la.norm(tmp, 2)
+    return lipschitz(data)
 
 
 def least_square_step(y, X, Z):
@@ -119,104 +125,40 @@ def prox_l1(w, alpha):
 
 
 def fista_l1l2(beta, tau, mu, X, y, max_iter, tol, rng, random, positive,
-               adaptive=False):
+               adaptive=False, gram=None, Xy=None, max_eigenvalue=None,
+               n_threads=None, budget=None, trace=None):
     """Fista algorithm for l1l2 regularization.
 
     We minimize
     (1/n) * norm(y - X w, 2)^2 + tau norm(w, 1) + mu norm(w, 2)^2
+
+    The iterations are delegated to :func:`l1l2py.fista.l1l2_fista`.
+    If ``gram`` is given, the Gram matrix is used in place of ``X``.
+    If ``n_threads`` is given, the products with ``X`` are split among
+    threads (see :class:`l1l2py.operators.ThreadedMatrix`).
     """
-    n_samples = y.shape[0]
-    n_features = beta.shape[0]
-
-    # XTY = np.dot(Xt, y)
-    # XTX = np.dot(Xt, X)
-    # if n_samples > n_features:
-    #     XTY = np.dot(Xt, y)
-
-    # First iteration with standard sigma
-    lipschitz_constant = get_lipschitz(X)
-    sigma = lipschitz_constant / n_samples + mu
-
-    if sigma < np.finfo(float).eps:  # is zero...
-        return beta, None, tol, 0
-
-    # mu_s = 1 - mu / sigma
-    mu_s = 1 - mu * n_samples / (lipschitz_constant + mu * n_samples)
-    # tau_s = tau / (2.0 * sigma)
-    tau_s = tau * n_samples * 0.5 / (lipschitz_constant + mu * n_samples)
-    # nsigma = n_samples * sigma
-    gamma = 1. / (lipschitz_constant + mu * n_samples)
-
-    # Starting conditions
-    aux_beta = np.copy(beta)
-    beta_next = np.empty(n_features)
-    t = 1.
-
-    for n_iter in xrange(max_iter):
-        # Pre-calculated "heavy" computation
-        # if n_samples > n_features:
-        #     grad = XTY - np.dot(Xt, np.dot(X, aux_beta))
-        # else:
-        #     grad = np.dot(Xt, y - np.dot(X, aux_beta))
-        # grad = XTY - np.dot(Xt, np.dot(X, aux_beta))
-        grad = least_square_step(y, X, aux_beta)
-
-        # Soft-Thresholding
-        # value = (grad / nsigma) + (mu_s * aux_beta)
-        value = gamma * grad + (mu_s * aux_beta)
-        beta_next = prox_l1(value, tau_s)
-        # np.maximum(np.abs(value) - tau_s, 0, beta_next)
-        # beta_next *= np.sign(value)
-
-        # ## Adaptive step size #######################################
-        if adaptive:
-            beta_diff = (aux_beta - beta_next)
-
-            # Only if there is an increment of the solution
-            # we can calculate the adaptive step-size
-            if np.any(beta_diff):
-                # grad_diff = np.dot(XTn, np.dot(X, beta_diff))
-                # num = np.dot(beta_diff, grad_diff)
-                tmp = np.dot(X, beta_diff)  # <-- adaptive-step-size drawback
-                num = np.dot(tmp, tmp) / n_samples
-
-                sigma = (num / np.dot(beta_diff, beta_diff))
-                mu_s = 1 - mu / sigma
-                tau_s = 0.5 * tau / sigma
-                nsigma = n_samples * sigma
-
-                # Soft-Thresholding
-                value = grad / nsigma + mu_s * aux_beta
-                beta_next = prox_l1(value, tau_s)
-                # np.maximum(np.abs(value) - tau_s, 0, beta_next)
-                # beta_next *= np.sign(value)
-
-        # FISTA
-        beta_diff = (beta_next - beta)
-        t_next = 0.5 * (1 + np.sqrt(1 + 4 * t * t))
-        aux_beta = beta_next + ((t - 1) / t_next) * beta_diff
-
-        # Convergence values
-        max_diff = np.abs(beta_diff).max()
-        max_coef = np.abs(beta_next).max()
-
-        # Values update
-        t = t_next
-        # beta = np.copy(beta_next)
-        beta = beta_next
-
-        # Stopping rule (exit even if beta_next contains only zeros)
-        if max_coef == 0.0 or (max_diff / max_coef) <= tol:
-            break
-
-    return beta, None, tol, n_iter + 1
+    if n_threads is not None and gram is None:
+        with ThreadedMatrix(X, n_threads) as threaded_X:
+            return fista_l1l2(beta, tau, mu, threaded_X, y, max_iter, tol,
+                              rng, random, positive, adaptive=adaptive,
+                              max_eigenvalue=max_eigenvalue, budget=budget,
+                              trace=trace)
+    beta, n_iter = l1l2_fista(X, y, mu, tau, beta, max_iter=max_iter,
+                              tol=tol, adaptive=adaptive, positive=positive,
+                              gram=gram, xty=Xy, max_eigenvalue=max_eigenvalue,
+                              budget=budget, trace=trace)
+    return beta, None, tol, n_iter
 
 
 def l1l2_regularization(
     X, y, max_iter=100000, l1_ratio=0.5, eps=1e-3, n_alphas=100, alphas=None,
     precompute='auto', Xy=None, copy_X=True, coef_init=None,
     verbose=False, return_n_iter=False, positive=False,
-        tol=1e-5, check_input=True, **params):
+        tol=1e-5, check_input=True, solver='fista', n_threads=None,
+        max_eigenvalue=None, budget=None, trace=None, **params):
+    if solver not in ('fista', 'shotgun'):
+        raise ValueError("solver should be either fista or shotgun.")
+
     if check_input:
         X = check_array(X, 'csc', dtype=[np.float64, np.float32],
                         order='F', copy=copy_X)
@@ -260,8 +202,6 @@ def l1l2_regularization(
         alphas = np.sort(alphas)[::-1]  # make sure alphas are properly ordered
 
     n_alphas = len(alphas)
-    tol = params.get('tol', 1e-4)
-    max_iter = params.get('max_iter', 1000)
     dual_gaps = np.empty(n_alphas)
     n_iters = []
 
@@ -282,6 +222,7 @@ def l1l2_regularization(
     else:
         coef_ = np.asfortranarray(coef_init, dtype=X.dtype)
 
+    shotgun_X = None  # blocks and threads shared by the alphas
     for i, alpha in enumerate(alphas):
         l1_reg = alpha * l1_ratio * 2  # * n_samples
         l2_reg = alpha * (1.0 - l1_ratio)  # * n_samples
@@ -301,18 +242,28 @@ def l1l2_regularization(
             if check_input:
                 precompute = check_array(precompute, dtype=np.float64,
                                          order='C')
-            # model = cd_fast.enet_coordinate_descent_gram(
-            #     coef_, l1_reg, l2_reg, precompute, Xy, y, max_iter,
-            #     tol, rng, random, positive)
-            raise NotImplementedError()
+            model = fista_l1l2(
+                coef_, l1_reg, l2_reg, X, y, max_iter, tol, rng, random,
+                positive, gram=precompute, Xy=Xy,
+                max_eigenvalue=max_eigenvalue, budget=budget, trace=trace)
 
         elif precompute is False:
             # model = cd_fast.enet_coordinate_descent(
             #     coef_, l1_reg, l2_reg, X, y, max_iter, tol, rng, random,
             #     positive)
-            model = fista_l1l2(
-                coef_, l1_reg, l2_reg, X, y, max_iter, tol, rng, random,
-                positive)
+            if solver == 'shotgun':
+                if shotgun_X is None:
+                    shotgun_X = ShotgunMatrix(X, n_threads)
+                coef_, n_iter_ = shotgun_l1l2(
+                    shotgun_X, y, l2_reg, l1_reg, coef_, max_iter, tol,
+                    n_threads=n_threads, positive=positive, budget=budget,
+                    trace=trace)
+                model = coef_, None, tol, n_iter_
+            else:
+                model = fista_l1l2(
+                    coef_, l1_reg, l2_reg, X, y, max_iter, tol, rng, random,
+                    positive, max_eigenvalue=max_eigenvalue,
+                    n_threads=n_threads, budget=budget, trace=trace)
         else:
             raise ValueError("Precompute should be one of True, False, "
                              "'auto' or array-like. Got %r" % precompute)
@@ -321,7 +272,11 @@ def l1l2_regularization(
         dual_gaps[i] = dual_gap_
         n_iters.append(n_iter_)
         #if dual_gap_ > eps_:  # TODO evaluate the dual gap
-        if n_iter_ >= max_iter:
+        if budget is not None and budget.expired():
+            import warnings
+            warnings.warn('Solver stopped before convergence (%s).'
+                          % budget.status, ConvergenceWarning)
+        elif n_iter_ >= max_iter:
             import warnings
             warnings.warn('Objective did not converge.' +
                           ' You might want' +
@@ -338,12 +293,79 @@ def l1l2_regularization(
             else:
                 import sys
                 sys.stderr.write('.')
+    if shotgun_X is not None:
+        shotgun_X.close()
 
     if return_n_iter:
         return alphas, coefs, dual_gaps, n_iters
     return alphas, coefs, dual_gaps
 
 
+class _SufficientStatistics(object):
+    """Second order statistics of the samples seen by ``partial_fit``.
+
+    If ``fit_intercept`` is `True` the statistics are centered on the
+    running means and the batches are merged with the pairwise update of
+    Chan, Golub and LeVeque. ``max_eigenvalue`` is an upper bound of the
+    maximum eigenvalue of ``gram``, updated with the Weyl inequality, so
+    that only the (small) matrices of each batch are decomposed.
+    """
+
+    def __init__(self, fit_intercept=True):
+        self.fit_intercept = fit_intercept
+        self.n_samples = 0
+        self.gram = self.xty = self.x_mean = self.y_mean = None
+        self.max_eigenvalue = 0.
+
+    def update(self, X, y):
+        """Add a batch of samples, ``y`` is (n_samples, n_targets)."""
+        n_batch = X.shape[0]
+        if self.fit_intercept:
+            x_mean, y_mean = X.mean(axis=0), y.mean(axis=0)
+            X, y = X - x_mean, y - y_mean
+        else:
+            x_mean, y_mean = np.zeros(X.shape[1]), np.zeros(y.shape[1])
+
+        gram = np.dot(X.T, X)
+        xty = np.dot(X.T, y)
+        max_eigenvalue = lipschitz(X)
+
+        if self.n_samples == 0:
+            self.gram, self.xty = gram, xty
+            self.x_mean, self.y_mean = x_mean, y_mean
+            self.max_eigenvalue = max_eigenvalue
+        else:
+            n_samples = self.n_samples + n_batch
+            if self.fit_intercept:
+                # correction for the shift of the means
+                weight = self.n_samples * n_batch / float(n_samples)
+                x_diff, y_diff = x_mean - self.x_mean, y_mean - self.y_mean
+                gram += weight * np.outer(x_diff, x_diff)
+                xty += weight * np.outer(x_diff, y_diff)
+                max_eigenvalue += weight * np.dot(x_diff, x_diff)
+                self.x_mean += x_diff * (n_batch / float(n_samples))
+                self.y_mean += y_diff * (n_batch / float(n_samples))
+
+            self.gram += gram
+            self.xty += xty
+            self.max_eigenvalue = min(self.max_eigenvalue + max_eigenvalue,
+                                      np.trace(self.gram))
+        self.n_samples += n_batch
+
+
+def _same_data(old_key, key, n_columns):
+    # True if the data of key begin with the n_columns of the data of
+    # old_key, with the same samples, labels and problem
+    if old_key is None or old_key[:5] != key[:5]:
+        return False
+    old_projections, old_labels = old_key[5:]
+    projections, labels = key[5:]
+    return (len(old_projections) == n_columns and
+            np.allclose(old_projections, projections[:n_columns],
+                        rtol=1e-10, atol=0) and
+            np.allclose(old_labels, labels, rtol=1e-10, atol=0))
+
+
 class L1L2(SelectorMixin, ElasticNet):
     r"""Linear regression with combined L1 and L2 priors as regularizer.
 
@@ -416,6 +438,13 @@ class L1L2(SelectorMixin, ElasticNet):
     warm_start : bool, optional
         When set to ``True``, reuse the solution of the previous call to fit as
         initialization, otherwise, just erase the previous solution.
+        If new features are appended to the data of the previous call, the
+        previous solution is extended with zero coefficients: the new
+        features are screened against the current residual and the model is
+        fitted again only if some of them enter the model. The samples
+        (in the same order), the target, the first features and the
+        penalties must be the ones of the previous call, otherwise the
+        model is fitted again.
 
     positive : bool, optional
         When set to ``True``, forces the coefficients to be positive.
@@ -431,6 +460,42 @@ class L1L2(SelectorMixin, ElasticNet):
         a random feature to update. Useful only when selection is set to
         'random'.
 
+    solver : 'fista' | 'shotgun' | 'auto', default 'fista'
+        Algorithm used to minimize the objective function. 'shotgun' is a
+        parallel block coordinate descent (see
+        :func:`l1l2py.shotgun.shotgun_l1l2`), convenient with many features
+        and sparse solutions. It is used only if ``precompute`` is False.
+        'auto' chooses among 'fista', 'shotgun' and 'fista' with
+        ``precompute=True`` at each call of fit (see
+        :func:`l1l2py.autotune.select_solver`); the choice is stored in
+        ``solver_``.
+
+    calibrate : bool, optional, default False
+        With 'auto', time the candidate solvers on the data the first time
+        a problem of this size is seen, and store the fastest one in the
+        cache of :mod:`l1l2py.autotune` for the following fits.
+
+    max_time : float, optional, default None
+        Maximum running time of fit, in seconds. If it is exceeded, the
+        best iterate found is kept and ``status_`` is 'timeout'.
+
+    cancel_token : CancellationToken, optional, default None
+        Token used to stop fit from another thread (see
+        :mod:`l1l2py.budget`). If it is cancelled, the best iterate found is
+        kept and ``status_`` is 'cancelled'.
+
+    n_threads : int, optional, default None
+        Number of threads used by the 'shotgun' solver. If None, the number
+        of CPUs is used. If given with the 'fista' solver, the products
+        with the data and the updates of the solution are split among
+        ``n_threads`` threads.
+
+    trace : bool | int | SolverTrace, optional, default False
+        If True (or the length of the buffer, or a SolverTrace), the
+        iterations of the solver are recorded in ``trace_`` (see
+        :mod:`l1l2py.trace`). Disabled by default, since the objective is
+        evaluated at each iteration.
+
     Attributes
     ----------
     coef_ : array, shape (n_features,) | (n_targets, n_features)
@@ -446,15 +511,28 @@ class L1L2(SelectorMixin, ElasticNet):
     n_iter_ : array-like, shape (n_targets,)
         number of iterations run by the coordinate descent solver to reach
         the specified tolerance.
-    """
 
-    path = staticmethod(l1l2_regularization)
+    solver_ : str | None
+        Solver used by the last call of fit ('gram' is FISTA with
+        ``precompute=True``), None if no solver was needed to extend the
+        previous solution to the appended features (see ``warm_start``).
+
+    status_ : str
+        'converged', 'max_iter', 'timeout' or 'cancelled' (see
+        ``max_time`` and ``cancel_token``).
+
+    trace_ : SolverTrace | None
+        Iterations and counters of the last call of fit or partial_fit
+        (None if ``trace`` is False).
+    """
 
     def __init__(self, tau=1.0, mu=.5, use_gpu=False, threshold=1e-16,
                  alpha=None, l1_ratio=None, fit_intercept=True,
                  normalize=False, precompute=False, max_iter=10000,
                  copy_X=True, tol=1e-4, warm_start=False, positive=False,
-                 random_state=None, selection='cyclic'):
+                 random_state=None, selection='cyclic', solver='fista',
+                 n_threads=None, max_time=None, cancel_token=None,
+                 trace=False, calibrate=False):
         self.mu = mu
         self.tau = tau
         self.use_gpu = use_gpu
@@ -474,6 +552,23 @@ class L1L2(SelectorMixin, ElasticNet):
         self.intercept_ = 0.0
         self.random_state = random_state
         self.selection = selection
+        self.solver = solver
+        self.n_threads = n_threads
+        self.max_time = max_time
+        self.cancel_token = cancel_token
+        self.trace = trace
+        self.calibrate = calibrate
+
+    @property
+    def path(self):
+        # ElasticNet.fit calls self.path with a fixed set of arguments
+        solver = getattr(self, 'solver_', None) or self.solver
+        return partial(l1l2_regularization,
+                       solver='fista' if solver == 'gram' else solver,
+                       n_threads=self.n_threads,
+                       max_eigenvalue=getattr(self, '_max_eigenvalue', None),
+                       budget=getattr(self, '_budget', None),
+                       trace=getattr(self, 'trace_', None))
 
     def fit(self, X, y, check_input=True):
         """Fit model with fista.
@@ -490,6 +585,189 @@ class L1L2(SelectorMixin, ElasticNet):
             Allow to bypass several input checking.
             Don't use this parameter unless you know what you do.
         """
+        self._set_penalties()
+        self._partial_stats = None  # partial_fit restarts from this model
+        self.trace_ = make_trace(self.trace)
+        if not self.warm_start:
+            self._max_eigenvalue = self._data_key = None
+        elif self._append_features(X, y):
+            return self
+
+        self.solver_ = self.solver
+        if self.solver == 'auto':
+            self.solver_ = select_solver(
+                X if sparse.issparse(X) else np.asarray(X), np.asarray(y),
+                self.mu, self.tau, candidates=('fista', 'gram', 'shotgun'),
+                calibrate=self.calibrate)
+        precompute = self.precompute
+        if self.solver_ == 'gram':
+            self.precompute = True
+        self._budget = make_budget(self.max_time, self.cancel_token)
+
+        # self.coef_ = self.path(
+        #     X, y, self.mu, self.tau, beta=None, kmax=self.max_iter,
+        #     tolerance=self.tol, return_iterations=False, adaptive=False)
+        # print "l1l2 fit tau", self.tau, "mu", self.mu, "alpha", self.alpha, "l1_ratio", self.l1_ratio
+        try:
+            super(L1L2, self).fit(X, y, check_input)
+        finally:
+            self.precompute = precompute
+        self._set_status(self._budget)
+
+        return self
+
+    def partial_fit(self, X, y, check_input=True):
+        """Update the model with a new batch of samples.
+
+        The model is fitted on all the samples seen so far by
+        ``partial_fit``, but only sufficient statistics of the data are
+        kept (:math:`X^T X`, :math:`X^T y`, the number of samples and the
+        means), so that the cost of each call does not depend on the number
+        of samples already seen. FISTA is warm started from the current
+        ``coef_``, with a step size given by an upper bound of the Lipschitz
+        constant updated incrementally.
+
+        Parameters
+        -----------
+        X : ndarray, (n_samples, n_features)
+            Batch of data
+
+        y : ndarray, shape (n_samples,) or (n_samples, n_targets)
+            Target
+
+        check_input : boolean, (default=True)
+            Allow to bypass several input checking.
+            Don't use this parameter unless you know what you do.
+        """
+        if self.normalize:
+            raise ValueError("partial_fit does not support normalize=True")
+        if check_input:
+            X, y = check_X_y(X, y, dtype=np.float64, multi_output=True,
+                             y_numeric=True)
+        self._set_penalties()
+
+        if getattr(self, '_partial_stats', None) is None:
+            self._partial_stats = _SufficientStatistics(self.fit_intercept)
+        stats = self._partial_stats
+        self._data_key = None  # coef_ is not a fit of the last X
+        y = y.reshape(X.shape[0], -1)
+        stats.update(X, y)
+
+        n_targets, n_features = y.shape[1], X.shape[1]
+        coef = np.zeros((n_targets, n_features))
+        if self.coef_ is not None and np.size(self.coef_) == coef.size:
+            coef[:] = np.reshape(self.coef_, coef.shape)  # warm start
+
+        prox = L1Prox(self.tau, positive=self.positive)
+        budget = make_budget(self.max_time, self.cancel_token)
+        self.trace_ = make_trace(self.trace)
+        n_iter = []
+        for k in range(n_targets):
+            loss = SquareLoss(None, None, self.mu, gram=stats.gram,
+                              xty=stats.xty[:, k], n_samples=stats.n_samples,
+                              max_eigenvalue=stats.max_eigenvalue)
+            coef[k], n_iter_ = fista(loss, prox, coef[k], self.max_iter,
+                                     self.tol, budget=budget,
+                                     trace=self.trace_)
+            n_iter.append(n_iter_)
+            if budget is not None and budget.expired():
+                import warnings
+                warnings.warn('Solver stopped before convergence (%s).'
+                              % budget.status, ConvergenceWarning)
+            elif n_iter_ >= self.max_iter:
+                import warnings
+                warnings.warn('Objective did not converge.' +
+                              ' You might want' +
+                              ' to increase the number of iterations.',
+                              ConvergenceWarning)
+
+        intercept = stats.y_mean - np.dot(coef, stats.x_mean)
+        if n_targets == 1:
+            self.coef_, self.intercept_, self.n_iter_ = \
+                coef[0], intercept[0], n_iter[0]
+        else:
+            self.coef_, self.intercept_, self.n_iter_ = coef, intercept, n_iter
+        self.n_samples_seen_ = stats.n_samples
+        self._set_status(budget)
+        return self
+
+    def _set_status(self, budget):
+        if budget is not None and budget.expired():
+            self.status_ = budget.status
+        elif np.max(self.n_iter_) >= self.max_iter:
+            self.status_ = 'max_iter'
+        else:
+            self.status_ = 'converged'
+
+    def _append_features(self, X, y):
+        """Extend the previous solution to the features appended to X.
+
+        Returns True if the extended solution is optimal, so that the model
+        does not need to be fitted again. The upper bound of the maximum
+        eigenvalue of the (centered) data is updated with Weyl's inequality
+        and it is passed to the solver.
+        """
+        if sparse.issparse(X) or self.normalize:
+            self._max_eigenvalue = self._data_key = None
+            return False
+        X, y = check_X_y(X, y, dtype=np.float64, multi_output=True,
+                         y_numeric=True)
+        n_samples, n_features = X.shape
+        if self.fit_intercept:
+            x_mean, y_mean = X.mean(axis=0), y.mean(axis=0)
+        else:
+            x_mean, y_mean = np.zeros(n_features), np.zeros(y.shape[1:])
+
+        coef = getattr(self, 'coef_', None)
+        coef = None if coef is None else np.atleast_2d(coef)
+        n_old = 0 if coef is None else coef.shape[1]
+        old_eigenvalue = getattr(self, '_max_eigenvalue', None)
+        old_key, key = getattr(self, '_data_key', None), self._key(X, y)
+        self._data_key = key
+        same_data = _same_data(old_key, key, n_old)
+        if not (0 < n_old < n_features and same_data):
+            # the data are not an extension of the previous ones: the bound
+            # is still valid only if they did not change at all
+            if n_old != n_features or not same_data:
+                self._max_eigenvalue = None
+            if coef is not None and n_old != n_features:
+                # the previous solution cannot warm start the iterations
+                self.coef_ = np.zeros(np.shape(self.coef_)[:-1] +
+                                      (n_features,))
+            return False
+
+        new_data = X[:, n_old:] - x_mean[n_old:]
+        if old_eigenvalue is None:
+            self._max_eigenvalue = lipschitz(X - x_mean)
+        else:
+            self._max_eigenvalue = old_eigenvalue + lipschitz(new_data)
+
+        # The new features are inactive if they satisfy the optimality
+        # conditions with the residual of the previous solution
+        residual = ((y - y_mean).reshape(n_samples, -1) -
+                    np.dot(X[:, :n_old], coef.T) +
+                    np.dot(x_mean[:n_old], coef.T))
+        corr = np.abs(np.dot(new_data.T, residual)) * (2. / n_samples)
+
+        coef = np.hstack((coef, np.zeros((coef.shape[0], n_features - n_old))))
+        self.coef_ = coef.reshape(np.shape(self.coef_)[:-1] + (n_features,))
+        if np.any(corr > self.tau):
+            return False
+
+        self.intercept_ = y_mean - np.dot(self.coef_, x_mean)
+        self.n_iter_ = 0 if coef.shape[0] == 1 else [0] * coef.shape[0]
+        self.status_, self.solver_ = 'converged', None
+        return True
+
+    def _key(self, X, y):
+        # Fingerprint of the data and of the problem of a fit: the sizes,
+        # the penalties and the projections of the columns of X and of y
+        # on a fixed random vector (they change with the order of the rows)
+        weights = np.random.RandomState(0).randn(X.shape[0])
+        return (X.shape[0], self.mu, self.tau, self.fit_intercept,
+                self.positive, np.dot(weights, X), np.dot(weights, y))
+
+    def _set_penalties(self):
         if self.l1_ratio is not None and self.alpha is not None:
             # tau and mu are selected as enet
             self.mu = self.alpha * (1 - self.l1_ratio)
@@ -501,14 +779,6 @@ class L1L2(SelectorMixin, ElasticNet):
                 self.l1_ratio = self.tau / (self.tau + self.mu * 2.)
             self.alpha = 0.5 * self.tau + self.mu
 
-        # self.coef_ = self.path(
-        #     X, y, self.mu, self.tau, beta=None, kmax=self.max_iter,
-        #     tolerance=self.tol, return_iterations=False, adaptive=False)
-        # print "l1l2 fit tau", self.tau, "mu", self.mu, "alpha", self.alpha, "l1_ratio", self.l1_ratio
-        super(L1L2, self).fit(X, y, check_input)
-
-        return self
-
     def _get_support_mask(self):
         check_is_fitted(self, "n_iter_")
         scores = _get_feature_importances(self)
@@ -544,6 +814,16 @@ class L1L2TwoStep(Pipeline):
     mu : float, optional, default 0.5
         Constant that multiplies the l2 norm.
 
+    lamdas : array-like of floats, optional
+        Candidate ridge regularization constants, used only with
+        ``lambda_selection``.
+
+    lambda_selection : None | 'loo' | 'gcv', optional, default None
+        If given, the ridge regularization constant is selected in
+        ``lamdas`` (instead of using ``lamda``) by the closed form
+        leave-one-out or generalized cross validation error of the ridge
+        regression on the selected variables.
+
     use_gpu : bool, optional, default False
         If True, use the implementation of FISTA using the GPU.
         Currently ignored.
@@ -628,13 +908,18 @@ class L1L2TwoStep(Pipeline):
     n_iter_ : array-like, shape (n_targets,)
         number of iterations run by the coordinate descent solver to reach
         the specified tolerance.
+
+    lamda_ : float
+        Ridge regularization constant used (``lamda``, or the value
+        selected in ``lamdas``).
     """
 
     def __init__(self, mu=.5, tau=1.0, lamda=1, use_gpu=False, threshold=1e-16,
                  alpha=None, l1_ratio=None, fit_intercept=True,
                  normalize=False, precompute=False, max_iter=10000,
                  copy_X=True, tol=1e-4, warm_start=False, positive=False,
-                 random_state=None, selection='cyclic'):
+                 random_state=None, selection='cyclic',
+                 lamdas=(0.1, 1.0, 10.0), lambda_selection=None):
         vs = L1L2(mu=mu, tau=tau, use_gpu=use_gpu, threshold=threshold,
                   alpha=alpha, l1_ratio=l1_ratio, fit_intercept=fit_intercept,
                   normalize=normalize, precompute=precompute,
@@ -650,6 +935,8 @@ class L1L2TwoStep(Pipeline):
         self.mu = mu
         self.tau = tau
         self.lamda = lamda
+        self.lamdas = lamdas
+        self.lambda_selection = lambda_selection
         self.alpha = alpha
         self.l1_ratio = l1_ratio
         self.use_gpu = use_gpu
@@ -695,7 +982,22 @@ class L1L2TwoStep(Pipeline):
         for mapped, param in six.iteritems(map_ridge):
             if fit_params.get(param, None) is not None:
                 fit_params_['__'.join(('ridge', mapped))] = fit_params[param]
-        super(L1L2TwoStep, self).fit(X, y, **fit_params_)
+        if self.lambda_selection is None:
+            super(L1L2TwoStep, self).fit(X, y, **fit_params_)
+            self.lamda_ = self.lamda
+        else:
+            # the l1l2 step first, then the ridge with lamda selected on
+            # the variables it selects
+            step_params = dict((name, {}) for name, _ in self.steps)
+            for key, value in six.iteritems(fit_params_):
+                name, param = key.split('__', 1)
+                step_params[name][param] = value
+            X_selected = self.steps[0][1].fit(
+                X, y, **step_params['l1l2']).transform(X)
+            self.lamda_ = self._select_lamda(
+                X_selected, y, fit_params.get('sample_weight'))
+            self.steps[1][1].set_params(alpha=self.lamda_)
+            self.steps[1][1].fit(X_selected, y, **step_params['ridge'])
 
         # self.coef_ contains a zero vector apart from coef_ selected by Ridge
         l1l2_coef_ = self.steps[0][1].coef_
@@ -707,6 +1009,27 @@ class L1L2TwoStep(Pipeline):
 
         return self
 
+    def _select_lamda(self, X, y, sample_weight=None):
+        """Value in lamdas minimizing the closed form ridge error."""
+        X, y, _, _, _, _, _ = _pre_fit(
+            np.asarray(X, dtype=np.float64), np.asarray(y, dtype=np.float64),
+            None, False, self.normalize, self.fit_intercept, copy=True)
+        n_samples = X.shape[0]
+        y = y.reshape(n_samples, -1)
+        if sample_weight is not None:
+            weights = np.sqrt(np.ones(n_samples) * sample_weight)
+            X = X * weights[:, np.newaxis]
+            y = y * weights[:, np.newaxis]
+
+        # Ridge does not divide the squared loss by n_samples
+        lamdas = np.asarray(self.lamdas, dtype=np.float64)
+        errors = sum(ridge_criterion(X, target, lamdas / n_samples,
+                                     self.lambda_selection,
+                                     fit_intercept=self.fit_intercept)
+                     for target in y.T)
+        minima = np.flatnonzero(errors == errors.min())
+        return lamdas[minima[np.argmax(lamdas[minima])]]
+
     # @property
     # def coef_(self):
     #     check_is_fitted(self.steps[1][1], "coef_")
@@ -757,6 +1080,12 @@ class L1L2StageOne(RegressorMixin, BaseEstimator):
     lamdas : array-like of floats, optional
         Ridge regression (step 2) regularization constants.
 
+    lambda_selection : None | 'loo' | 'gcv', optional, default None
+        If None, ``lamdas`` are a dimension of the cross validation grid.
+        Otherwise the grid is only on ``taus``, and each fit selects the
+        ridge constant in ``lamdas`` in closed form (see
+        :class:`L1L2TwoStep`).
+
     use_gpu : bool, optional, default False
         If True, use the implementation of FISTA using the GPU.
         Currently ignored.
@@ -834,6 +1163,12 @@ class L1L2StageOne(RegressorMixin, BaseEstimator):
     n_jobs : int, default=1
         Number of jobs to run in parallel.
 
+    backend : string, optional, default None
+        Name of the joblib backend running the jobs (e.g. ``'threading'``).
+        If None, the default one. With ``'threading'`` the cores are split
+        between the jobs and their BLAS threads (see
+        :func:`l1l2py.blas.thread_budget`).
+
     pre_dispatch : int, or string, optional
         Controls the number of jobs that get dispatched during parallel
         execution. Reducing this number can be useful to avoid an
@@ -874,6 +1209,15 @@ class L1L2StageOne(RegressorMixin, BaseEstimator):
         If ``'False'``, the ``cv_results_`` attribute will not include training
         scores.
 
+    dfmax : int, optional, default None
+        Maximum number of selected variables. Values in ``taus`` whose
+        solution on the whole training set selects more variables are
+        excluded from the search.
+
+    pmax : int, optional, default None
+        Maximum number of variables ever selected along the regularization
+        path on ``taus``. Values beyond the cap are excluded from the search.
+
 
     Attributes
     ----------
@@ -900,10 +1244,12 @@ class L1L2StageOne(RegressorMixin, BaseEstimator):
                  random_state=None, selection='cyclic',
                  cv=None, scoring=None, n_jobs=1, iid=True, refit=True,
                  verbose=0, pre_dispatch='2*n_jobs', error_score='raise',
-                 return_train_score=True):
+                 return_train_score=True, dfmax=None, pmax=None,
+                 lambda_selection=None, backend=None):
         self.mu = mu
         self.taus = taus
         self.lamdas = lamdas
+        self.lambda_selection = lambda_selection
         self.use_gpu = use_gpu
         self.threshold = threshold
         self.cv = cv
@@ -920,12 +1266,35 @@ class L1L2StageOne(RegressorMixin, BaseEstimator):
         self.random_state = random_state
         self.selection = selection
         self.n_jobs = n_jobs
+        self.backend = backend
         self.iid = iid
         self.refit = refit
         self.verbose = verbose
         self.pre_dispatch = pre_dispatch
         self.error_score = error_score
         self.return_train_score = return_train_score
+        self.dfmax = dfmax
+        self.pmax = pmax
+
+    def _truncate_taus(self, X, y):
+        """Discard the values of tau exceeding dfmax or pmax.
+
+        The regularization path is computed once on the whole training set,
+        so that the same values of tau are explored on each split.
+        """
+        X = check_array(X, dtype=np.float64, copy=True)
+        y = np.asarray(y, dtype=np.float64)
+        X, y, _, _, _, _, _ = _pre_fit(
+            X, y, None, False, self.normalize, self.fit_intercept, copy=False)
+
+        taus = np.sort(self.taus)
+        _, truncated = l1l2_path(
+            X, y, self.mu, taus, kmax=self.max_iter, tolerance=self.tol,
+            dfmax=self.dfmax, pmax=self.pmax, return_truncated=True)
+        if truncated == len(taus):
+            raise ValueError("the given range of 'tau' values produces all "
+                             "solutions exceeding 'dfmax' or 'pmax'")
+        return taus[truncated:]
 
     def fit(self, X, y, sample_weight=None, check_input=True):
         """Fit Ridge regression model after searching for the best mu and tau.
@@ -945,9 +1314,22 @@ class L1L2StageOne(RegressorMixin, BaseEstimator):
         -------
         self : Returns self.
         """
-        param_grid = {'tau': self.taus, 'lamda': self.lamdas}
+        taus = self.taus
+        if self.dfmax is not None or self.pmax is not None:
+            taus = self._truncate_taus(X, y)
+
+        if self.lambda_selection is None:
+            param_grid = {'tau': taus, 'lamda': self.lamdas}
+        else:
+            # lamda is selected in closed form by each fit
+            param_grid = {'tau': taus}
         fit_params = {'sample_weight': sample_weight,
                       'check_input': check_input}
+        n_jobs, n_threads = self.n_jobs, None
+        if self.backend == 'threading':
+            n_fits = (check_cv(self.cv).get_n_splits(X, y) *
+                      len(ParameterGrid(param_grid)))
+            n_jobs, n_threads = thread_budget(self.n_jobs, n_fits)
         gs = GridSearchCV(
             L1L2TwoStep(
                 mu=self.mu, fit_intercept=self.fit_intercept,
@@ -956,16 +1338,21 @@ class L1L2StageOne(RegressorMixin, BaseEstimator):
                 max_iter=self.max_iter,
                 copy_X=self.copy_X, tol=self.tol, warm_start=self.warm_start,
                 positive=self.positive,
-                random_state=self.random_state, selection=self.selection),
+                random_state=self.random_state, selection=self.selection,
+                lamdas=self.lamdas, lambda_selection=self.lambda_selection),
             param_grid=param_grid, fit_params=fit_params, cv=self.cv,
-            scoring=self.scoring, n_jobs=self.n_jobs, iid=self.iid,
+            scoring=self.scoring, n_jobs=n_jobs, iid=self.iid,
             refit=self.refit, verbose=self.verbose,
             pre_dispatch=self.pre_dispatch, error_score=self.error_score,
             return_train_score=self.return_train_score)
-        gs.fit(X, y)
+        if self.backend is None:
+            gs.fit(X, y)
+        else:
+            with parallel_backend(self.backend), blas_threads(n_threads):
+                gs.fit(X, y)
         estimator = gs.best_estimator_
         self.tau_ = estimator.tau
-        self.lamda_ = estimator.lamda
+        self.lamda_ = estimator.lamda_
 
         # self.coef_ contains a zero vector apart from coef_ selected by Ridge
         # l1l2_coef_ = estimator.steps[0][1].coef_
@@ -979,6 +1366,12 @@ class L1L2StageOne(RegressorMixin, BaseEstimator):
         return self
 
 
+def _fit_coef(estimator, X, y, sample_weight, check_input):
+    # Coefficients of a L1L2TwoStep fitted by a L1L2StageTwo job
+    return estimator.fit(X, y, sample_weight=sample_weight,
+                         check_input=check_input).coef_.copy()
+
+
 class L1L2StageTwo(RegressorMixin, BaseEstimator):
     """Stage I and II a la DeMol09b.
 
@@ -991,9 +1384,13 @@ class L1L2StageTwo(RegressorMixin, BaseEstimator):
         It may not be fitted.
     mus : array-like
         List of `mu` parameter for the Stage II.
+    n_jobs : int, default=1
+        Number of threads fitting the values in ``mus`` in parallel. The
+        cores are split between the threads and their BLAS threads (see
+        :func:`l1l2py.blas.thread_budget`).
     """
 
-    def __init__(self, estimator, mus=(0.5, 0.75, 1)):
+    def __init__(self, estimator, mus=(0.5, 0.75, 1), n_jobs=1):
         # super(L1L2TwoStepCV, self).__init__(
         #     alphas=lamdas,
         #     fit_intercept=fit_intercept, normalize=normalize, scoring=scoring,
@@ -1001,6 +1398,7 @@ class L1L2StageTwo(RegressorMixin, BaseEstimator):
         #     store_cv_values=store_cv_values)
         self.mus = mus
         self.estimator = estimator
+        self.n_jobs = n_jobs
 
     def fit(self, X, y, sample_weight=None, check_input=True):
         """Fit Ridge regression model after searching for the best mu and tau.
@@ -1032,7 +1430,7 @@ class L1L2StageTwo(RegressorMixin, BaseEstimator):
         lamda_ = self.estimator.lamda_
         params = self.estimator.get_params()
 
-        coef_ = []
+        estimators = []
         for mu in self.mus:
             estimator = L1L2TwoStep(
                 mu=mu, tau=tau_, lamda=lamda_, use_gpu=params['use_gpu'],
@@ -1045,11 +1443,13 @@ class L1L2StageTwo(RegressorMixin, BaseEstimator):
                 positive=params['positive'],
                 random_state=params['random_state'],
                 selection=params['selection'])
-            estimator_coef_ = estimator.fit(
-                X, y, sample_weight=sample_weight,
-                check_input=check_input).coef_
-            coef_.append(estimator_coef_.copy())
-
-        self.coef_ = coef_
+            estimators.append(estimator)
+
+        n_jobs, n_threads = thread_budget(self.n_jobs, len(estimators))
+        with blas_threads(n_threads if n_jobs > 1 else None):
+            self.coef_ = Parallel(n_jobs=n_jobs, backend='threading')(
+                delayed(_fit_coef)(estimator, X, y, sample_weight,
+                                   check_input)
+                for estimator in estimators)
 
         return self
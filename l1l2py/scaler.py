@@ -29,6 +29,8 @@ TODO: Add info.
 import numpy as np
 from collections import Sequence
 
+from l1l2py.fista import _gram
+
 
 class RangesScaler(object):
     """Given data and labels helps to scale L1L2 parameters ranges properly.
@@ -40,9 +42,13 @@ class RangesScaler(object):
     Scaling ranges permits to use relative (and not absolute) ranges of
     parameters.
 
+    The data matrix can be a :class:`l1l2py.operators.DataOperator`, as
+    the one returned by :func:`l1l2py.operators.lazy_standardize` (which
+    can also be used as ``data_normalizer``).
+
     Attributes
     ----------
-    norm_data : :class:`numpy.ndarray`
+    norm_data : :class:`numpy.ndarray` or DataOperator
         Normalized data matrix.
     norm_labels : :class:`numpy.ndarray`
         Normalized labels vector.
@@ -160,18 +166,17 @@ class RangesScaler(object):
         """
         data = self.norm_data
         labels = self.norm_labels
-        corr = np.abs(np.dot(data.T, labels))
+        corr = np.abs(data.T.dot(labels))
         tau_max = (corr.max() * (2.0 / data.shape[0]))
         return tau_max
 
     def _mu_scaling_factor(self):
         n, d = self.norm_data.shape
 
+        tmp = _gram(self.norm_data)
         if d > n:
-            tmp = np.dot(self.norm_data, self.norm_data.T)
             num = np.linalg.eigvalsh(tmp).max()
         else:
-            tmp = np.dot(self.norm_data.T, self.norm_data)
             evals = np.linalg.eigvalsh(tmp)
             num = evals.max() + evals.min()
 
@@ -0,0 +1,325 @@
+"""Parallel (shotgun) coordinate descent for the l1l2 functional.
+
+The coordinates are split in blocks which are updated concurrently by a
+pool of threads, as proposed in [Bradley11]_. Each update is a proximal
+coordinate (block) step computed on the shared residual; the residual is
+then updated with the contributions of all the blocks.
+
+The concurrent blocks of a round are split in one contiguous range of
+columns for each thread, updated with a few vectorized operations (each
+block keeps its own step size). The heavy computations (products with
+the columns of the data matrix) are BLAS calls which release the GIL, so
+that the threads actually run in parallel, and the Python overhead is
+paid once per thread and round instead of once per block.
+
+The values which depend only on the data (the contiguous copy of the
+data, the Lipschitz constants of the blocks and the pool of threads) are
+kept by :class:`ShotgunMatrix`, so that they are shared by the problems
+of a whole regularization path.
+
+.. [Bradley11] J. K. Bradley, A. Kyrola, D. Bickson, C. Guestrin
+               "Parallel Coordinate Descent for L1-Regularized Loss
+               Minimization", ICML 2011.
+"""
+
+# This code is written by
+#       Federico Tomasi <federico.tomasi@dibris.unige.it>
+# Copyright (C) 2017 SlipGURU -
+# Statistical Learning and Image Processing Genoa University Research Group
+# Via Dodecaneso, 35 - 16146 Genova, ITALY.
+#
+# This file is part of L1L2Py.
+#
+# L1L2Py is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# L1L2Py is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
+
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+from six.moves import xrange
+
+from l1l2py.fista import lipschitz
+from l1l2py.operators import DataOperator
+from l1l2py.trace import _entries
+
+__all__ = ('ShotgunMatrix', 'shotgun_l1l2')
+
+
+class ShotgunMatrix(DataOperator):
+    """Data matrix split in blocks of columns, with a pool of threads.
+
+    Keeps the values of :func:`shotgun_l1l2` which do not depend on the
+    penalties: a Fortran ordered copy of the data (contiguous blocks of
+    columns), the largest eigenvalue of the Gram matrix of each block and
+    a persistent pool of ``n_threads`` threads. Passing the same operator
+    to several calls (e.g. for each value of ``tau`` along a path) computes
+    them only once.
+
+    The pool is created when first needed; use :meth:`close` (or a
+    ``with`` statement) to release the threads.
+
+    Parameters
+    ----------
+    data : (N, P) ndarray or DataOperator
+        Data matrix. Blocks of columns of a
+        :class:`l1l2py.operators.DataOperator` are materialized when they
+        are needed.
+    n_threads : int, optional (default is `None`)
+        Number of threads. If `None`, the number of CPUs is used.
+    block_size : int, optional (default is `256`)
+        Number of coordinates in each block.
+    """
+
+    def __init__(self, data, n_threads=None, block_size=256):
+        if not isinstance(data, DataOperator):
+            data = np.asfortranarray(data, dtype=float)
+        self.data = data
+        self.shape = data.shape
+        self.n_threads = (multiprocessing.cpu_count() if n_threads is None
+                          else n_threads)
+        self.blocks = [slice(start, min(start + block_size, self.shape[1]))
+                       for start in xrange(0, self.shape[1], block_size)]
+        self._eigenvalues = None
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Terminate the threads of the pool."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def map(self, function, blocks):
+        """Apply ``function`` to each block, returning results in order."""
+        if len(blocks) == 1 or self.n_threads == 1:
+            return [function(block) for block in blocks]
+        if self._pool is None:
+            self._pool = ThreadPool(self.n_threads)
+        return self._pool.map(function, blocks)
+
+    def steps(self, mu):
+        """Step sizes of the coordinates for the `l2-norm` penalty ``mu``.
+
+        All the coordinates of a block share the step size given by the
+        Lipschitz constant of the block (0 if it is null).
+        """
+        if self._eigenvalues is None:
+            self._eigenvalues = self.map(
+                lambda block: lipschitz(self.data[:, block]), self.blocks)
+        n = self.shape[0]
+        L = 2. * (np.asarray(self._eigenvalues) / n + mu)
+        steps = np.zeros_like(L)
+        np.divide(1., L, out=steps, where=L >= np.finfo(float).eps)
+        return np.repeat(steps, [b.stop - b.start for b in self.blocks])
+
+    def dot(self, beta):
+        return self.data.dot(beta)
+
+    def rdot(self, residual):
+        if isinstance(self.data, DataOperator):
+            return self.data.rdot(residual)
+        return np.dot(self.data.T, residual)
+
+    def gram(self):
+        if isinstance(self.data, DataOperator):
+            return self.data.gram()
+        n, p = self.shape
+        return (np.dot(self.data, self.data.T) if p > n
+                else np.dot(self.data.T, self.data))
+
+    def _submatrix(self, rows, columns):
+        return self.data[rows][:, columns]
+
+
+def shotgun_l1l2(data, labels, mu, tau, beta=None, max_iter=100000,
+                 tol=1e-5, n_threads=None, block_size=256, positive=False,
+                 budget=None, trace=None):
+    r"""Shotgun (parallel) coordinate descent for the `l1l2` functional.
+
+    .. math::
+        \frac{1}{n} \| \mathbf{Y} - \mathbf{X}\boldsymbol{\beta} \|_2^2
+        + \mu \|\boldsymbol{\beta}\|_2^2
+        + \tau \|\boldsymbol{\beta}\|_1
+
+    At each round some blocks of ``block_size`` coordinates (``n_threads``
+    in the first round) are updated concurrently starting from the same
+    residual, each thread updating a contiguous range of them.
+
+    If the concurrent updates of a round increase the functional (that
+    may happen with highly correlated blocks), the round is performed
+    again sequentially and the number of concurrent blocks is halved for
+    the following rounds. This guarantees a monotone decrease of the
+    functional. After an epoch without interferences the number of
+    concurrent blocks is doubled, up to all the blocks: with weakly
+    correlated blocks each thread updates many blocks at once. With
+    ``n_threads=1`` the blocks are always updated sequentially.
+
+    Parameters
+    ----------
+    data : (N, P) ndarray, DataOperator or ShotgunMatrix
+        Data matrix. Blocks of columns of a
+        :class:`l1l2py.operators.DataOperator` are materialized when they
+        are updated. If it is a :class:`ShotgunMatrix`, its blocks,
+        Lipschitz constants and threads are used and ``n_threads`` and
+        ``block_size`` are ignored.
+    labels : (N,) or (N, 1) ndarray
+        Labels vector.
+    mu : float
+        `l2-norm` penalty.
+    tau : float
+        `l1-norm` penalty.
+    beta : (P,) or (P, 1) ndarray, optional (default is `None`)
+        Starting value for the iterations.
+        If `None`, then iterations starts from the empty model.
+    max_iter : int, optional (default is `1e5`)
+        Maximum number of epochs (full passes over the coordinates).
+    tol : float, optional (default is `1e-5`)
+        Convergence tolerance on the relative maximum variation of the
+        solution in an epoch.
+    n_threads : int, optional (default is `None`)
+        Number of threads. If `None`, the number of CPUs is used.
+    block_size : int, optional (default is `256`)
+        Number of coordinates in each block. With ``block_size=1`` the
+        algorithm is the original shotgun coordinate descent.
+    positive : bool, optional (default is `False`)
+        If `True`, forces the coefficients to be positive.
+    budget : Budget, optional (default is `None`)
+        Running time and cancellation state (see :mod:`l1l2py.budget`),
+        checked after each epoch.
+    trace : SolverTrace, optional (default is `None`)
+        If given, the epochs are recorded (see :mod:`l1l2py.trace`). The
+        step size is not recorded, since each block has its own one.
+
+    Returns
+    -------
+    beta : (P,) ndarray
+        `l1l2` solution.
+    n_iter : int
+        Number of epochs performed.
+    """
+    if not isinstance(data, ShotgunMatrix):
+        with ShotgunMatrix(data, n_threads, block_size) as shared:
+            return shotgun_l1l2(shared, labels, mu, tau, beta=beta,
+                                max_iter=max_iter, tol=tol,
+                                positive=positive, budget=budget, trace=trace)
+    shared, blocks = data, data.blocks
+    data = shared.data
+    labels = np.asarray(labels, dtype=float).ravel()
+    n, d = data.shape
+
+    if beta is None:
+        beta = np.zeros(d)
+    else:
+        beta = np.array(beta, dtype=float).ravel()
+
+    residual = labels - data.dot(beta)
+    res_norm = np.dot(residual, residual)
+
+    def update(columns):
+        # Proximal step on a range of columns, each block with its own
+        # step size (it does not modify shared values)
+        data_columns, step = data[:, columns], steps[columns]
+        old = beta[columns]
+        value = old + step * ((2. / n) * np.dot(data_columns.T, residual) -
+                              (2. * mu) * old)
+        new = np.maximum(np.abs(value) - tau * step, 0.)
+        new = np.copysign(new, value)
+        if positive:
+            new = np.maximum(new, 0.)
+        new[step == 0.0] = 0.  # only the l1 term depends on the block
+        delta = new - old
+
+        nz = np.flatnonzero(delta)
+        if nz.size:
+            contribution = np.dot(data_columns[:, nz], delta[nz])
+        else:
+            contribution = None
+
+        penalty = (mu * (np.dot(new, new) - np.dot(old, old)) +
+                   tau * (np.abs(new).sum() - np.abs(old).sum()))
+        return new, delta, contribution, penalty
+
+    steps = shared.steps(mu)
+    n_parallel = shared.n_threads
+    max_parallel = len(blocks) if shared.n_threads > 1 else 1
+    n_iter = 0
+    if trace is not None:
+        trace.start()
+        # correlations of all the blocks and updates of the residual
+        cost = 2, 4 * _entries(data), 6 * len(blocks)
+    for n_iter in xrange(1, max_iter + 1):
+        max_diff = 0.
+        interfered = False
+        start = 0
+        while start < len(blocks):
+            round_blocks = range(start, min(start + n_parallel, len(blocks)))
+            start += len(round_blocks)
+
+            if len(round_blocks) > 1:
+                # one contiguous range of blocks for each thread
+                ranges = [slice(blocks[r[0]].start, blocks[r[-1]].stop)
+                          for r in np.array_split(
+                              round_blocks,
+                              min(shared.n_threads, len(round_blocks)))]
+                updates = shared.map(update, ranges)
+                new_residual = residual.copy()
+                for _, _, contribution, _ in updates:
+                    if contribution is not None:
+                        new_residual -= contribution
+                new_res_norm = np.dot(new_residual, new_residual)
+                change = ((new_res_norm - res_norm) / n +
+                          sum(u[3] for u in updates))
+
+                if change <= 0.:
+                    for columns, (new, delta, _, _) in zip(ranges, updates):
+                        beta[columns] = new
+                        max_diff = max(max_diff, np.abs(delta).max())
+                    residual, res_norm = new_residual, new_res_norm
+                    continue
+
+                # Safeguard: concurrent updates interfered
+                n_parallel = max(1, n_parallel // 2)
+                interfered = True
+
+            for b in round_blocks:
+                new, delta, contribution, _ = update(blocks[b])
+                beta[blocks[b]] = new
+                max_diff = max(max_diff, np.abs(delta).max())
+                if contribution is not None:
+                    residual -= contribution
+            res_norm = np.dot(residual, residual)
+
+        if not interfered:
+            n_parallel = min(max_parallel, 2 * n_parallel)
+
+        if trace is not None:
+            trace.count(*cost)
+            trace.record(n_iter, (res_norm / n + mu * np.dot(beta, beta) +
+                                  tau * np.abs(beta).sum()),
+                         np.nan, np.count_nonzero(beta))
+
+        # Stopping rule (exit even if beta contains only zeros)
+        max_coef = np.abs(beta).max()
+        if max_coef == 0.0 or (max_diff / max_coef) <= tol:
+            break
+        if budget is not None and budget.expired():
+            break
+
+    return beta, n_iter
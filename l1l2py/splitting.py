@@ -0,0 +1,456 @@
+r"""ADMM with the data split among processes.
+
+In consensus ADMM (:func:`consensus_admm`) the rows of the data matrix are
+split in blocks, each one owned by a worker process. Each worker keeps the
+Cholesky factorization of its block and its local (scaled) dual variable,
+and it exchanges with the main process only `P`-vectors: the main process
+averages them and applies the proximity operator of the penalty.
+
+.. math::
+    \mathbf{x}_i = \arg\min_{\mathbf{x}}
+        \frac{1}{n} \| \mathbf{Y}_i - \mathbf{X}_i\mathbf{x} \|_2^2
+        + \frac{\rho}{2} \| \mathbf{x} - \mathbf{z} + \mathbf{u}_i \|_2^2
+
+    \mathbf{z} = \arg\min_{\mathbf{z}}
+        \mu \|\mathbf{z}\|_2^2 + \tau \|\mathbf{z}\|_1
+        + \frac{N\rho}{2} \| \mathbf{z} - \bar{\mathbf{x}}
+        - \bar{\mathbf{u}} \|_2^2
+
+In sharing ADMM (:func:`sharing_admm`) the columns are split instead, as
+it is convenient when `P` is much larger than `N`. Each worker owns a block
+of the coefficients and solves (with FISTA, warm-started) the `l1l2`
+problem of its block, while the main process keeps the average of the
+predictions :math:`\overline{\mathbf{X}\boldsymbol{\beta}}` and the
+scaled dual variable: only `N`-vectors are exchanged.
+
+.. math::
+    \boldsymbol{\beta}_i = \arg\min_{\boldsymbol{\beta}}
+        \mu \|\boldsymbol{\beta}\|_2^2 + \tau \|\boldsymbol{\beta}\|_1
+        + \frac{\rho}{2} \| \mathbf{X}_i\boldsymbol{\beta}
+        - \mathbf{X}_i\boldsymbol{\beta}_i - \bar{\mathbf{z}}
+        + \overline{\mathbf{X}\boldsymbol{\beta}} + \mathbf{u} \|_2^2
+
+    \bar{\mathbf{z}} = \arg\min_{\bar{\mathbf{z}}}
+        \frac{1}{n} \| \mathbf{Y} - N\bar{\mathbf{z}} \|_2^2
+        + \frac{N\rho}{2} \| \bar{\mathbf{z}} - \mathbf{u}
+        - \overline{\mathbf{X}\boldsymbol{\beta}} \|_2^2
+
+The data are shared with the workers through a memory map
+(``numpy.memmap``), so that the blocks are not copied in each process: if
+the data matrix is already a memory map it is used as it is, otherwise it
+is written once in a temporary file.
+"""
+
+# This code is written by
+#       Federico Tomasi <federico.tomasi@dibris.unige.it>
+# Copyright (C) 2017 SlipGURU -
+# Statistical Learning and Image Processing Genoa University Research Group
+# Via Dodecaneso, 35 - 16146 Genova, ITALY.
+#
+# This file is part of L1L2Py.
+#
+# L1L2Py is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# L1L2Py is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
+
+import mmap
+import multiprocessing
+import os
+import shutil
+import tempfile
+import warnings
+
+import numpy as np
+from six.moves import xrange
+from sklearn.exceptions import ConvergenceWarning
+
+from l1l2py.admm import CholeskyUpdate, shrinkage
+from l1l2py.budget import make_budget
+from l1l2py.fista import l1l2_fista, lipschitz
+
+__all__ = ('consensus_admm', 'sharing_admm')
+
+
+def _share(X):
+    # Memory map of X: (filename, dtype, shape, offset), temporary directory
+    if (isinstance(X, np.memmap) and isinstance(X.base, mmap.mmap) and
+            X.flags.c_contiguous):
+        return (X.filename, X.dtype.str, X.shape, X.offset), None
+
+    directory = tempfile.mkdtemp(prefix='l1l2py-')
+    shared = np.lib.format.open_memmap(
+        os.path.join(directory, 'data.npy'), mode='w+',
+        dtype=np.result_type(X, np.float32), shape=X.shape)
+    shared[:] = X
+    shared.flush()
+    spec = (shared.filename, shared.dtype.str, shared.shape, shared.offset)
+    del shared
+    return spec, directory
+
+
+def _open(spec):
+    filename, dtype, shape, offset = spec
+    return np.memmap(filename, dtype=dtype, mode='r', offset=offset,
+                     shape=shape)
+
+
+def _spawn(target, arguments):
+    # One daemon process for each tuple of arguments, with its connection
+    workers, connections = [], []
+    for args in arguments:
+        conn, worker_conn = multiprocessing.Pipe()
+        worker = multiprocessing.Process(target=target,
+                                         args=args + (worker_conn,))
+        worker.daemon = True
+        worker.start()
+        workers.append(worker)
+        connections.append(conn)
+    return workers, connections
+
+
+def _shutdown(workers, connections, directory):
+    for conn in connections:
+        try:
+            conn.send(None)
+        except (IOError, OSError):
+            pass
+    for worker in workers:
+        worker.join(1.)
+        if worker.is_alive():
+            worker.terminate()
+    if directory is not None:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _blocks(size, n_workers):
+    # Bounds of (at most) n_workers contiguous blocks
+    if n_workers is None:
+        n_workers = multiprocessing.cpu_count()
+    return np.linspace(0, size, min(n_workers, size) + 1).astype(int)
+
+
+def _consensus_worker(spec, start, stop, y, rho, alpha, traced, conn):
+    # Owner of the rows [start, stop) of the data
+    data = _open(spec)
+    n = data.shape[0]
+    X = np.asarray(data[start:stop], dtype=float)
+    del data
+
+    # ((2/n) X_i^T X_i + rho I) x = q, solved as CholeskyUpdate on X_i
+    scale = n / float(stop - start)
+    x_update = CholeskyUpdate(X, rho * scale)
+    XTy = (2. / n) * X.T.dot(y)
+    conn.send((x_update.factor_cost, x_update.cost))
+
+    x = x_hat = None
+    u = np.zeros(X.shape[1])
+    while True:
+        z = conn.recv()
+        if z is None:
+            break
+
+        # residuals of the current iterate, then u, x and x_hat updates
+        if x is None:
+            primal, x_norm = np.inf, 0.
+        else:
+            u += x_hat - z
+            primal, x_norm = np.sum((x - z) ** 2), np.dot(x, x)
+        loss = None
+        if traced:
+            residual = y - X.dot(z)
+            loss = np.dot(residual, residual) / n
+
+        x = x_update(scale * (XTy + rho * (z - u)))
+        x_hat = alpha * x + (1 - alpha) * z
+        conn.send((x_hat + u, primal, x_norm, np.dot(u, u), loss))
+    conn.close()
+
+
+def consensus_admm(X, y, z=None, rho=1.0, alpha=1.0, max_iter=1000,
+                   abs_tol=1e-6, rel_tol=1e-4, tau=0.5, mu=0.5,
+                   max_time=None, cancel_token=None, trace=None,
+                   n_workers=None):
+    r"""Consensus ADMM for the `l1l2` functional, with the rows of the
+    data split among ``n_workers`` processes.
+
+    It has the same parameters and output of :func:`l1l2py.admm.enet_admm`.
+
+    Parameters
+    ----------
+    X : (N, P) ndarray or numpy.memmap
+        Data matrix. A C-contiguous memory map is shared with the workers
+        without copies.
+    y : (N,) ndarray
+        Labels vector.
+    z : (P,) ndarray, optional (default is `None`)
+        Starting value of the iterations.
+    rho : float, optional (default is `1.0`)
+        ADMM penalty parameter.
+    alpha : float, optional (default is `1.0`)
+        Over-relaxation parameter.
+    max_iter : int, optional (default is `1000`)
+        Maximum number of iterations.
+    abs_tol, rel_tol : float, optional (default are `1e-6` and `1e-4`)
+        Absolute and relative convergence tolerances.
+    tau : float, optional (default is `0.5`)
+        `l1-norm` penalty.
+    mu : float, optional (default is `0.5`)
+        `l2-norm` penalty.
+    max_time : float, optional (default is `None`)
+        Maximum running time in seconds.
+    cancel_token : CancellationToken, optional (default is `None`)
+        Token used to stop the computation (see :mod:`l1l2py.budget`).
+    trace : SolverTrace, optional (default is `None`)
+        Trace of the iterations (see :mod:`l1l2py.trace`).
+    n_workers : int, optional (default is `None`)
+        Number of worker processes (and of row blocks). If `None`, the
+        number of CPUs is used.
+
+    Returns
+    -------
+    z : (P,) ndarray
+        Solution.
+    s_norm : float
+        Dual residual.
+    eps_dual : float
+        Tolerance on the dual residual.
+    n_iter : int
+        Number of iterations performed.
+    """
+    n, d = X.shape
+    y = np.asarray(y, dtype=float).ravel()
+    budget = make_budget(max_time, cancel_token)
+    bounds = _blocks(n, n_workers)
+    n_blocks = len(bounds) - 1
+
+    spec, directory = _share(X)
+    workers, connections = [], []
+    try:
+        workers, connections = _spawn(_consensus_worker, [
+            (spec, start, stop, y[start:stop], rho, alpha, trace is not None)
+            for start, stop in zip(bounds[:-1], bounds[1:])])
+        costs = [conn.recv() for conn in connections]  # factorizations
+
+        if trace is not None:
+            trace.start()
+            for factor_cost, _ in costs:
+                trace.count(*factor_cost)
+            cost = tuple(sum(c[1][j] for c in costs) for j in range(3))
+
+        z = np.zeros(d) if z is None else np.array(z, dtype=float).ravel()
+        zold = z
+        threshold = tau / (n_blocks * rho)
+        shrink = 1. + 2. * mu / (n_blocks * rho)
+        s_norm = eps_dual = np.inf
+        k = 0
+        for k in xrange(max_iter + 1):
+            for conn in connections:
+                conn.send(z)
+            replies = [conn.recv() for conn in connections]
+
+            if k > 0:
+                if trace is not None:
+                    trace.count(*cost)
+                    trace.record(k, (sum(r[4] for r in replies) +
+                                     mu * np.dot(z, z) +
+                                     tau * np.abs(z).sum()),
+                                 rho, np.count_nonzero(z))
+
+                # Stopping (residuals of the iterate k)
+                r_norm = np.sqrt(sum(r[1] for r in replies))
+                s_norm = rho * np.sqrt(n_blocks) * np.linalg.norm(z - zold)
+                eps_pri = (np.sqrt(n_blocks * d) * abs_tol + rel_tol * max(
+                    np.sqrt(sum(r[2] for r in replies)),
+                    np.sqrt(n_blocks) * np.linalg.norm(z)))
+                eps_dual = (np.sqrt(n_blocks * d) * abs_tol + rel_tol * rho *
+                            np.sqrt(sum(r[3] for r in replies)))
+
+                if (r_norm < eps_pri) and (s_norm < eps_dual):
+                    break
+                if k == max_iter:
+                    break
+                if budget is not None and budget.expired(k):
+                    warnings.warn('ADMM stopped before convergence (%s).'
+                                  % budget.status, ConvergenceWarning)
+                    break
+
+            # z-update: prox of the penalty at the average
+            zold = z
+            z = shrinkage(np.mean([r[0] for r in replies], axis=0),
+                          threshold) / shrink
+    finally:
+        _shutdown(workers, connections, directory)
+
+    return z, s_norm, eps_dual, k
+
+
+def _sharing_worker(spec, start, stop, beta, rho, mu, tau, tol, conn):
+    # Owner of the columns [start, stop) of the data (and of the
+    # corresponding coefficients)
+    data = _open(spec)
+    n = data.shape[0]
+    X = np.array(data[:, start:stop], dtype=float, order='F')
+    del data
+
+    # rho/2 ||X_i b - c||^2 + mu ||b||^2 + tau ||b||_1, scaled by 2/(rho n)
+    # as the l1l2 functional, with the Lipschitz constant computed once
+    mu_i, tau_i = 2. * mu / (rho * n), 2. * tau / (rho * n)
+    max_eigenvalue = lipschitz(X)
+    prediction = X.dot(beta)
+    conn.send(prediction)
+
+    matvecs = 0
+    while True:
+        shift = conn.recv()
+        if shift is None:
+            break
+        beta, n_iter = l1l2_fista(X, prediction + shift, mu_i, tau_i,
+                                  beta=beta, tol=tol,
+                                  max_eigenvalue=max_eigenvalue)
+        prediction = X.dot(beta)
+        matvecs += 2 * n_iter + 1
+        conn.send((prediction, mu * np.dot(beta, beta) +
+                   tau * np.abs(beta).sum(), np.count_nonzero(beta),
+                   matvecs))
+    conn.send(beta)
+    conn.close()
+
+
+def sharing_admm(X, y, z=None, rho=1.0, alpha=1.0, max_iter=1000,
+                 abs_tol=1e-6, rel_tol=1e-4, tau=0.5, mu=0.5, max_time=None,
+                 cancel_token=None, trace=None, n_workers=None,
+                 inner_tol=1e-6):
+    r"""Sharing ADMM for the `l1l2` functional, with the columns of the
+    data split among ``n_workers`` processes.
+
+    The local subproblems are solved by FISTA (warm-started at the previous
+    iterate), so the iterations are inexact up to ``inner_tol``. It has the
+    same output of :func:`l1l2py.admm.enet_admm`.
+
+    Parameters
+    ----------
+    X : (N, P) ndarray or numpy.memmap
+        Data matrix. A C-contiguous memory map is shared with the workers
+        without copies.
+    y : (N,) ndarray
+        Labels vector.
+    z : (P,) ndarray, optional (default is `None`)
+        Starting value of the iterations.
+    rho : float, optional (default is `1.0`)
+        ADMM penalty parameter.
+    alpha : float, optional (default is `1.0`)
+        Over-relaxation parameter.
+    max_iter : int, optional (default is `1000`)
+        Maximum number of iterations.
+    abs_tol, rel_tol : float, optional (default are `1e-6` and `1e-4`)
+        Absolute and relative convergence tolerances.
+    tau : float, optional (default is `0.5`)
+        `l1-norm` penalty.
+    mu : float, optional (default is `0.5`)
+        `l2-norm` penalty.
+    max_time : float, optional (default is `None`)
+        Maximum running time in seconds.
+    cancel_token : CancellationToken, optional (default is `None`)
+        Token used to stop the computation (see :mod:`l1l2py.budget`).
+    trace : SolverTrace, optional (default is `None`)
+        Trace of the iterations (see :mod:`l1l2py.trace`).
+    n_workers : int, optional (default is `None`)
+        Number of worker processes (and of column blocks). If `None`, the
+        number of CPUs is used.
+    inner_tol : float, optional (default is `1e-6`)
+        Convergence tolerance of FISTA on the local subproblems.
+
+    Returns
+    -------
+    z : (P,) ndarray
+        Solution.
+    s_norm : float
+        Dual residual.
+    eps_dual : float
+        Tolerance on the dual residual.
+    n_iter : int
+        Number of iterations performed.
+    """
+    n, d = X.shape
+    y = np.asarray(y, dtype=float).ravel()
+    budget = make_budget(max_time, cancel_token)
+    bounds = _blocks(d, n_workers)
+    n_blocks = len(bounds) - 1
+    z = np.zeros(d) if z is None else np.array(z, dtype=float).ravel()
+
+    spec, directory = _share(X)
+    workers, connections = [], []
+    try:
+        workers, connections = _spawn(_sharing_worker, [
+            (spec, start, stop, z[start:stop], rho, mu, tau, inner_tol)
+            for start, stop in zip(bounds[:-1], bounds[1:])])
+        mean = np.mean([conn.recv() for conn in connections], axis=0)
+
+        if trace is not None:
+            trace.start()
+            # Lipschitz constants and starting predictions
+            trace.count(n_blocks, 2 * n * d, 2 * n_blocks)
+            matvecs = 0
+
+        # z-update: (1/n) ||y - N z||^2 + N rho / 2 ||z - v||^2
+        y_scaled = (2. / n) * y
+        denominator = 2. * n_blocks / n + rho
+        z_mean = mean.copy()
+        u = np.zeros(n)
+        s_norm = eps_dual = np.inf
+        k = 0
+        for k in xrange(1, max_iter + 1):
+            shift = z_mean - mean - u
+            for conn in connections:
+                conn.send(shift)
+            replies = [conn.recv() for conn in connections]
+            mean = np.mean([r[0] for r in replies], axis=0)
+
+            z_old = z_mean
+            mean_hat = alpha * mean + (1 - alpha) * z_old
+            z_mean = (y_scaled + rho * (u + mean_hat)) / denominator
+            u += mean_hat - z_mean
+
+            if trace is not None:
+                total = sum(r[3] for r in replies)
+                trace.count(total - matvecs, 2 * n * d * (total - matvecs) //
+                            n_blocks, 3 * n_blocks)
+                matvecs = total
+                residual = y - n_blocks * mean
+                trace.record(k, (np.dot(residual, residual) / n +
+                                 sum(r[1] for r in replies)),
+                             rho, sum(r[2] for r in replies))
+
+            # Stopping (residuals in the space of the predictions)
+            r_norm = np.sqrt(n_blocks) * np.linalg.norm(mean - z_mean)
+            s_norm = rho * np.sqrt(n_blocks) * np.linalg.norm(z_mean - z_old)
+            eps_pri = (np.sqrt(n_blocks * n) * abs_tol + rel_tol *
+                       np.sqrt(n_blocks) * max(np.linalg.norm(mean),
+                                               np.linalg.norm(z_mean)))
+            eps_dual = (np.sqrt(n_blocks * n) * abs_tol + rel_tol * rho *
+                        np.sqrt(n_blocks) * np.linalg.norm(u))
+
+            if (r_norm < eps_pri) and (s_norm < eps_dual):
+                break
+            if budget is not None and budget.expired(k):
+                warnings.warn('ADMM stopped before convergence (%s).'
+                              % budget.status, ConvergenceWarning)
+                break
+
+        for conn in connections:
+            conn.send(None)
+        z = np.concatenate([conn.recv() for conn in connections])
+        connections = []
+    finally:
+        _shutdown(workers, connections, directory)
+
+    return z, s_norm, eps_dual, k
@@ -94,3 +94,164 @@ def test_elasticnet_on_examples():
     pred = model.predict(T)
     assert_array_almost_equal([.871, .871], model.coef_, 3)
     assert_array_almost_equal([13.971, 17.457, 3.514], pred, 3)
+
+def test_elasticnet_fat():
+    """Check the x-update with N < P and mu > 0 against FISTA."""
+    from ..admm import enet_admm
+    from ..algorithms import l1l2_regularization
+
+    rng = np.random.RandomState(0)
+    X = rng.randn(10, 30)
+    y = np.dot(X[:, :3], [1., -1., 2.])
+
+    beta = l1l2_regularization(X, y, 0.5, 0.1, tolerance=1e-8)
+    z = enet_admm(X, y, tau=0.1, mu=0.5, max_iter=10000, abs_tol=1e-10,
+                  rel_tol=1e-8)[0]
+    assert_array_almost_equal(beta.ravel(), z, 5)
+
+def test_l1l2_path():
+    """Check the ADMM path against the FISTA path."""
+    from ..admm import l1l2_path
+    from ..algorithms import l1l2_path as fista_path
+    from . import _TEST_DATA_PATH
+
+    data = np.loadtxt(_TEST_DATA_PATH)
+    X, y = data[:, :-1], data[:, -1]
+    values = np.linspace(0.1, 1.0, 5)
+
+    expected = fista_path(X, y, 0.1, values, tolerance=1e-8)
+    path, truncated, status = l1l2_path(
+        X, y, 0.1, values, tolerance=1e-8, abs_tol=1e-10,
+        return_truncated=True, return_status=True)
+    assert_equal(len(expected), len(path))
+    assert_equal(0, truncated)
+    assert_equal('converged', status)
+    for beta, z in zip(expected, path):
+        assert_array_almost_equal(beta, z, 4)
+
+    path, truncated = l1l2_path(X, y, 0.1, values, dfmax=25,
+                                return_truncated=True)
+    assert_(truncated > 0)
+    assert_equal(len(values) - truncated, len(path))
+
+def test_eigen_update():
+    """Check the x-update in the eigenbasis for different rho and mu."""
+    from ..admm import CholeskyUpdate, EigenUpdate, eigen_decomposition
+
+    rng = np.random.RandomState(0)
+    q = rng.randn(30)
+    for X in (rng.randn(50, 30), rng.randn(10, 30)):
+        decomposition = eigen_decomposition(X)
+        update = EigenUpdate(X, 1.0, decomposition=decomposition)
+        for rho, mu in ((1.0, 0.0), (0.1, 0.5), (10., 2.)):
+            update.rho, update.mu = rho, mu
+            assert_array_almost_equal(CholeskyUpdate(X, rho, mu)(q),
+                                      update(q))
+
+def test_adaptive_rho():
+    """Check that residual balancing fixes a bad choice of rho."""
+    from ..admm import enet_admm
+    from . import _TEST_DATA_PATH
+
+    data = np.loadtxt(_TEST_DATA_PATH)
+    X, y = data[:, :-1], data[:, -1]
+    for rho in (0.01, 100.):
+        z, _, _, k = enet_admm(X, y, rho=rho, tau=0.1, mu=0.5,
+                               max_iter=10000, rel_tol=1e-8, abs_tol=1e-10)
+        z_ad, _, _, k_ad = enet_admm(X, y, rho=rho, tau=0.1, mu=0.5,
+                                     max_iter=10000, rel_tol=1e-8,
+                                     abs_tol=1e-10, adaptive_rho=True)
+        assert_array_almost_equal(z, z_ad, 5)
+        assert_(k_ad < k)
+
+def test_consensus_admm():
+    """Check consensus ADMM with different numbers of workers."""
+    from ..admm import enet_admm
+    from ..splitting import consensus_admm
+    from . import _TEST_DATA_PATH
+
+    data = np.loadtxt(_TEST_DATA_PATH)
+    X, y = data[:, :-1], data[:, -1]
+    expected = enet_admm(X, y, tau=0.1, mu=0.5, max_iter=10000,
+                         abs_tol=1e-10, rel_tol=1e-8)[0]
+    for n_workers in (1, 3):
+        z = consensus_admm(X, y, tau=0.1, mu=0.5, max_iter=10000,
+                           abs_tol=1e-10, rel_tol=1e-8,
+                           n_workers=n_workers)[0]
+        assert_array_almost_equal(expected, z, 6)
+
+    model = ElasticNet(tau=0.1, mu=0.5, split='rows', n_workers=2,
+                       abs_tol=1e-10, rel_tol=1e-8).fit(X, y)
+    expected = ElasticNet(tau=0.1, mu=0.5, abs_tol=1e-10,
+                          rel_tol=1e-8).fit(X, y)
+    assert_array_almost_equal(expected.coef_, model.coef_, 5)
+
+def test_sharing_admm():
+    """Check sharing ADMM on a wide problem."""
+    from ..admm import enet_admm
+    from ..splitting import sharing_admm
+    from . import _TEST_DATA_PATH
+
+    data = np.loadtxt(_TEST_DATA_PATH)
+    X, y = data[:20, :-1], data[:20, -1]
+    expected = enet_admm(X, y, tau=0.1, mu=0.5, max_iter=10000,
+                         abs_tol=1e-10, rel_tol=1e-8)[0]
+    for n_workers in (1, 3):
+        z = sharing_admm(X, y, tau=0.1, mu=0.5, max_iter=10000,
+                         abs_tol=1e-10, rel_tol=1e-8, inner_tol=1e-10,
+                         n_workers=n_workers)[0]
+        assert_array_almost_equal(expected, z, 5)
+
+    model = ElasticNet(tau=0.1, mu=0.5, split='columns', n_workers=2,
+                       abs_tol=1e-10, rel_tol=1e-8).fit(X, y)
+    expected = ElasticNet(tau=0.1, mu=0.5, abs_tol=1e-10,
+                          rel_tol=1e-8).fit(X, y)
+    assert_array_almost_equal(expected.coef_, model.coef_, 5)
+
+def test_cg_update():
+    """Check the conjugate gradient x-update on sparse data."""
+    from scipy import sparse
+    from ..admm import enet_admm, CGUpdate, CholeskyUpdate
+
+    X = sparse.random(60, 80, density=0.1, format='csr', random_state=0)
+    y = X.dot(np.arange(80.) % 3) + np.linspace(-1, 1, 60)
+    q = np.linspace(0, 1, 80)
+    x_update = CGUpdate(X, 1.0, mu=0.5, rtol=1e-12)
+    assert_array_almost_equal(
+        CholeskyUpdate(X.toarray(), 1.0, mu=0.5)(q), x_update(q), 10)
+    assert_(x_update.n_iter > 0)
+    assert_equal(x_update(q).shape, (80,))
+    assert_equal(x_update.n_iter, 0)  # warm start
+
+    expected = enet_admm(X.toarray(), y, tau=0.1, mu=0.5, abs_tol=1e-10,
+                         rel_tol=1e-8)[0]
+    z = enet_admm(X, y, tau=0.1, mu=0.5, abs_tol=1e-10, rel_tol=1e-8)[0]
+    assert_array_almost_equal(expected, z, 6)
+
+    model = ElasticNet(tau=0.1, mu=0.5, abs_tol=1e-10, rel_tol=1e-8)
+    expected = ElasticNet(tau=0.1, mu=0.5, abs_tol=1e-10, rel_tol=1e-8)
+    model.fit(X, y)
+    expected.fit(X.toarray(), y)
+    assert_array_almost_equal(expected.coef_, model.coef_, 6)
+    assert_array_almost_equal(expected.intercept_, model.intercept_, 6)
+
+def test_multi_target():
+    """Check that the targets sharing a factorization are fitted as alone."""
+    from ..admm import enet_admm, enet_admm_multi
+    from . import _TEST_DATA_PATH
+
+    data = np.loadtxt(_TEST_DATA_PATH)
+    X, y = data[:, :-1], data[:, -1]
+    Y = np.column_stack((y, 2 * y, y[::-1]))
+    for linear_solver in ('cholesky', 'eigh'):
+        Z, _, _, n_iter = enet_admm_multi(X, Y, tau=0.1, mu=0.5,
+                                          linear_solver=linear_solver)
+        for k in range(Y.shape[1]):
+            z, _, _, k_iter = enet_admm(X, Y[:, k], tau=0.1, mu=0.5)
+            assert_array_almost_equal(z, Z[:, k])
+            assert_equal(k_iter, n_iter[k])
+
+    model = ElasticNet(tau=0.1, mu=0.5).fit(X, Y)
+    assert_equal(model.coef_.shape, (3, X.shape[1]))
+    assert_array_almost_equal(model.coef_[1],
+                              ElasticNet(tau=0.1, mu=0.5).fit(X, 2 * y).coef_)
@@ -20,12 +20,16 @@
 # along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
 
 import numpy as np
-from nose.tools import assert_equals, assert_equal, assert_true
+from nose.tools import assert_equals, assert_equal, assert_raises, assert_true
 from six.moves import xrange
 
 from l1l2py.algorithms import (
-    ridge_regression, l1l2_regularization, l1_bound, l1l2_path)
+    ridge_regression, ridge_path, ridge_criterion, RidgeCache, FoldGram,
+    l1l2_regularization, l1_bound, l1l2_path, l1l2_path_append)
+from l1l2py.budget import CancellationToken
+from l1l2py.fista import lipschitz
 from l1l2py.tests import _TEST_DATA_PATH
+from l1l2py.trace import SolverTrace
 
 
 class TestAlgorithms(object):
@@ -60,6 +64,102 @@ class TestAlgorithms(object):
         value = ridge_regression(X, Y)
         assert_true(np.allclose(expected, value))
 
+    def test_ridge_path(self):
+        penalties = np.linspace(0.0, 1.0, 5)
+        for X in (self.X, self.X[:, :10], self.X[:10]):
+            Y = self.Y[:X.shape[0]]
+            beta, prediction, test_prediction = ridge_path(
+                X, Y, penalties, test_data=self.X[:5, :X.shape[1]],
+                return_predictions=True)
+            assert_equal(beta.shape, (X.shape[1], len(penalties)))
+            for j, penalty in enumerate(penalties):
+                expected = ridge_regression(X, Y, penalty)
+                assert_true(np.allclose(expected.ravel(), beta[:, j]))
+                assert_true(np.allclose(np.dot(X, expected).ravel(),
+                                        prediction[:, j]))
+                assert_true(np.allclose(
+                    np.dot(self.X[:5, :X.shape[1]], expected).ravel(),
+                    test_prediction[:, j]))
+
+    def test_ridge_criterion(self):
+        X, Y = self.X[:, :10], self.Y
+        n = X.shape[0]
+        penalties = np.array([0.01, 0.1, 1.0])
+        for fit_intercept in (False, True):
+            loo = ridge_criterion(X, Y, penalties, 'loo', fit_intercept)
+            for j, penalty in enumerate(penalties):
+                errors = []
+                for i in xrange(n):
+                    train = np.arange(n) != i
+                    X_tr, Y_tr = X[train], Y[train]
+                    x_ts, y_ts = X[i], Y[i]
+                    if fit_intercept:
+                        x_ts, y_ts = x_ts - X_tr.mean(0), y_ts - Y_tr.mean()
+                        X_tr, Y_tr = X_tr - X_tr.mean(0), Y_tr - Y_tr.mean()
+                    # same penalty on the sum of the squares
+                    beta = ridge_regression(X_tr, Y_tr, penalty * n / (n - 1))
+                    errors.append(y_ts - np.dot(x_ts, beta.ravel()))
+                assert_true(np.allclose(np.mean(np.square(errors)), loo[j]))
+
+            gcv = ridge_criterion(X, Y, penalties, 'gcv', fit_intercept)
+            assert_equal(gcv.shape, penalties.shape)
+            assert_true(np.all(gcv > 0))
+
+        # interpolating solutions
+        assert_equal(ridge_criterion(X.T, X[0], [0.0], 'gcv')[0], np.inf)
+
+    def test_ridge_cache(self):
+        penalties = np.array([0.0, 0.1, 1.0])
+        cache = RidgeCache(self.X, self.Y, penalties)
+        n_features = self.X.shape[1]
+
+        # nested supports: one update for each entering variable
+        nested = [np.arange(n_features) < k for k in (3, 5, 5, 12)]
+        random_state = np.random.RandomState(0)
+        others = [random_state.rand(n_features) < 0.3 for _ in xrange(5)]
+        for i, selected in enumerate(nested + others):
+            beta = cache.solve(selected)
+            expected = ridge_path(self.X[:, selected], self.Y, penalties)
+            assert_true(np.allclose(expected, beta))
+            if i == len(nested) - 1:
+                assert_equal(cache.n_updates, 12)
+        assert_equal(cache.solve(np.zeros(n_features, dtype=bool)).shape,
+                     (0, len(penalties)))
+
+    def test_fold_gram(self):
+        from l1l2py.tools import kfold_splits, center, standardize
+        X, Y = self.X[:, :10], self.Y
+        for normalizer in (None, center, standardize):
+            folds = FoldGram(X, Y, center=normalizer is not None,
+                             scale=normalizer is standardize,
+                             center_labels=True)
+            assert_true(not folds.kernel)
+            for train, test in kfold_splits(Y, 3):
+                X_tr, Y_tr = X[train], Y[train] - Y[train].mean()
+                if normalizer is not None:
+                    X_tr = normalizer(X_tr)
+                gram, xty, n, mean, scale = folds.split(X, Y, (train, test))
+                assert_equal(n, len(train))
+                assert_true(np.allclose(gram, np.dot(X_tr.T, X_tr)))
+                assert_true(np.allclose(xty, np.dot(X_tr.T, Y_tr)))
+                assert_true(np.allclose((X[train] - mean) / scale, X_tr))
+
+                # the same path in Gram mode
+                expected = l1l2_path(X_tr, Y_tr, 0.1, [0.1, 0.5])
+                beta_path = l1l2_path(None, Y_tr, 0.1, [0.1, 0.5], gram=gram,
+                                      xty=xty, n_samples=n)
+                for a, b in zip(expected, beta_path):
+                    assert_true(np.allclose(a, b))
+
+        # with N < P the (centered) kernel of the training sets
+        folds = FoldGram(self.X, Y, center=True)
+        assert_true(folds.kernel)
+        train, test = kfold_splits(Y, 3)[0]
+        X_tr = center(self.X[train])
+        assert_true(np.allclose(folds.split(self.X, Y, (train, test))[0],
+                                np.dot(X_tr, X_tr.T)))
+        assert_raises(ValueError, FoldGram, self.X, Y, scale=True)
+
     def test_l1l2_bigd(self):
         self.l1l2_regtest(self.X, self.Y)
 
@@ -136,3 +236,121 @@ class TestAlgorithms(object):
 
         beta = l1l2_regularization(self.X, self.Y, 0.0, tau_max - 1e-3)
         assert_equals(1, len(beta.nonzero()[0]))
+
+    def test_l1l2_path_continuation(self):
+        values = np.linspace(0.1, 1.0, 5)
+        for mu in (0.0, 0.1, 1.0):
+            beta_path = l1l2_path(self.X, self.Y, mu, values)
+            loose_path = l1l2_path(self.X, self.Y, mu, values,
+                                   continuation=True)
+
+            assert_equals(len(beta_path), len(loose_path))
+            for b, b_loose in zip(beta_path, loose_path):
+                assert_true(np.array_equal(b.ravel() != 0,
+                                           b_loose.ravel() != 0))
+
+    def test_l1l2_path_dfmax(self):
+        values = np.linspace(0.1, 1.0, 5)
+        beta_path = l1l2_path(self.X, self.Y, 0.1, values)
+        selected = [len(b[b != 0.0]) for b in beta_path]
+
+        dfmax = selected[len(selected) // 2]
+        path, truncated = l1l2_path(self.X, self.Y, 0.1, values, dfmax=dfmax,
+                                    return_truncated=True)
+        assert_true(truncated > 0)
+        assert_equals(len(beta_path), len(path) + truncated)
+        for b, b_full in zip(path, list(beta_path)[truncated:]):
+            assert_true(len(b[b != 0.0]) <= dfmax)
+            assert_true(np.allclose(b, b_full))
+
+        path, truncated = l1l2_path(self.X, self.Y, 0.1, values,
+                                    pmax=self.X.shape[1],
+                                    return_truncated=True)
+        assert_equals(0, truncated)
+        assert_equals(len(beta_path), len(path))
+
+    def test_l1l2_path_append(self):
+        values = np.linspace(0.1, 2.0, 6)
+        old, new = self.X[:, :35], self.X[:, 35:]
+        old_path = l1l2_path(old, self.Y, 0.1, values, tolerance=1e-9)
+        beta_path, bound = l1l2_path_append(old, new, self.Y, 0.1, values,
+                                            old_path, tolerance=1e-9,
+                                            return_eigenvalue=True)
+        assert_true(bound >= lipschitz(self.X))
+
+        full_path = l1l2_path(self.X, self.Y, 0.1, values, tolerance=1e-9)
+        assert_equals(len(full_path), len(beta_path))
+        for b, b_full in zip(beta_path, full_path):
+            assert_equals((40, 1), b.shape)
+            assert_true(np.allclose(b, b_full, atol=1e-4))
+
+        # inactive variables do not change the solutions
+        beta_path = l1l2_path_append(self.X, np.zeros((30, 2)), self.Y, 0.1,
+                                     values, full_path)
+        for b, b_full in zip(beta_path, full_path):
+            assert_true(np.array_equal(b[:40], b_full))
+            assert_true(np.all(b[40:] == 0.0))
+
+    def test_budget(self):
+        beta, k, status = l1l2_regularization(
+            self.X, self.Y, 0.1, 0.1, return_iterations=True,
+            return_status=True)
+        assert_equal('converged', status)
+
+        token = CancellationToken()
+        token.cancel()
+        for solver in ('fista', 'shotgun'):
+            beta, k, status = l1l2_regularization(
+                self.X, self.Y, 0.1, 0.1, tolerance=0., solver=solver,
+                cancel_token=token, return_iterations=True,
+                return_status=True)
+            assert_equal('cancelled', status)
+            assert_true(k <= 10)
+            assert_equals((40, 1), beta.shape)
+
+        beta, status = l1l2_regularization(self.X, self.Y, 0.1, 0.1,
+                                           tolerance=0., max_time=0.,
+                                           return_status=True)
+        assert_equal('timeout', status)
+
+        values = np.linspace(0.1, 1.0, 5)
+        path, truncated, status = l1l2_path(self.X, self.Y, 0.1, values,
+                                            max_time=0., return_truncated=True,
+                                            return_status=True)
+        assert_equal('timeout', status)
+        assert_equals(0, len(path))
+        assert_equals(len(values), truncated)
+
+    def test_trace(self):
+        def objective(beta):
+            residual = self.Y - np.dot(self.X, beta)
+            return (np.dot(residual, residual) / self.X.shape[0] +
+                    0.1 * np.dot(beta, beta) + 0.1 * np.abs(beta).sum())
+
+        for solver in ('fista', 'gram', 'shotgun'):
+            X = self.X[:, :20] if solver == 'gram' else self.X
+            trace = SolverTrace()
+            beta, k = l1l2_regularization(X, self.Y, 0.1, 0.1, solver=solver,
+                                          return_iterations=True, trace=trace)
+            expected = l1l2_regularization(X, self.Y, 0.1, 0.1, solver=solver)
+            assert_true(np.array_equal(expected, beta))
+
+            assert_equals(1, trace.n_runs)
+            assert_equals(k, len(trace.records))
+            last = trace.records[-1]
+            assert_equals(k, last.n_iter)
+            assert_equals(np.count_nonzero(beta), last.support)
+            assert_true(trace.matvecs >= k and trace.flops > 0)
+            if solver != 'gram':
+                assert_true(np.allclose(objective(beta.ravel()),
+                                        last.objective))
+            values = trace.as_arrays()['objective']
+            assert_true(values[-1] <= values[0])
+
+        # ring buffer shared along the path
+        trace = SolverTrace(maxlen=5)
+        values = np.linspace(0.1, 1.0, 5)
+        l1l2_path(self.X, self.Y, 0.1, values, trace=trace)
+        assert_equals(len(values), trace.n_runs)
+        assert_equals(5, len(trace.records))
+        assert_equals(len(values) - 1, trace.records[-1].run)
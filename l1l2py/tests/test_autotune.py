@@ -0,0 +1,141 @@
+"""Testing for autotune.py."""
+
+# This code is written by
+#       Federico Tomasi <federico.tomasi@dibris.unige.it>
+# Copyright (C) 2017 SlipGURU -
+# Statistical Learning and Image Processing Genoa University Research Group
+# Via Dodecaneso, 35 - 16146 Genova, ITALY.
+#
+# This file is part of L1L2Py.
+#
+# L1L2Py is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# L1L2Py is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from nose.tools import assert_equals, assert_true, assert_raises
+
+from l1l2py.algorithms import l1l2_path, l1l2_regularization
+from l1l2py import autotune
+from l1l2py.autotune import select_solver
+from l1l2py.tests import _TEST_DATA_PATH
+
+
+class TestAutotune(object):
+
+    def setup(self):
+        data = np.loadtxt(_TEST_DATA_PATH)
+        self.X = data[:, :-1]
+        self.Y = data[:, -1]
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'cache', 'autotune.json')
+        self.environ = os.environ.get('L1L2PY_AUTOTUNE_CACHE')
+        os.environ['L1L2PY_AUTOTUNE_CACHE'] = self.path
+
+    def teardown(self):
+        shutil.rmtree(self.tmp)
+        if self.environ is None:
+            del os.environ['L1L2PY_AUTOTUNE_CACHE']
+        else:
+            os.environ['L1L2PY_AUTOTUNE_CACHE'] = self.environ
+
+    def test_heuristics(self):
+        rng = np.random.RandomState(0)
+        tall, wide = rng.randn(200, 10), rng.randn(10, 200)
+        assert_equals('gram', select_solver(tall, tall[:, 0], 0.1, 0.1,
+                                            path=self.path))
+        assert_equals('shotgun', select_solver(wide, wide[:, 0], 0.1, 10.,
+                                               path=self.path))
+        assert_equals('fista', select_solver(
+            tall, tall[:, 0], 0.1, 0.1, candidates=('fista', 'shotgun'),
+            path=self.path))
+        # many iterations on few variables
+        assert_equals('admm', select_solver(tall, tall[:, 0], 0.1, 1e-4,
+                                            path=self.path))
+        assert_equals('gram', select_solver(
+            tall, tall[:, 0], 0.1, 1e-4, candidates=('fista', 'gram'),
+            path=self.path))
+        assert_raises(ValueError, select_solver, tall, tall[:, 0], 0.1, 0.1,
+                      candidates=('cuda',))
+        assert_true(not os.path.exists(self.path))
+
+    def test_calibration(self):
+        candidates = ('fista', 'gram', 'shotgun')
+        solver = select_solver(self.X, self.Y, 0.1, 0.1, candidates,
+                               calibrate=True, path=self.path)
+        assert_true(solver in candidates)
+
+        with open(self.path) as cache_file:
+            cache = json.load(cache_file)
+        assert_equals(1, len(cache))
+        entry = list(cache.values())[0]
+        assert_equals(solver, entry['solver'])
+        assert_equals(set(candidates), set(entry['timings']))
+
+        # the stored timings are used for similar problems
+        fastest = 'shotgun' if solver != 'shotgun' else 'fista'
+        entry['timings'][fastest] = 0.
+        with open(self.path, 'w') as cache_file:
+            json.dump(cache, cache_file)
+        assert_equals(fastest, select_solver(self.X, self.Y * 1.1, 0.1, 0.1,
+                                             candidates, path=self.path))
+
+        # also by other sets of candidates, only the new ones are timed
+        assert_equals(fastest, select_solver(
+            self.X, self.Y, 0.1, 0.1, ('fista', fastest), path=self.path))
+        select_solver(self.X, self.Y, 0.1, 0.1, calibrate=True,
+                      path=self.path)
+        with open(self.path) as cache_file:
+            cache = json.load(cache_file)
+        assert_equals(1, len(cache))
+        entry = list(cache.values())[0]
+        assert_equals(0., entry['timings'][fastest])
+        assert_equals(4, len(entry['timings']))
+
+    def test_store(self):
+        # the temporary file is removed if the cache cannot be written
+        directory = os.path.dirname(self.path)
+        autotune._store(self.path, {'solver': object()})
+        assert_true(not os.path.exists(self.path))
+        assert_equals([], os.listdir(directory))
+        autotune._store(self.path, {'solver': 'fista'})
+        assert_equals(['autotune.json'], os.listdir(directory))
+
+    def test_calibrate_switch(self):
+        l1l2_regularization(self.X, self.Y, 0.1, 10., solver='auto')
+        assert_true(not os.path.exists(self.path))
+        l1l2_path(self.X, self.Y, 0.1, [5., 10.], solver='auto',
+                  calibrate=True)
+        assert_true(os.path.exists(self.path))
+
+
+    def test_solvers(self):
+        X = self.X[:, :20]  # N > P, the Gram matrix is used
+        beta = l1l2_regularization(X, self.Y, 0.1, 0.1, tolerance=1e-8)
+        for solver in ('gram', 'auto'):
+            beta_solver = l1l2_regularization(X, self.Y, 0.1, 0.1,
+                                              tolerance=1e-8, solver=solver)
+            assert_true(np.allclose(beta, beta_solver, atol=1e-4))
+        assert_raises(ValueError, l1l2_regularization, self.X, self.Y,
+                      0.1, 0.1, solver='cuda')
+
+        values = np.linspace(0.1, 1.0, 5)
+        path = l1l2_path(X, self.Y, 0.1, values)
+        path_gram = l1l2_path(X, self.Y, 0.1, values, solver='gram')
+        assert_equals(len(path), len(path_gram))
+        for b, b_gram in zip(path, path_gram):
+            assert_true(np.allclose(b, b_gram, atol=1e-4))
@@ -0,0 +1,97 @@
+"""Testing for blas.py."""
+
+# This code is written by
+#       Federico Tomasi <federico.tomasi@dibris.unige.it>
+# Copyright (C) 2017 SlipGURU -
+# Statistical Learning and Image Processing Genoa University Research Group
+# Via Dodecaneso, 35 - 16146 Genova, ITALY.
+#
+# This file is part of L1L2Py.
+#
+# L1L2Py is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# L1L2Py is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
+
+import warnings
+
+import numpy as np
+from nose.tools import assert_equals, assert_true
+
+from l1l2py import blas
+from l1l2py.blas import blas_threads, thread_budget
+from l1l2py.core import minimal_model
+from l1l2py.tests import _TEST_DATA_PATH
+from l1l2py.tools import kfold_splits, regression_error
+
+
+class TestBlas(object):
+
+    def setup(self):
+        data = np.loadtxt(_TEST_DATA_PATH)
+        self.X = data[:, :-1]
+        self.Y = data[:, -1]
+
+    def test_thread_budget(self):
+        # the cores left by the workers go to the BLAS
+        assert_equals((5, 3), thread_budget(-1, 5, n_cores=16))
+        assert_equals((4, 4), thread_budget(4, 5, n_cores=16))
+        # never more workers than tasks or cores
+        assert_equals((3, 1), thread_budget(8, 3, n_cores=4))
+        assert_equals((4, 1), thread_budget(8, 10, n_cores=4))
+        assert_equals((1, 4), thread_budget(1, 5, n_cores=4))
+        # negative values count from the cores, as in joblib
+        assert_equals((15, 1), thread_budget(-2, 20, n_cores=16))
+        assert_equals((1, 4), thread_budget(-4, 20, n_cores=4))
+
+    def test_missing_threadpoolctl(self):
+        limits = blas.threadpool_limits
+        blas.threadpool_limits = None
+        try:
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always', RuntimeWarning)
+                serial = thread_budget(1, 5, n_cores=4)
+                n_serial = len(caught)
+                parallel = thread_budget(4, 5, n_cores=4)
+                with blas_threads(2):
+                    pass
+            runtime = [i for i, w in enumerate(caught)
+                       if issubclass(w.category, RuntimeWarning)]
+            # only the parallel budget warns
+            assert_equals(1, len(runtime))
+            assert runtime[0] >= n_serial
+            assert_equals((1, 4), serial)
+            assert_equals((4, 1), parallel)
+        finally:
+            blas.threadpool_limits = limits
+
+    def test_blas_threads(self):
+        with blas_threads(None):
+            pass
+        if blas.threadpool_limits is None:
+            return
+        from threadpoolctl import threadpool_info
+        with blas_threads(1):
+            assert_true(all(info['num_threads'] == 1
+                            for info in threadpool_info()
+                            if info['user_api'] == 'blas'))
+
+    def test_threads_backend(self):
+        splits = kfold_splits(self.Y, 3)
+        tau_range = np.linspace(0.1, 1.0, 5)
+        lambda_range = np.logspace(-3, 1, 5)
+        expected = minimal_model(self.X, self.Y, 0.01, tau_range,
+                                 lambda_range, splits, regression_error)
+        out = minimal_model(self.X, self.Y, 0.01, tau_range, lambda_range,
+                            splits, regression_error, n_jobs=-1,
+                            backend='threads')
+        for a, b in zip(expected, out):
+            assert_true(np.allclose(a, b))
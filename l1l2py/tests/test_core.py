@@ -137,6 +137,211 @@ class TestCore(object):
             assert_equals((len(tau_range), len(lambda_range)), kcv_err_ts.shape)
             assert_equals(kcv_err_tr.shape, kcv_err_ts.shape)
 
+    def test_minimal_model_lazy_normalizer(self):
+        from l1l2py import tools
+        from l1l2py.operators import lazy_standardize
+        splits = tools.kfold_splits(self.Y, 2)
+
+        tau_range = np.linspace(0.1, 1.0, 5)
+        lambda_range = np.linspace(0.1, 1.0, 5)
+
+        out = minimal_model(self.X, self.Y, 0.1, tau_range, lambda_range,
+                            splits, error_function=tools.regression_error,
+                            data_normalizer=tools.standardize,
+                            labels_normalizer=tools.center)
+        out_lazy = minimal_model(self.X, self.Y, 0.1, tau_range, lambda_range,
+                                 splits, error_function=tools.regression_error,
+                                 data_normalizer=lazy_standardize,
+                                 labels_normalizer=tools.center)
+        for err, err_lazy in zip(out, out_lazy):
+            assert_true(np.allclose(err, err_lazy))
+
+    def test_minimal_model_continuation(self):
+        from l1l2py import tools
+        splits = tools.kfold_splits(self.Y, 2)
+
+        tau_range = np.linspace(0.1, 1.0, 5)
+        lambda_range = np.linspace(0.1, 1.0, 5)
+
+        expected = minimal_model(self.X, self.Y, 0.1, tau_range, lambda_range,
+                                 splits, error_function=tools.regression_error,
+                                 data_normalizer=tools.standardize,
+                                 labels_normalizer=tools.center)
+        out = minimal_model(self.X, self.Y, 0.1, tau_range, lambda_range,
+                            splits, error_function=tools.regression_error,
+                            data_normalizer=tools.standardize,
+                            labels_normalizer=tools.center,
+                            continuation=True)
+
+        for e, o in zip(expected, out):
+            assert_equals(e.shape, o.shape)
+            assert_true(np.allclose(e, o))
+
+    def test_minimal_model_dfmax(self):
+        from l1l2py import tools
+        splits = tools.kfold_splits(self.Y, 2)
+
+        tau_range = np.linspace(0.1, 1.0, 5)
+        lambda_range = np.linspace(0.1, 1.0, 5)
+
+        expected, _ = minimal_model(
+            self.X, self.Y, 0.1, tau_range, lambda_range, splits,
+            error_function=tools.regression_error,
+            data_normalizer=tools.standardize, labels_normalizer=tools.center)
+        kcv_err_ts, kcv_err_tr = minimal_model(
+            self.X, self.Y, 0.1, tau_range, lambda_range, splits,
+            error_function=tools.regression_error,
+            data_normalizer=tools.standardize, labels_normalizer=tools.center,
+            dfmax=30)
+
+        assert_equals(expected.shape, kcv_err_ts.shape)
+        assert_equals(kcv_err_tr.shape, kcv_err_ts.shape)
+
+        truncated = np.isinf(kcv_err_ts[:, 0])
+        assert_true(truncated[0])
+        assert_true(np.all(np.isinf(kcv_err_ts[truncated])))
+        assert_true(np.allclose(expected[~truncated], kcv_err_ts[~truncated]))
+
+        assert_raises(ValueError, minimal_model,
+                      self.X, self.Y, 0.1, tau_range, lambda_range, splits,
+                      tools.regression_error,
+                      data_normalizer=tools.standardize,
+                      labels_normalizer=tools.center, dfmax=0)
+
+    def test_minimal_model_budget(self):
+        from l1l2py import tools
+        from l1l2py.budget import CancellationToken
+        splits = tools.kfold_splits(self.Y, 2)
+
+        tau_range = np.linspace(0.1, 1.0, 5)
+        lambda_range = np.linspace(0.1, 1.0, 5)
+
+        expected, _ = minimal_model(
+            self.X, self.Y, 0.1, tau_range, lambda_range, splits,
+            error_function=tools.regression_error)
+        kcv_err_ts, _ = minimal_model(
+            self.X, self.Y, 0.1, tau_range, lambda_range, splits,
+            error_function=tools.regression_error, max_time=1e3)
+        assert_true(np.allclose(expected, kcv_err_ts))
+
+        token = CancellationToken()
+        token.cancel()
+        assert_raises(ValueError, minimal_model,
+                      self.X, self.Y, 0.1, tau_range, lambda_range, splits,
+                      tools.regression_error, cancel_token=token)
+
+    def test_minimal_model_lambda_selection(self):
+        from l1l2py import tools
+        splits = tools.kfold_splits(self.Y, 3)
+
+        tau_range = np.linspace(0.1, 1.0, 5)
+        lambda_range = np.logspace(-3, 1, 9)
+
+        for criterion in ('loo', 'gcv'):
+            err_ts, err_tr, lambdas = minimal_model(
+                self.X, self.Y, 0.1, tau_range, lambda_range, splits,
+                tools.regression_error, lambda_selection=criterion)
+            assert_equals(err_ts.shape, (len(tau_range), 1))
+            assert_equals(err_tr.shape, (len(tau_range), 1))
+            assert_true(np.all(np.isin(lambdas, lambda_range)))
+
+            # with a single value, the same errors of the full grid
+            expected, _ = minimal_model(
+                self.X, self.Y, 0.1, tau_range, lambda_range[4:5], splits,
+                tools.regression_error)
+            err_ts, _, lambdas = minimal_model(
+                self.X, self.Y, 0.1, tau_range, lambda_range[4:5], splits,
+                tools.regression_error, lambda_selection=criterion)
+            assert_true(np.allclose(expected, err_ts))
+            assert_true(np.all(lambdas == lambda_range[4]))
+
+        assert_raises(ValueError, minimal_model, self.X, self.Y, 0.1,
+                      tau_range, lambda_range, splits,
+                      tools.regression_error, lambda_selection='kcv')
+
+    def test_duplicate_supports(self):
+        from l1l2py import tools
+        splits = tools.kfold_splits(self.Y, 3)
+        lambda_range = np.logspace(-3, 1, 9)
+
+        # repeated values of tau select the same variables
+        tau_range = np.array([0.1, 0.1, 0.5, 0.5, 1.0])
+        err_ts, err_tr, n_duplicates = minimal_model(
+            self.X, self.Y, 0.1, tau_range, lambda_range, splits,
+            tools.regression_error, return_duplicates=True)
+        assert_true(n_duplicates >= 2 * len(splits))
+        expected_ts, expected_tr = minimal_model(
+            self.X, self.Y, 0.1, tau_range[[0, 2, 4]], lambda_range, splits,
+            tools.regression_error)
+        assert_true(np.allclose(expected_ts, err_ts[[0, 2, 4]]))
+        assert_true(np.allclose(expected_tr, err_tr[[1, 3, 4]]))
+
+        out = nested_models(self.X, self.Y, self.X, self.Y, [0.1, 0.1, 1.0],
+                            1.0, 0.1, tools.regression_error,
+                            return_duplicates=True)
+        assert_true(out[-1] >= 1)
+        assert_equals(out[2][0], out[2][1])
+        assert_true(np.allclose(out[0][0], out[0][1]))
+
+        out = model_selection(self.X, self.Y, self.X, self.Y,
+                              [0.1, 0.1, 1.0], tau_range, lambda_range,
+                              splits, tools.regression_error,
+                              tools.regression_error, return_duplicates=True)
+        assert_true(out['kcv_duplicates'] >= 2 * len(splits))
+        assert_true(out['nested_duplicates'] >= 1)
+
+    def test_minimal_model_n_jobs(self):
+        from l1l2py import tools
+        splits = tools.kfold_splits(self.Y, 3)
+        tau_range = np.linspace(0.01, 1.0, 10)
+        lambda_range = np.logspace(-3, 1, 5)
+
+        # truncated paths are merged as in the serial computation
+        for dfmax in (None, 25):
+            expected = minimal_model(self.X, self.Y, 0.01, tau_range,
+                                     lambda_range, splits,
+                                     tools.regression_error, dfmax=dfmax)
+            out = minimal_model(self.X, self.Y, 0.01, tau_range,
+                                lambda_range, splits, tools.regression_error,
+                                dfmax=dfmax, n_jobs=2)
+            for a, b in zip(expected, out):
+                assert_true(np.allclose(a, b))
+
+        assert_raises(ValueError, minimal_model, self.X, self.Y, 0.01,
+                      tau_range, lambda_range, splits,
+                      tools.regression_error, n_jobs=2,
+                      cancel_token=object())
+
+    def test_minimal_model_precompute(self):
+        from l1l2py import tools
+        from l1l2py.operators import lazy_center
+        splits = tools.kfold_splits(self.Y, 3)
+        tau_range = np.linspace(0.1, 1.0, 5)
+        lambda_range = np.logspace(-3, 1, 5)
+
+        # Gram mode (N >= P) and kernel (N < P)
+        for X in (self.X[:, :10], self.X):
+            for normalizer in (None, tools.center, tools.standardize):
+                if normalizer is tools.standardize and X is self.X:
+                    continue
+                expected = minimal_model(
+                    X, self.Y, 0.01, tau_range, lambda_range, splits,
+                    tools.regression_error, normalizer, tools.center,
+                    precompute=False)
+                out = minimal_model(
+                    X, self.Y, 0.01, tau_range, lambda_range, splits,
+                    tools.regression_error, normalizer, tools.center,
+                    precompute=True)
+                for a, b in zip(expected, out):
+                    assert_true(np.allclose(a, b))
+
+        # not supported
+        for normalizer in (tools.standardize, lazy_center):
+            assert_raises(ValueError, minimal_model, self.X, self.Y, 0.01,
+                          tau_range, lambda_range, splits,
+                          tools.regression_error, normalizer,
+                          lambda a, b: (a, b), precompute=True)
+
     def test_minimal_model_saturated(self):
         from l1l2py import tools
         splits = tools.kfold_splits(self.Y, 2)
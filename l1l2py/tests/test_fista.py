@@ -0,0 +1,104 @@
+"""Testing for fista.py."""
+
+# This code is written by
+#       Federico Tomasi <federico.tomasi@dibris.unige.it>
+# Copyright (C) 2017 SlipGURU -
+# Statistical Learning and Image Processing Genoa University Research Group
+# Via Dodecaneso, 35 - 16146 Genova, ITALY.
+#
+# This file is part of L1L2Py.
+#
+# L1L2Py is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# L1L2Py is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+from nose.tools import assert_equals, assert_true
+
+from l1l2py.algorithms import l1l2_regularization
+from l1l2py.budget import Budget, CancellationToken
+from l1l2py.fista import SquareLoss, L1Prox, fista, l1l2_fista
+from l1l2py.tests import _TEST_DATA_PATH
+from l1l2py.trace import SolverTrace
+
+
+class TestFista(object):
+
+    def setup(self):
+        data = np.loadtxt(_TEST_DATA_PATH)
+        self.X = data[:, :-1]
+        self.Y = data[:, -1]
+
+    def test_data(self):
+        assert_equals((30, 40), self.X.shape)
+        assert_equals((30, ), self.Y.shape)
+
+    def test_lipschitz(self):
+        for X in (self.X, self.X.T):
+            loss = SquareLoss(X, np.ones(X.shape[0]), 0.5)
+            e = np.linalg.eigvalsh(np.dot(X.T, X)).max()
+            assert_true(np.allclose(loss.lipschitz_constant,
+                                    2. * (e / X.shape[0] + 0.5)))
+
+    def test_prox(self):
+        prox = L1Prox(1.0)
+        value = np.array([-3., -0.5, 0., 0.5, 3.])
+        out = np.empty_like(value)
+        prox(value, 0.5, out)
+        assert_true(np.allclose([-2.5, 0., 0., 0., 2.5], out))
+
+        prox = L1Prox(1.0, positive=True)
+        prox(value, 0.5, out)
+        assert_true(np.allclose([0., 0., 0., 0., 2.5], out))
+
+    def test_entry_points(self):
+        beta, k = l1l2_fista(self.X, self.Y, 0.1, 0.1)
+        expected, k_expected = l1l2_regularization(
+            self.X, self.Y, 0.1, 0.1, return_iterations=True)
+        assert_equals(k_expected, k)
+        assert_true(np.allclose(expected.ravel(), beta))
+
+    def test_gram(self):
+        for X, Y in ((self.X, self.Y), (self.X.T, self.X[0])):
+            gram = np.dot(X.T, X)
+            beta, _ = l1l2_fista(X, Y, 0.1, 0.1, tol=1e-8)
+            beta_gram, _ = l1l2_fista(X, Y, 0.1, 0.1, tol=1e-8, gram=gram)
+            assert_true(np.allclose(beta, beta_gram))
+
+    def test_positive(self):
+        beta, _ = l1l2_fista(self.X, self.Y, 0.1, 0.1, positive=True)
+        assert_true(np.all(beta >= 0))
+        assert_true(np.any(beta > 0))
+
+    def test_adaptive(self):
+        loss = SquareLoss(self.X, self.Y, 0.1)
+        beta, _ = fista(loss, L1Prox(0.1), np.zeros(40), 100000, 1e-8)
+        beta_adapt, _ = fista(loss, L1Prox(0.1), np.zeros(40), 100000, 1e-8,
+                              adaptive=True)
+        assert_true(np.allclose(beta, beta_adapt, atol=1e-3))
+
+    def test_budget(self):
+        # the objective increases at the 40th iteration of this problem
+        loss, prox = SquareLoss(self.X, self.Y, 0.), L1Prox(0.1)
+        token = CancellationToken()
+        token.cancel()
+        budget = Budget(cancel_token=token, check_every=40)
+        trace = SolverTrace()
+        beta, k = fista(loss, prox, np.zeros(40), 1000, 0., budget=budget,
+                        trace=trace)
+        assert_equals((40, 'cancelled'), (k, budget.status))
+
+        # the best iterate is returned, not the last one
+        objective = loss.value(beta) + prox.penalty(beta)
+        values = trace.as_arrays()['objective']
+        assert_true(np.all(objective <= values))
+        assert_true(objective < values[-1])
@@ -0,0 +1,239 @@
+"""Testing for operators.py."""
+
+# This code is written by
+#       Federico Tomasi <federico.tomasi@dibris.unige.it>
+# Copyright (C) 2017 SlipGURU -
+# Statistical Learning and Image Processing Genoa University Research Group
+# Via Dodecaneso, 35 - 16146 Genova, ITALY.
+#
+# This file is part of L1L2Py.
+#
+# L1L2Py is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# L1L2Py is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+from nose.tools import assert_equals, assert_true, assert_raises
+from scipy import sparse
+
+from l1l2py import tools
+from l1l2py.algorithms import l1_bound, l1l2_path, l1l2_regularization
+from l1l2py.algorithms import ridge_regression
+from l1l2py.fista import lipschitz
+from l1l2py.operators import quantize, lazy_center, lazy_standardize
+from l1l2py.operators import ThreadedMatrix
+from l1l2py.tests import _TEST_DATA_PATH
+
+
+class TestQuantizedMatrix(object):
+
+    def setup(self):
+        data = np.loadtxt(_TEST_DATA_PATH)
+        self.X = data[:, :-1]
+        self.Y = data[:, -1]
+
+        rng = np.random.RandomState(0)
+        self.G = rng.randint(0, 3, size=(30, 40)).astype(float)
+
+    def test_exact_integers(self):
+        Q = quantize(self.G)
+        assert_equals(np.int8, Q.codes.dtype)
+        assert_true(np.array_equal(self.G, Q.toarray()))
+
+    def test_precision(self):
+        # error bounded by half of the quantization step of each column
+        width = self.X.max(axis=0) - self.X.min(axis=0)
+        for dtype, step in ((np.int8, width / 254.),
+                            (np.float16, width / 1e3)):
+            Q = quantize(self.X, dtype)
+            assert_equals(self.X.shape, Q.shape)
+            assert_true(np.all(np.abs(self.X - Q.toarray()) <= step / 2.))
+        assert_raises(ValueError, quantize, self.X, np.int16)
+
+    def test_products(self):
+        Q = quantize(self.G, buffer_size=100, compute_dtype=np.float64)
+        beta = np.random.RandomState(1).randn(40)
+        beta[5:] = 0.0  # sparse products
+        r = self.Y
+
+        for b in (beta, np.arange(40.), beta.reshape(-1, 1)):
+            assert_true(np.allclose(np.dot(self.G, b), Q.dot(b)))
+        assert_true(np.allclose(np.dot(self.G.T, r), Q.T.dot(r)))
+        assert_true(np.allclose(np.dot(self.G.T, r - np.dot(self.G, beta)),
+                                Q.correlation(r, beta)))
+        assert_true(np.allclose(np.dot(self.G, self.G.T), Q.gram()))
+        assert_true(np.allclose(np.dot(self.G[:20], self.G[:20].T),
+                                quantize(self.G[:20].T).gram()))
+
+    def test_solvers(self):
+        Q = quantize(self.G)
+        assert_true(np.allclose(lipschitz(self.G), lipschitz(Q)))
+        assert_true(np.allclose(l1_bound(self.G, self.Y), l1_bound(Q, self.Y)))
+
+        beta = l1l2_regularization(self.G, self.Y, 0.1, 0.1)
+        beta_q = l1l2_regularization(Q, self.Y, 0.1, 0.1)
+        assert_true(np.allclose(beta, beta_q, atol=1e-4))
+
+        values = np.linspace(0.1, 1.0, 5)
+        path = l1l2_path(self.G, self.Y, 0.0, values, continuation=True)
+        path_q = l1l2_path(Q, self.Y, 0.0, values, continuation=True)
+        assert_equals(len(path), len(path_q))
+        for b, b_q in zip(path, path_q):
+            assert_true(np.allclose(b, b_q, atol=1e-4))
+
+        beta = l1l2_regularization(self.G, self.Y, 0.1, 0.1, solver='shotgun')
+        beta_q = l1l2_regularization(Q, self.Y, 0.1, 0.1, solver='shotgun')
+        assert_true(np.allclose(beta, beta_q, atol=1e-4))
+
+
+class TestStandardizedMatrix(object):
+
+    def setup(self):
+        data = np.loadtxt(_TEST_DATA_PATH)
+        self.X = data[:, :-1]
+        self.Y = data[:, -1]
+
+        rng = np.random.RandomState(0)
+        self.S = sparse.random(30, 40, density=0.2, format='csr',
+                               random_state=rng)
+
+    def _check_products(self, X, X_norm):
+        rng = np.random.RandomState(1)
+        beta, r = rng.randn(X.shape[1]), rng.randn(X.shape[0])
+        assert_true(np.allclose(np.dot(X, beta), X_norm.dot(beta)))
+        assert_true(np.allclose(np.dot(X, np.c_[beta, beta]),
+                                X_norm.dot(np.c_[beta, beta])))
+        assert_true(np.allclose(np.dot(X.T, r), X_norm.T.dot(r)))
+        assert_true(np.allclose(X[:, 3:7], X_norm[:, 3:7]))
+        assert_true(np.allclose(X, X_norm.toarray()))
+
+        gram = (np.dot(X, X.T) if X.shape[1] > X.shape[0]
+                else np.dot(X.T, X))
+        assert_true(np.allclose(gram, X_norm.gram()))
+
+    def test_normalizers(self):
+        for data in (self.X, self.X[:, :20]):
+            X_tr, X_ts, mean, std = tools.standardize(data[:20], data[20:],
+                                                      return_factors=True)
+            out = lazy_standardize(data[:20], data[20:], return_factors=True)
+            assert_equals(4, len(out))
+            assert_true(np.allclose(mean, out[2]))
+            assert_true(np.allclose(std, out[3]))
+            self._check_products(X_tr, out[0])
+            self._check_products(X_ts, out[1])
+
+            X_tr = tools.center(data)
+            self._check_products(X_tr, lazy_center(data))
+
+    def test_test_gram(self):
+        # test sets with at least as many rows as columns, normalized with
+        # the factors of the training set
+        for data in (self.X[:, :8], sparse.csr_matrix(self.S[:, :8])):
+            dense = data.toarray() if sparse.issparse(data) else data
+            _, X_ts = tools.standardize(dense[:20], dense[20:])
+            _, X_norm = lazy_standardize(data[:20], data[20:])
+            assert_true(np.allclose(np.dot(X_ts.T, X_ts), X_norm.gram()))
+
+            _, X_ts = tools.center(dense[:20], dense[20:])
+            _, X_norm = lazy_center(data[:20], data[20:])
+            self._check_products(X_ts, X_norm)
+
+    def test_sparse(self):
+        dense = self.S.toarray()
+        for data in (self.S, self.S.T.tocsr()):
+            X_norm = lazy_standardize(data)
+            assert_true(sparse.issparse(X_norm.data))
+            self._check_products(tools.standardize(data.toarray()), X_norm)
+
+        # constant columns are only centered
+        X_norm = lazy_standardize(np.c_[dense, np.ones(30)])
+        assert_true(np.allclose(0.0, X_norm[:, -1]))
+
+    def test_solvers(self):
+        X = tools.standardize(self.X)
+        X_norm = lazy_standardize(self.X)
+        Y = tools.center(self.Y)
+
+        assert_true(np.allclose(l1_bound(X, Y), l1_bound(X_norm, Y)))
+        assert_true(np.allclose(lipschitz(X), lipschitz(X_norm)))
+
+        for solver in ('fista', 'shotgun'):
+            beta = l1l2_regularization(X, Y, 0.1, 0.1, solver=solver)
+            beta_norm = l1l2_regularization(X_norm, Y, 0.1, 0.1,
+                                            solver=solver)
+            assert_true(np.allclose(beta, beta_norm))
+
+        values = np.linspace(0.1, 1.0, 5)
+        path = l1l2_path(X, Y, 0.0, values, continuation=True)
+        path_norm = l1l2_path(X_norm, Y, 0.0, values, continuation=True)
+        assert_equals(len(path), len(path_norm))
+        for b, b_norm in zip(path, path_norm):
+            assert_true(np.allclose(b, b_norm))
+
+        assert_true(np.allclose(ridge_regression(X, Y, 0.1),
+                                ridge_regression(X_norm, Y, 0.1)))
+
+
+class TestThreadedMatrix(object):
+
+    def setup(self):
+        data = np.loadtxt(_TEST_DATA_PATH)
+        self.X = data[:, :-1]
+        self.Y = data[:, -1]
+
+    def test_products(self):
+        rng = np.random.RandomState(1)
+        beta = rng.randn(40)
+        for X in (self.X, self.X[:, :20], np.asfortranarray(self.X)):
+            with ThreadedMatrix(X, n_threads=3, block_size=7) as X_thr:
+                p = X.shape[1]
+                assert_true(np.allclose(np.dot(X, beta[:p]),
+                                        X_thr.dot(beta[:p])))
+                assert_true(np.allclose(np.dot(X, np.c_[beta, beta][:p]),
+                                        X_thr.dot(np.c_[beta, beta][:p])))
+                assert_true(np.allclose(np.dot(X.T, self.Y),
+                                        X_thr.T.dot(self.Y)))
+                assert_true(np.allclose(
+                    np.dot(X.T, self.Y - np.dot(X, beta[:p])),
+                    X_thr.correlation(self.Y, beta[:p])))
+                gram = (np.dot(X, X.T) if p > 30 else np.dot(X.T, X))
+                assert_true(np.allclose(gram, X_thr.gram()))
+                assert_true(np.allclose(X[:, 3:7], X_thr[:, 3:7]))
+
+    def test_solvers(self):
+        beta = l1l2_regularization(self.X, self.Y, 0.1, 0.1)
+        beta_thr = l1l2_regularization(self.X, self.Y, 0.1, 0.1, n_threads=2)
+        assert_true(np.allclose(beta, beta_thr))
+
+        # results do not depend on the number of threads
+        solutions = []
+        for n_threads in (1, 2, 4):
+            with ThreadedMatrix(self.X, n_threads, block_size=8) as X_thr:
+                solutions.append(l1l2_regularization(X_thr, self.Y, 0.1, 0.1))
+        for b in solutions[1:]:
+            assert_true(np.array_equal(solutions[0], b))
+
+        values = np.linspace(0.1, 1.0, 5)
+        path = l1l2_path(self.X, self.Y, 0.1, values)
+        path_thr = l1l2_path(self.X, self.Y, 0.1, values, n_threads=2)
+        assert_equals(len(path), len(path_thr))
+        for b, b_thr in zip(path, path_thr):
+            assert_true(np.allclose(b, b_thr))
+
+        # all the arguments reach the threaded path
+        gram = np.dot(self.X.T, self.X)
+        path_thr = l1l2_path(self.X, self.Y, 0.1, values, n_threads=2,
+                             gram=gram, dfmax=20)
+        path = l1l2_path(self.X, self.Y, 0.1, values, gram=gram, dfmax=20)
+        assert_equals(len(path), len(path_thr))
+        for b, b_thr in zip(path, path_thr):
+            assert_true(np.allclose(b, b_thr))
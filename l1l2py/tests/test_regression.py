@@ -21,12 +21,19 @@
 # You should have received a copy of the GNU General Public License
 # along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
 
+import os
+import shutil
+import tempfile
+
 import numpy as np
 from nose.tools import assert_equals, assert_raises, assert_true
 
+from l1l2py import autotune
+from l1l2py.algorithms import l1l2_regularization
 from l1l2py.linear_model import L1L2
 from l1l2py.regression import L1L2StageOne
 from l1l2py.regression import L1L2StageTwo
+from l1l2py.regression import L1L2TwoStep
 from l1l2py.tests import _TEST_DATA_PATH
 
 class TestLinearModel(object):
@@ -58,13 +65,13 @@ class TestLinearModel(object):
         coef_ = L1L2(mu=0, tau=1.0).fit(self.X, self.Y).coef_
 
         true_coef = np.array([
-             0.        ,  10.93683418,   3.46579585,   0.        ,
-             0.        ,   7.13565392,   0.        ,   7.37737905,
+             0.        ,  13.08248851,   1.31497802,   0.        ,
+             0.        ,   7.01918936,   0.        ,   7.50110669,
              0.        ,   0.        ,   0.        ,   0.        ,
-             0.        ,   0.        ,  14.36854962,  -0.        ,
+             0.        ,   0.        ,  14.36022611,  -0.        ,
             -0.        ,  -0.        ,  -0.        ,   0.        ,
              0.        ,  -0.        ,   0.        ,  -0.        ,
-            -0.        ,  -0.        ,  -0.02985752,  -0.        ,
+            -0.        ,  -0.        ,  -0.03208325,  -0.        ,
             -0.        ,  -0.        ,   0.        ,  -0.        ,
             -0.        ,  -0.        ,   0.        ,  -0.        ,
             -0.        ,  -0.        ,  -0.        ,   0.        ])
@@ -93,3 +100,124 @@ class TestLinearModel(object):
         ).fit(self.X, self.Y, sample_weight=1., check_input=True).coef_
         for i in range(1, len(coefs)):
             assert_true(np.sum(coefs[i - 1] != 0) <= np.sum(coefs[i] != 0))
+
+    def test_lambda_selection(self):
+        lamdas = np.logspace(-2, 2, 5)
+        mdl = L1L2TwoStep(mu=0.1, tau=0.5, lamdas=lamdas,
+                          lambda_selection='loo').fit(self.X, self.Y)
+        assert_true(mdl.lamda_ in lamdas)
+
+        # same model of the selected value
+        coef_ = L1L2TwoStep(mu=0.1, tau=0.5, lamda=mdl.lamda_).fit(
+            self.X, self.Y).coef_
+        assert_true(np.allclose(coef_, mdl.coef_))
+
+        mdl = L1L2StageOne(taus=(0.5, 1), lamdas=lamdas,
+                           lambda_selection='gcv', error_score=-1)
+        mdl.fit(self.X, self.Y)
+        assert_true(mdl.lamda_ in lamdas)
+
+    def test_calibrate(self):
+        tmp = tempfile.mkdtemp()
+        environ = os.environ.get('L1L2PY_AUTOTUNE_CACHE')
+        os.environ['L1L2PY_AUTOTUNE_CACHE'] = os.path.join(tmp, 'cache.json')
+        try:
+            mdl = L1L2(mu=0.5, tau=1.0, solver='auto', calibrate=True)
+            mdl.fit(self.X, self.Y)
+            assert_true(os.path.exists(autotune.cache_path()))
+            # the timings are reused by the next fits
+            assert_equals(mdl.solver_, L1L2(mu=0.5, tau=1.0, solver='auto')
+                          .fit(self.X, self.Y).solver_)
+        finally:
+            shutil.rmtree(tmp)
+            if environ is None:
+                del os.environ['L1L2PY_AUTOTUNE_CACHE']
+            else:
+                os.environ['L1L2PY_AUTOTUNE_CACHE'] = environ
+
+    def test_threading(self):
+        mdl = L1L2StageOne(taus=(0.5, 1), lamdas=(0.1, 1.0), error_score=-1)
+        mdl.fit(self.X, self.Y)
+        threaded = L1L2StageOne(taus=(0.5, 1), lamdas=(0.1, 1.0),
+                                error_score=-1, n_jobs=-1,
+                                backend='threading').fit(self.X, self.Y)
+        assert_equals(mdl.tau_, threaded.tau_)
+        assert_equals(mdl.lamda_, threaded.lamda_)
+
+        mus = (0.1, 0.5, 1.0)
+        coef_ = L1L2StageTwo(mdl, mus=mus).fit(self.X, self.Y).coef_
+        threaded = L1L2StageTwo(mdl, mus=mus, n_jobs=-1).fit(self.X, self.Y)
+        assert_equals(len(mus), len(threaded.coef_))
+        for a, b in zip(coef_, threaded.coef_):
+            assert_true(np.allclose(a, b))
+
+    def test_stage_one_dfmax(self):
+        taus = (0.1, 0.5, 1, 5, 10)
+        mdl = L1L2StageOne(taus=taus, mu=0.5, dfmax=20, error_score=-1)
+        assert_true(np.allclose(mdl._truncate_taus(self.X, self.Y), (5, 10)))
+
+        mdl.fit(self.X, self.Y)
+        assert_true(mdl.tau_ in (5, 10))
+
+        mdl = L1L2StageOne(taus=taus, mu=0.5, dfmax=1, error_score=-1)
+        assert_raises(ValueError, mdl.fit, self.X, self.Y)
+
+    def test_partial_fit(self):
+        mdl = L1L2(mu=0.5, tau=1.0, tol=1e-10, max_iter=100000)
+        for batch in np.array_split(np.arange(30), 3):
+            mdl.partial_fit(self.X[batch], self.Y[batch])
+        assert_equals(30, mdl.n_samples_seen_)
+
+        # same solution of the model fitted on all the samples at once
+        full = L1L2(mu=0.5, tau=1.0, tol=1e-10, max_iter=100000)
+        full.partial_fit(self.X, self.Y)
+        assert_true(np.allclose(full.coef_, mdl.coef_, atol=1e-6))
+        assert_true(np.allclose(full.intercept_, mdl.intercept_, atol=1e-6))
+
+        # and of fit on the same samples
+        full = L1L2(mu=0.5, tau=1.0, tol=1e-10, max_iter=100000)
+        full.fit(self.X, self.Y)
+        assert_true(np.allclose(full.coef_, mdl.coef_, atol=1e-6))
+        assert_true(np.allclose(full.intercept_, mdl.intercept_, atol=1e-6))
+
+        # reference solution on the centered data
+        X_mean, Y_mean = self.X.mean(axis=0), self.Y.mean()
+        beta = l1l2_regularization(self.X - X_mean, self.Y - Y_mean, 0.5,
+                                   1.0, tolerance=1e-10).ravel()
+        assert_true(np.allclose(beta, mdl.coef_, atol=1e-6))
+        assert_true(np.allclose(Y_mean - np.dot(X_mean, beta),
+                                mdl.intercept_, atol=1e-6))
+
+        # both stop at max_iter
+        for method in ('fit', 'partial_fit'):
+            mdl = L1L2(mu=0, tau=1.0, max_iter=5)
+            getattr(mdl, method)(self.X, self.Y)
+            assert_equals((5, 'max_iter'), (mdl.n_iter_, mdl.status_))
+
+        mdl = L1L2(mu=0.5, tau=1.0, normalize=True)
+        assert_raises(ValueError, mdl.partial_fit, self.X, self.Y)
+
+    def test_append_features(self):
+        mdl = L1L2(mu=0.5, tau=1.0, warm_start=True)
+        mdl.fit(self.X[:, :35], self.Y)
+        mdl.fit(self.X, self.Y)
+        assert_equals((40, ), mdl.coef_.shape)
+
+        # features that do not enter the model leave the solution unchanged
+        coef_, intercept_ = mdl.coef_.copy(), mdl.intercept_
+        mdl.fit(np.c_[self.X, np.zeros(30)], self.Y)
+        assert_equals((41, ), mdl.coef_.shape)
+        assert_true(np.array_equal(coef_, mdl.coef_[:40]))
+        assert_true(np.allclose(intercept_, mdl.intercept_))
+        assert_equals((0, 'converged', None),
+                      (mdl.n_iter_, mdl.status_, mdl.solver_))
+
+        # other data (or the same samples in another order) are fitted again
+        rows = np.random.RandomState(0).permutation(30)
+        Z = np.random.RandomState(1).randn(30, 41)
+        for X in (np.c_[self.X[rows], np.zeros(30)], Z):
+            mdl = L1L2(mu=0.5, tau=1.0, warm_start=True)
+            mdl.fit(self.X, self.Y)
+            mdl.fit(X, self.Y)
+            expected = L1L2(mu=0.5, tau=1.0).fit(X, self.Y).coef_
+            assert_true(np.allclose(expected, mdl.coef_, atol=1e-3))
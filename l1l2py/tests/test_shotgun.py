@@ -0,0 +1,105 @@
+"""Testing for shotgun.py."""
+
+# This code is written by
+#       Federico Tomasi <federico.tomasi@dibris.unige.it>
+# Copyright (C) 2017 SlipGURU -
+# Statistical Learning and Image Processing Genoa University Research Group
+# Via Dodecaneso, 35 - 16146 Genova, ITALY.
+#
+# This file is part of L1L2Py.
+#
+# L1L2Py is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# L1L2Py is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+from nose.tools import assert_equals, assert_true, assert_raises
+
+from l1l2py.algorithms import l1l2_path, l1l2_regularization
+from l1l2py.fista import l1l2_fista
+from l1l2py.shotgun import ShotgunMatrix, shotgun_l1l2
+from l1l2py.tests import _TEST_DATA_PATH
+
+
+class TestShotgun(object):
+
+    def setup(self):
+        data = np.loadtxt(_TEST_DATA_PATH)
+        self.X = data[:, :-1]
+        self.Y = data[:, -1]
+
+    def test_fista_solution(self):
+        beta_fista, _ = l1l2_fista(self.X, self.Y, 0.1, 0.1, tol=1e-10)
+        for block_size in (1, 7, 40):
+            for n_threads in (1, 4):
+                beta, k = shotgun_l1l2(self.X, self.Y, 0.1, 0.1, tol=1e-10,
+                                       n_threads=n_threads,
+                                       block_size=block_size)
+                assert_equals((40, ), beta.shape)
+                assert_true(k > 0)
+                assert_true(np.allclose(beta_fista, beta, atol=1e-6))
+
+    def test_monotone(self):
+        def functional(beta):
+            res = self.Y - np.dot(self.X, beta)
+            return (np.dot(res, res) / self.X.shape[0] +
+                    0.1 * np.dot(beta, beta) + 0.1 * np.abs(beta).sum())
+
+        beta = np.zeros(self.X.shape[1])
+        values = [functional(beta)]
+        for _ in range(10):
+            beta, _ = shotgun_l1l2(self.X, self.Y, 0.1, 0.1, beta,
+                                   max_iter=1, n_threads=8, block_size=1)
+            values.append(functional(beta))
+        assert_true(np.all(np.diff(values) <= 1e-12))
+
+    def test_shared_matrix(self):
+        with ShotgunMatrix(self.X, n_threads=2, block_size=7) as shared:
+            for tau in (1.0, 0.1):
+                expected, k = shotgun_l1l2(self.X, self.Y, 0.1, tau,
+                                           n_threads=2, block_size=7)
+                beta, k_shared = shotgun_l1l2(shared, self.Y, 0.1, tau)
+                assert_equals(k, k_shared)
+                assert_true(np.array_equal(expected, beta))
+            # the Lipschitz constants do not depend on the penalties
+            eigenvalues = shared._eigenvalues
+            shotgun_l1l2(shared, self.Y, 0.01, 0.1)
+            assert_true(shared._eigenvalues is eigenvalues)
+            assert_equals(6, len(shared.blocks))
+            # a step size for each coordinate, shared by its block
+            steps = shared.steps(0.1)
+            assert_equals((40, ), steps.shape)
+            assert_true(np.all(steps[:7] == steps[0]))
+        assert_true(shared._pool is None)
+
+    def test_positive(self):
+        beta, _ = shotgun_l1l2(self.X, self.Y, 0.1, 0.01, positive=True)
+        assert_true(np.all(beta >= 0))
+
+    def test_solver_choice(self):
+        beta_fista = l1l2_regularization(self.X, self.Y, 0.1, 0.1,
+                                         tolerance=1e-10)
+        beta = l1l2_regularization(self.X, self.Y, 0.1, 0.1, tolerance=1e-10,
+                                   solver='shotgun', n_threads=2)
+        assert_equals((40, 1), beta.shape)
+        assert_true(np.allclose(beta_fista, beta, atol=1e-6))
+
+        values = np.linspace(0.1, 1.0, 5)
+        path_fista = l1l2_path(self.X, self.Y, 0.1, values, tolerance=1e-10)
+        path = l1l2_path(self.X, self.Y, 0.1, values, tolerance=1e-10,
+                         solver='shotgun', n_threads=2)
+        assert_equals(len(path_fista), len(path))
+        for b, b_fista in zip(path, path_fista):
+            assert_true(np.allclose(b_fista, b, atol=1e-6))
+
+        assert_raises(ValueError, l1l2_regularization, self.X, self.Y,
+                      0.1, 0.1, solver='cd')
@@ -0,0 +1,146 @@
+"""Per-iteration traces of the solvers.
+
+The solvers accept an optional :class:`SolverTrace`: when it is given, at
+each iteration they store a :class:`TraceRecord` (objective value, step
+size, size of the support and elapsed time) in a ring buffer and update
+the counters of the matrix-vector products, of the floating point
+operations and of the allocated arrays. When the trace is `None` (the
+default) the only cost is a comparison per iteration.
+
+The counters are estimates made from the shapes of the operands, they do
+not include the work needed to compute the traced objective values.
+"""
+
+# This code is written by
+#       Federico Tomasi <federico.tomasi@dibris.unige.it>
+# Copyright (C) 2017 SlipGURU -
+# Statistical Learning and Image Processing Genoa University Research Group
+# Via Dodecaneso, 35 - 16146 Genova, ITALY.
+#
+# This file is part of L1L2Py.
+#
+# L1L2Py is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# L1L2Py is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+__all__ = ('SolverTrace', 'TraceRecord')
+
+TraceRecord = namedtuple('TraceRecord', ('run', 'n_iter', 'objective',
+                                         'step', 'support', 'elapsed'))
+TraceRecord.__doc__ = """State of a solver at the end of an iteration.
+
+``run`` is the index of the solver call (e.g. the position along a
+regularization path), ``step`` is `nan` for the solvers without a single
+step size and ``elapsed`` is the time in seconds since the creation of the
+trace."""
+
+
+def _entries(data):
+    # Number of stored entries of a data matrix (for the flops counters)
+    nnz = getattr(data, 'nnz', None)
+    if nnz is not None:
+        return nnz
+    n, p = data.shape
+    return n * p
+
+
+class SolverTrace(object):
+    """Ring buffer of the iterations of the solvers, with counters.
+
+    The same trace can be passed to several calls of the solvers (e.g.
+    along a regularization path): the counters are cumulative and the
+    buffer keeps the last ``maxlen`` iterations.
+
+    Parameters
+    ----------
+    maxlen : int, optional (default is `1000`)
+        Maximum number of records kept.
+
+    Attributes
+    ----------
+    records : deque of TraceRecord
+        Last ``maxlen`` iterations.
+    n_runs : int
+        Number of solver calls traced.
+    matvecs : int
+        Products of a vector with the data matrix (or with its Gram
+        matrix).
+    flops : int
+        Floating point operations of the products and of the
+        factorizations.
+    allocations : int
+        Arrays allocated by the solvers.
+
+    Examples
+    --------
+    >>> trace = SolverTrace(maxlen=100)
+    >>> beta = l1l2_regularization(X, Y, 0.1, 0.1, trace=trace)
+    >>> trace.as_arrays()['objective']  # doctest: +SKIP
+    """
+
+    def __init__(self, maxlen=1000):
+        self.records = deque(maxlen=maxlen)
+        self.n_runs = 0
+        self.matvecs = 0
+        self.flops = 0
+        self.allocations = 0
+        self._start = time.time()
+
+    def start(self):
+        """Start the trace of a new solver call."""
+        self.n_runs += 1
+
+    def record(self, n_iter, objective, step, support):
+        """Store the state at the end of an iteration."""
+        self.records.append(TraceRecord(
+            self.n_runs - 1, n_iter, objective, step, support,
+            time.time() - self._start))
+
+    def count(self, matvecs=0, flops=0, allocations=0):
+        """Update the counters."""
+        self.matvecs += matvecs
+        self.flops += flops
+        self.allocations += allocations
+
+    @property
+    def counters(self):
+        """Dictionary of the counters."""
+        return dict(matvecs=self.matvecs, flops=self.flops,
+                    allocations=self.allocations, n_runs=self.n_runs,
+                    n_records=len(self.records))
+
+    def as_arrays(self):
+        """Dictionary of the fields of the records, as ndarrays."""
+        return dict((field, np.array([getattr(r, field)
+                                      for r in self.records]))
+                    for field in TraceRecord._fields)
+
+
+def make_trace(trace):
+    """The :class:`SolverTrace` requested by the ``trace`` parameter.
+
+    ``trace`` can be `False` or `None` (no trace, `None` is returned),
+    `True` (default length of the buffer), the length of the buffer or a
+    :class:`SolverTrace`, that is returned as it is.
+    """
+    if trace is None or trace is False:
+        return None
+    if isinstance(trace, SolverTrace):
+        return trace
+    if trace is True:
+        return SolverTrace()
+    return SolverTrace(maxlen=int(trace))